@@ -0,0 +1,73 @@
+import asyncio
+import time
+import httpx
+import metrics
+
+class AsyncBridgeClient:
+    """Pooled async connection to one Philips Hue bridge.
+
+    Requests share keep-alive connections and are capped by a semaphore, so a
+    burst of API clients waits here instead of flooding the bridge.
+    """
+
+    def __init__(self, bridge_ip, username, max_concurrency=4, timeout=2.0):
+        self.bridge_ip = bridge_ip
+        self.base_url = f"http://{bridge_ip}/api/{username}"
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+        self.state_paths = {}  # Light ID -> state path, built once
+
+    def state_path(self, light_id):
+        path = self.state_paths.get(light_id)
+        if path is None:
+            path = self.state_paths[light_id] = f"/lights/{light_id}/state"
+        return path
+
+    async def request(self, method, path, data=None, light=None):
+        """Send a request within the concurrency limit and raise on HTTP errors."""
+        if not metrics.ENABLED:
+            async with self.semaphore:
+                response = await self.client.request(method, path, json=data)
+            response.raise_for_status()
+            return response
+
+        # Timed from the moment a connection slot is free, so waits on the
+        # semaphore don't count as bridge latency
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, path, json=data)
+            except httpx.HTTPError:
+                metrics.BRIDGE_ERRORS.inc(self.bridge_ip, str(light or path))
+                raise
+            finally:
+                metrics.BRIDGE_REQUEST_SECONDS.observe(time.perf_counter() - start, method, path.split("/")[1] if "/" in path else "api")
+        if response.is_error:
+            metrics.BRIDGE_ERRORS.inc(self.bridge_ip, str(light or path))
+        elif light is not None and method == "PUT":
+            metrics.count_errors(response.json(), self.bridge_ip, light)
+        response.raise_for_status()
+        return response
+
+    async def get(self, path=""):
+        return await self.request("GET", path)
+
+    async def put(self, path, data, light=None):
+        return await self.request("PUT", path, data, light)
+
+    async def put_light_state(self, light_id, state_data):
+        return await self.request("PUT", self.state_path(light_id), state_data, light_id)
+
+    async def bridge_id(self):
+        """Return the bridge ID from the unauthenticated /api/config, a small and cheap request."""
+        async with self.semaphore:
+            response = await self.client.get(f"http://{self.bridge_ip}/api/config")
+        response.raise_for_status()
+        return response.json().get("bridgeid")
+
+    async def aclose(self):
+        await self.client.aclose()
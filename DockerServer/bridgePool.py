@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import httpx
+from bridgeClient import AsyncBridgeClient
+from lightCache import LightStateCache
+from commandQueue import AsyncCommandSender
+from shadowState import ShadowState
+from lightInventory import LightInventory
+from stateStream import StateBroadcaster
+from bridgeMap import split_id, global_id
+
+logger = logging.getLogger(__name__)
+
+class BridgeShard:
+    """One bridge's client, light cache, saved inventory, command sender and shadow of acknowledged state."""
+
+    def __init__(self, index, bridge_ip, username, fetch, config, on_change=None):
+        self.index = index
+        self.bridge_ip = bridge_ip
+        self.hue = AsyncBridgeClient(bridge_ip, username, config.max_concurrency, config.timeout)
+        self.shadow = ShadowState()
+        self.inventory = LightInventory(bridge_ip).load()  # Capabilities known before the first poll
+        self.cache = LightStateCache(lambda: fetch(self.hue), config.cache_ttl, config.poll_interval, self.refreshed,
+                                     on_change and (lambda lights, removed: on_change(self.index, lights, removed)))
+        self.commands = AsyncCommandSender(self.hue, self.cache, config.rate_limit, shadow=self.shadow, inventory=self.inventory)
+
+    def refreshed(self, lights):
+        """Fold a fresh poll into the shadow and the saved inventory."""
+        self.shadow.sync({light_id: info["state"] for light_id, info in lights.items()})
+        self.inventory.update(lights)
+
+    async def check_inventory(self):
+        """Drop the saved inventory if it came from another bridge at this address."""
+        try:
+            self.inventory.check(await self.hue.bridge_id())
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning("Could not check the bridge ID of %s: %s", self.bridge_ip, str(e))
+
+class BridgePool:
+    """Every configured bridge behind one global light namespace (see bridgeMap.py).
+
+    Each shard has its own connection pool, poller and rate-limited sender,
+    so the bridges are driven in parallel. Every change the pollers and acks
+    make to the cached state is pushed to `stream` subscribers.
+    """
+
+    def __init__(self, bridges, fetch, config):
+        self.stream = StateBroadcaster()
+        self.shards = [BridgeShard(index, bridge_ip, username, fetch, config, self.publish)
+                       for index, (bridge_ip, username) in enumerate(bridges)]
+        self.checks = []  # Startup bridge ID checks, run alongside the first polls
+
+    def start(self):
+        for shard in self.shards:
+            shard.cache.start()
+            shard.commands.start()
+            self.checks.append(asyncio.create_task(shard.check_inventory()))
+
+    async def stop(self):
+        for check in self.checks:
+            check.cancel()
+        for shard in self.shards:
+            await shard.commands.stop()
+            await shard.cache.stop()
+            await shard.hue.aclose()
+
+    def route(self, light_id):
+        """Return (shard, local light ID) for a global light ID; KeyError if no bridge owns it."""
+        index, local_id = split_id(light_id)
+        if not 0 <= index < len(self.shards):
+            raise KeyError(light_id)  # divmod alone would send -1 to the last bridge
+        return self.shards[index], local_id
+
+    async def get_lights(self):
+        """Return every bridge's cached lights, keyed by global light ID.
+
+        A bridge that can't be reached is left out rather than failing the
+        whole inventory; `health()` shows which one.
+        """
+        results = await asyncio.gather(*(shard.cache.get() for shard in self.shards), return_exceptions=True)
+        lights = {}
+        failures = 0
+        for shard, result in zip(self.shards, results):
+            if isinstance(result, Exception):
+                failures += 1
+                logger.error("Bridge %d (%s) has no light data: %s", shard.index, shard.bridge_ip, str(result))
+                continue
+            for local_id, info in result.items():
+                lights[str(global_id(shard.index, local_id))] = info
+        if failures == len(self.shards):
+            raise results[0]
+        return lights
+
+    def publish(self, index, lights, removed):
+        """Push one bridge's cache changes to the stream under global light IDs."""
+        self.stream.publish({str(global_id(index, light_id)): info for light_id, info in lights.items()},
+                            [str(global_id(index, light_id)) for light_id in removed])
+
+    def age(self, light_id):
+        shard, local_id = self.route(light_id)
+        return shard.cache.age(local_id)
+
+    def is_stale(self, light_id):
+        shard, local_id = self.route(light_id)
+        return shard.cache.is_stale(local_id)
+
+    def submit(self, light_id, state_data, trace_id=0, ack=False):
+        """Queue a command on the owning bridge; with `ack=True`, return a future of its response."""
+        shard, local_id = self.route(light_id)
+        return shard.commands.submit(local_id, state_data, trace_id, ack)
+
+    def submit_group(self, group_id, state_data, trace_id=0):
+        """Queue a group action; group 0 (all lights) goes to every bridge."""
+        if int(group_id) == 0:
+            for shard in self.shards:
+                shard.commands.submit_group(0, state_data, trace_id)
+            return
+        shard, local_id = self.route(group_id)
+        shard.commands.submit_group(local_id, state_data, trace_id)
+
+    def drop(self, light_id=None, group_id=None):
+        """Count a discarded update on the bridge it was for; group 0 counts on every bridge."""
+        if group_id is not None and int(group_id) == 0:
+            shards = self.shards
+        else:
+            shards = [self.route(light_id if group_id is None else group_id)[0]]
+        for shard in shards:
+            shard.commands.drop()
+
+    def health(self):
+        """Return cache freshness, last refresh error, sender stats and recent Hue errors for each bridge."""
+        return [
+            {
+                "bridge": shard.index,
+                "bridge_ip": shard.bridge_ip,
+                "healthy": shard.cache.last_error is None and not shard.cache.is_stale(),
+                "lights": len(shard.cache.lights),
+                "age": shard.cache.age(),
+                "last_error": shard.cache.last_error,
+                "commands": shard.commands.stats(),
+                "recent_errors": [{"target": str(target), **error} for target, error in list(shard.commands.errors)[-10:]],
+            }
+            for shard in self.shards
+        ]
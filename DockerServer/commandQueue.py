@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from collections import deque
+import httpx
+from commandScheduler import PIPELINE, ERROR_HISTORY, PendingCommands, hue_errors
+from shadowState import ShadowState
+import metrics
+
+logger = logging.getLogger(__name__)
+
+def resolve(futures, outcome):
+    """Complete ack futures with a response body or an exception, skipping cancelled ones."""
+    for future in futures:
+        if future.done():
+            continue
+        if isinstance(outcome, Exception):
+            future.set_exception(outcome)
+        else:
+            future.set_result(outcome)
+
+class AsyncCommandSender:
+    """Drains coalesced light commands to the bridge at a fixed rate.
+
+    Producers never wait on the bridge: `submit` merges into the pending
+    state for the light, so a slow bridge drops stale values instead of
+    building a backlog. Sends are fire-and-forget tasks, up to `pipeline`
+    at once and never two for the same light; Hue errors from their
+    responses are kept in `errors`. Attributes the light doesn't support
+    (per `inventory`) or already has are stripped before sending, and a
+    command left empty is not sent.
+    """
+
+    def __init__(self, hue, cache, rate=10.0, pipeline=PIPELINE, shadow=None, inventory=None):
+        self.hue = hue
+        self.cache = cache
+        self.shadow = shadow or ShadowState()
+        self.inventory = inventory
+        self.interval = 1.0 / rate
+        self.commands = PendingCommands()
+        self.errors = deque(maxlen=ERROR_HISTORY)  # (target, Hue error) pairs, newest last
+        self.in_flight = set()  # Targets with a request on the wire
+        self.sends = set()  # Running send tasks
+        self.slots = asyncio.Semaphore(pipeline)
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def submit(self, light_id, state_data, trace_id=0, ack=False):
+        """Queue a command; with `ack=True`, return a future of the response it went out in."""
+        future = asyncio.get_running_loop().create_future() if ack else None
+        self.commands.add(light_id, state_data, trace_id, future)
+        metrics.QUEUE_DEPTH.set(len(self.commands), "server")
+        self._wake.set()
+        return future
+
+    def submit_group(self, group_id, state_data, trace_id=0, ack=False):
+        return self.submit(("group", group_id), state_data, trace_id, ack)
+
+    def drop(self):
+        """Count an update that was discarded before reaching the queue."""
+        self.commands.stats["dropped"] += 1
+
+    def stats(self):
+        with self.commands.lock:
+            stats = dict(self.commands.stats)
+        stats["pending"] = len(self.commands)
+        stats["in_flight"] = len(self.in_flight)
+        stats["errors"] = len(self.errors)
+        stats.update(self.shadow.stats)
+        if self.inventory is not None:
+            stats["filtered"] = self.inventory.stats["filtered"]
+        return stats
+
+    def trim(self, target, state_data):
+        """Drop attributes a light doesn't support; None if nothing is left."""
+        if self.inventory is None or isinstance(target, tuple):
+            return state_data
+        return self.inventory.filter(target, state_data)
+
+    async def send_now(self, light_id, state_data):
+        """Write to a light right away, bypassing the queue but not the shadow.
+
+        Returns the Hue response body, or [] when nothing would change.
+        Raises httpx.HTTPError like the bridge client.
+        """
+        state_data = self.trim(light_id, state_data)
+        if state_data is None:
+            return []
+        if light_id in self.in_flight:
+            # A queued command is on the wire; send whole and stop trusting the shadow
+            response = await self.hue.put_light_state(light_id, state_data)
+            self.shadow.invalidate(light_id)
+            results = response.json()
+            self.cache.apply(light_id, results)
+            return results
+        state_data = self.shadow.diff(light_id, state_data)
+        if state_data is None:
+            return []
+        self.in_flight.add(light_id)
+        try:
+            response = await self.hue.put_light_state(light_id, state_data)
+            results = response.json()
+            self.shadow.ack(light_id, results)
+        except (httpx.HTTPError, ValueError):
+            self.shadow.invalidate(light_id)
+            raise
+        finally:
+            self.in_flight.discard(light_id)
+            self._wake.set()
+        self.cache.apply(light_id, results)
+        return results
+
+    async def _send(self, target, state_data, queued_at, trace_id, futures):
+        ok, outcome = False, None
+        try:
+            if isinstance(target, tuple):
+                response = await self.hue.put(f"/groups/{target[1]}/action", state_data, f"group/{target[1]}")
+            else:
+                response = await self.hue.put_light_state(target, state_data)
+            results = response.json()
+            self.shadow.ack(target, results)
+            if not isinstance(target, tuple):
+                self.cache.apply(target, results)
+            for error in hue_errors(results):
+                self.errors.append((target, error))
+                logger.warning("Bridge error for %s: %s", target, error.get("description", error))
+            self.commands.stats["sent"] += 1
+            ok, outcome = True, results
+        except (httpx.HTTPError, ValueError) as e:
+            outcome = e
+            self.shadow.invalidate(target)
+            self.commands.stats["failed"] += 1
+            logger.error("Failed to send command to %s: %s", target, str(e))
+        finally:
+            self.in_flight.discard(target)
+            self.slots.release()
+            self._wake.set()  # Its target may have another command waiting
+        resolve(futures, outcome)
+        if metrics.ENABLED:
+            metrics.MIDI_TO_ACK_SECONDS.observe(time.monotonic() - queued_at, "server")
+            metrics.trace(trace_id, "ack", ok=ok)
+
+    async def _run(self):
+        next_send = time.monotonic()
+        while True:
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.slots.acquire()
+
+            self._wake.clear()
+            item = self.commands.pop(skip=self.in_flight)
+            if item is None:
+                self.slots.release()
+                await self._wake.wait()
+                continue
+
+            target, state_data, queued_at, trace_id, futures = item
+            state_data = self.trim(target, state_data)
+            if state_data is not None:
+                state_data = self.shadow.diff(target, state_data)
+            if state_data is None:
+                self.slots.release()  # Nothing would change, so it costs no rate budget
+                resolve(futures, [])
+                continue
+
+            next_send = max(next_send, time.monotonic()) + self.interval
+            if metrics.ENABLED:
+                metrics.QUEUE_DEPTH.set(len(self.commands), "server")
+                metrics.QUEUE_WAIT_SECONDS.observe(time.monotonic() - queued_at, "server")
+                metrics.trace(trace_id, "send", target=target)
+            self.in_flight.add(target)
+            task = asyncio.create_task(self._send(target, state_data, queued_at, trace_id, futures))
+            self.sends.add(task)
+            task.add_done_callback(self.sends.discard)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.sends:
+            await asyncio.gather(*self.sends, return_exceptions=True)
@@ -1,12 +1,20 @@
 import os
 from dotenv import load_dotenv
+from bridgeMap import load_bridges
 
 # Load environment variables from .env
 load_dotenv()
 
 class Config:
-    bridge_ip = os.getenv("BRIDGE_IP")
-    username = os.getenv("USERNAME")
+    bridges = load_bridges()  # [(bridge_ip, username)] from BRIDGES, or BRIDGE_IP and USERNAME
+    max_concurrency = int(os.getenv("BRIDGE_MAX_CONCURRENCY", 4))  # In-flight requests per bridge
+    timeout = float(os.getenv("HUE_TIMEOUT", 2.0))  # Seconds
+    cache_ttl = float(os.getenv("LIGHT_CACHE_TTL", 5.0))  # Seconds before cached state counts as stale
+    poll_interval = float(os.getenv("LIGHT_POLL_INTERVAL", 2.0))  # Seconds between background refreshes
+    stream_keepalive = float(os.getenv("STREAM_KEEPALIVE", 15.0))  # Seconds between keepalives on an idle event stream
+    rate_limit = float(os.getenv("HUE_RATE_LIMIT", 10))  # Light commands per second sent to the bridge
+    midi_max_age = int(os.getenv("MIDI_MAX_AGE_MS", 500))  # Drop MIDI events older than this
+    metrics = os.getenv("HUE_METRICS", "1") == "1"  # Record timings and serve them at /metrics
     lights = {
         "light_1": int(os.getenv("LIGHT_1_ID", 1)),
         "light_2": int(os.getenv("LIGHT_2_ID", 2)),
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class LightStateCache:
+    """Processed light inventory kept fresh by a background poller.
+
+    Reads are served from memory. Successful PUT responses are applied
+    optimistically, so toggles and reachability checks don't need a fresh
+    GET /lights from the bridge.
+    """
+
+    def __init__(self, fetch, ttl=5.0, poll_interval=2.0, on_refresh=None, on_change=None):
+        self.fetch = fetch  # Coroutine returning {light_id: {"name", "reachable", "on", "state"}}
+        self.on_refresh = on_refresh  # Called with each fresh inventory, e.g. to spot external changes
+        self.on_change = on_change  # Called with (updated lights, removed light IDs) after refreshes and acks
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.lights = {}
+        self.updated = {}  # Light ID -> monotonic time its state was last confirmed
+        self.refreshed_at = None
+        self.last_error = None  # Message of the last failed refresh, cleared on success
+        self.lock = asyncio.Lock()
+        self._task = None
+
+    async def refresh(self):
+        lights = await self.fetch()
+        now = time.monotonic()
+        removed = set(self.lights) - set(lights)
+        self.lights = lights
+        self.updated = {light_id: now for light_id in lights}
+        self.refreshed_at = now
+        self.last_error = None
+        if self.on_refresh is not None:
+            self.on_refresh(lights)
+        if self.on_change is not None:
+            self.on_change(lights, removed)
+
+    def age(self, light_id=None):
+        """Seconds since a light (or the whole inventory) was last confirmed, or None."""
+        updated = self.refreshed_at if light_id is None else self.updated.get(str(light_id))
+        return None if updated is None else time.monotonic() - updated
+
+    def is_stale(self, light_id=None):
+        age = self.age(light_id)
+        return age is None or age > self.ttl
+
+    async def get(self):
+        """Return the cached lights, fetching first if the inventory is stale."""
+        if self.is_stale():
+            async with self.lock:
+                if self.is_stale():
+                    try:
+                        await self.refresh()
+                    except Exception as e:
+                        self.last_error = str(e)
+                        if not self.lights:
+                            raise
+                        logger.warning("Serving stale light data after a failed refresh")
+        return self.lights
+
+    def apply(self, light_id, results):
+        """Apply the success entries of a Hue PUT response to the cached state."""
+        light = self.lights.get(str(light_id))
+        if light is None or not isinstance(results, list):
+            return
+        for result in results:
+            for address, value in result.get("success", {}).items() if isinstance(result, dict) else ():
+                attribute = address.rsplit("/", 1)[-1]
+                if attribute == "transitiontime":
+                    continue  # A command option, not part of the light's state
+                light["state"][attribute] = value
+                if attribute == "on":
+                    light["on"] = value
+        self.updated[str(light_id)] = time.monotonic()
+        if self.on_change is not None:
+            self.on_change({str(light_id): light}, ())
+
+    async def _poll(self):
+        while True:
+            try:
+                async with self.lock:
+                    await self.refresh()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Background light refresh failed: %s", str(e))
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -1,23 +1,36 @@
 import requests
-import time
-import threading
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import os
+import json
+import time
+import threading
+from keyframes import compile_keyframes, effect as keyframe_effect
+from frameRenderer import render, frame_states
+from showClock import get_clock, step_effect
+from showRunner import ShowRunner, SHOW_MAX_IN_FLIGHT
 
 # Load environment variables for server IP and port
 load_dotenv()
 server_ip = os.getenv("SERVER_IP", "localhost")
 server_port = os.getenv("SERVER_PORT", "9010")
 BASE_URL = f"http://{server_ip}:{server_port}/api/v1/lights"
+SHOW_BATCH = os.getenv("SHOW_BATCH", "1") == "1"  # One /lights/batch call per show step instead of one per light and attribute
 
 # Define Light IDs
 light_ids = [1, 2, 5]  # List of lights to control
+clock = get_clock()  # Beats at SHOW_BPM, or following MIDI clock on MIDI_CLOCK_PORT
+runner = ShowRunner(clock=clock)  # One effect loop on beat deadlines and a bounded request pool for every light
+
+# Keep-alive connections to the server, one per in-flight request
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=SHOW_MAX_IN_FLIGHT))
 
 # Check the status of all lights
 def check_light_status():
     """Retrieve and log the status of all lights."""
     url = f"{BASE_URL}/status"
-    response = requests.get(url)
+    response = session.get(url)
     if response.status_code == 200:
         light_status = response.json()
         for light_id, info in light_status.items():
@@ -27,11 +40,41 @@ def check_light_status():
         print(f"Failed to retrieve light status: {response.text}")
         return {}
 
+# Keep the status current from the server's push stream instead of polling /status
+def apply_light_update(status, message):
+    """Apply a snapshot or diff message from /lights/events to a status dict."""
+    if message["type"] == "snapshot":
+        status.clear()
+        status.update(message["lights"])
+        return
+    for light_id, change in message["lights"].items():
+        if change is None:
+            status.pop(light_id, None)
+            continue
+        light = status.setdefault(light_id, {})
+        light.setdefault("state", {}).update(change.pop("state", {}))
+        light.update(change)
+
+def follow_light_status(status):
+    """Update `status` in the background from one long-lived event stream, reconnecting if it drops."""
+    def follow():
+        while True:
+            try:
+                with requests.get(f"{BASE_URL}/events", stream=True, timeout=(2, 60)) as response:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line and line.startswith("data: "):
+                            apply_light_update(status, json.loads(line[len("data: "):]))
+            except requests.exceptions.RequestException as e:
+                print(f"Light status stream interrupted: {e}")
+            time.sleep(1)
+
+    threading.Thread(target=follow, daemon=True).start()
+
 # Toggle light only if it's reachable
 def toggle_light(light_id, status):
     if status.get(str(light_id), {}).get("reachable", False):
         url = f"{BASE_URL}/{light_id}/toggle"
-        response = requests.put(url)
+        response = session.put(url)
         if response.status_code == 200:
             print(f"Toggled light {light_id}")
         else:
@@ -39,10 +82,11 @@ def toggle_light(light_id, status):
     else:
         print(f"Light {light_id} is not reachable. Skipping toggle.")
 
-def set_brightness(light_id, brightness, status):
+def set_brightness(light_id, brightness, status, transitiontime=None):
     if status.get(str(light_id), {}).get("reachable", False):
         url = f"{BASE_URL}/{light_id}/brightness/{brightness}"
-        response = requests.put(url)
+        params = {"transitiontime": transitiontime} if transitiontime is not None else None
+        response = session.put(url, params=params)
         if response.status_code == 200:
             print(f"Set brightness for light {light_id} to {brightness}")
         else:
@@ -54,7 +98,7 @@ def set_color(light_id, hue, sat, status):
     if status.get(str(light_id), {}).get("reachable", False):
         url = f"{BASE_URL}/{light_id}/color"
         color_data = {"hue": hue, "sat": sat}
-        response = requests.put(url, json=color_data)
+        response = session.put(url, json=color_data)
         if response.status_code == 200:
             print(f"Set color for light {light_id} to hue={hue}, sat={sat}")
         else:
@@ -62,38 +106,104 @@ def set_color(light_id, hue, sat, status):
     else:
         print(f"Light {light_id} is not reachable. Skipping color adjustment.")
 
-# Dynamic light show function
+class StepBatch:
+    """Collects the light states of a show step and sends them in one batch call.
+
+    Lights whose steps land while a batch is waiting for the request pool
+    join it, so busy moments cost fewer calls rather than more. A later
+    step's state is merged into a light's waiting one, but states from the
+    same step (a fade's start value and the fade) go out in separate calls.
+    """
+
+    def __init__(self):
+        self.states = {}  # Light ID -> (effect step, [states to send in order])
+        self.lock = threading.Lock()
+
+    def set(self, light_id, state, status):
+        if not status.get(str(light_id), {}).get("reachable", False):
+            print(f"Light {light_id} is not reachable. Skipping step.")
+            return
+        step = runner.engine.current_step()
+        with self.lock:
+            pending = self.states.get(str(light_id))
+            if pending is None:
+                self.states[str(light_id)] = (step, [dict(state)])
+            elif step is not None and pending[0] == step:
+                pending[1].append(dict(state))
+            else:
+                pending[1][-1].update(state)
+                self.states[str(light_id)] = (step, pending[1])
+        runner.send("batch", self.flush)
+
+    def flush(self):
+        with self.lock:
+            states = {light_id: pending[1].pop(0) for light_id, pending in self.states.items()}
+            self.states = {light_id: pending for light_id, pending in self.states.items() if pending[1]}
+            more = bool(self.states)
+        if not states:
+            return  # An earlier flush already took them
+        response = session.put(f"{BASE_URL}/batch", json=states)
+        if more:
+            runner.send("batch", self.flush)  # The rest of a step, once this call is done
+        if response.status_code != 200:
+            print(f"Failed to send batch for lights {', '.join(states)}: {response.text}")
+            return
+        for light_id, results in response.json().items():
+            if isinstance(results, dict):
+                print(f"Failed to set light {light_id}: {results['error']}")
+
+batch = StepBatch()
+
+def send_step(light_id, state, status):
+    """Send one light's step: a batch entry, or the per-attribute endpoints without SHOW_BATCH."""
+    if SHOW_BATCH:
+        batch.set(light_id, state, status)
+        return
+
+    def send():
+        if "hue" in state:
+            set_color(light_id, state["hue"], state["sat"], status)
+        if "bri" in state:
+            set_brightness(light_id, state["bri"], status, state.get("transitiontime"))
+
+    runner.send(light_id, send)
+
+# Colour effects for the frame renderer: seven hue steps at full saturation
+COLOR_CYCLE = {"hue": {"wave": "steps", "values": [0, 10000, 20000, 30000, 40000, 50000, 60000], "period": 7}, "sat": 254}
+WARM_CYCLE = {"hue": {"wave": "steps", "values": [30000, 40000, 50000, 60000, 10000, 20000, 30000], "period": 7}, "sat": 254}
+
+def color_frames(light_id, effect, brightness, beats, status):
+    """Render seven colour steps in one pass and send them one every `beats` beats."""
+    rendered = render(effect, 1, 7, fps=1)
+    steps = []
+    for frame in range(rendered.shape[1]):
+        state = frame_states(rendered, frame)[0]
+        steps.append((frame * beats, {"hue": state["hue"], "sat": state["sat"], "bri": brightness}))
+    yield from step_effect(steps, lambda state: send_step(light_id, state, status), clock)
+    yield beats  # Hold the last colour for its step
+
+# Dynamic light show effect, run on the runner's shared loop
 def dynamic_light_show(light_id, index, status):
     """Perform a unique light show effect based on the light index, keeping brightness consistent."""
     if index % 3 == 0:
-        colors = [0, 10000, 20000, 30000, 40000, 50000, 60000]
-        for hue in colors:
-            set_color(light_id, hue, 254, status)  # Maximum saturation
-            set_brightness(light_id, 200, status)  # Maintain a high brightness level
-            time.sleep(0.3)  # Shorter delay for faster transitions
+        # Maximum saturation at a high brightness level, on every half beat for faster transitions
+        yield from color_frames(light_id, COLOR_CYCLE, 200, 0.5, status)
 
     elif index % 3 == 1:
         # Smooth, constant brightness transitions without going too dim
+        fade = compile_keyframes([(0, 150), (1.1, 250), (2.2, 150)], "bri")  # Brightness remains above 150
         for _ in range(3):
-            for brightness in range(150, 255, 10):  # Brightness remains above 150
-                set_brightness(light_id, brightness, status)
-                time.sleep(0.1)
-            for brightness in range(255, 150, -10):
-                set_brightness(light_id, brightness, status)
-                time.sleep(0.1)
+            yield from keyframe_effect(fade, lambda state: send_step(light_id, state, status), clock)
 
     elif index % 3 == 2:
-        # Cycle through warmer color temperatures to maintain brightness
-        colors = [30000, 40000, 50000, 60000, 10000, 20000, 30000]
-        for hue in colors:
-            set_color(light_id, hue, 254, status)
-            set_brightness(light_id, 220, status)  # Slightly lower brightness for contrast
-            time.sleep(0.4)  # Moderate delay for smoother effect
+        # Cycle through warmer color temperatures, slightly lower brightness for contrast
+        yield from color_frames(light_id, WARM_CYCLE, 220, 0.75, status)
 
 # Main Script
 if __name__ == "__main__":
-    # Check the status of lights first
+    # Check the status of lights first, then follow changes (e.g. a light becoming unreachable)
     light_status = check_light_status()
+    follow_light_status(light_status)
 
     # Initialize lights by toggling them on only if they are off
     for light_id in light_ids:
@@ -101,16 +211,14 @@ if __name__ == "__main__":
             toggle_light(light_id, light_status)
         set_brightness(light_id, 100, light_status)
 
-    # Start a thread for each light's unique effect
-    threads = []
+    # Start every light's effect together on the next beat; one loop runs them all
+    runner.start()
+    delay = clock.next_beat() - clock.position()  # In beats, like every step on the runner
     for index, light_id in enumerate(light_ids):
-        thread = threading.Thread(target=dynamic_light_show, args=(light_id, index, light_status))
-        threads.append(thread)
-        thread.start()
-
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
+        runner.trigger(light_id, dynamic_light_show(light_id, index, light_status), delay)
+    runner.wait()
+    runner.shutdown()
+    print("Show stats:", runner.stats)
 
     # Turn off lights after the show
     for light_id in light_ids:
@@ -1,29 +1,79 @@
-from fastapi import FastAPI, WebSocket, HTTPException
-from pydantic import BaseModel
-import requests
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, confloat, conint
+from typing import Dict, List, Optional, Union
+import httpx
+import asyncio
+import json
 import os
+import time
 import logging
 from config import Config
+from bridgePool import BridgePool
+from midiProtocol import decode_batch, timestamp_age
+from midiMapping import load_mapping, valid_message
+from colorConvert import rgb_state, rgb_states, clamp_to_gamut
+import metrics
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
+metrics.enable(Config.metrics)
 
-app = FastAPI()
+# One pooled client, light state cache and command sender per bridge, opened and closed with the app
+@asynccontextmanager
+async def lifespan(app):
+    app.state.bridges = BridgePool(Config.bridges, fetch_lights_data, Config)
+    app.state.bridges.start()
+    yield
+    await app.state.bridges.stop()
 
-# Philips Hue API URL setup
-HUE_API_URL = f"http://{Config.bridge_ip}/api/{Config.username}/lights"
+app = FastAPI(lifespan=lifespan)
+
+# Per-endpoint request rates and latency, labelled by route template
+@app.middleware("http")
+async def record_request(request: Request, call_next):
+    if not metrics.ENABLED:
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    endpoint = route.path if route is not None else "unmatched"
+    metrics.HTTP_REQUESTS.inc(request.method, endpoint, str(response.status_code))
+    metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+    return response
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 class LightState(BaseModel):
     brightness: int = None
     hue: int = None
     sat: int = 254
+    xy: Optional[List[confloat(ge=0, le=1)]] = None  # CIE x and y, instead of hue/sat
+    rgb: Optional[List[conint(ge=0, le=255)]] = None  # 8-bit red, green and blue, instead of hue/sat
 
-def fetch_lights_data():
-    """Fetch and process light data from the Philips Hue API."""
+class LightCommand(BaseModel):
+    """One light's entry in a batch; unset attributes are left alone."""
+    on: Optional[bool] = None
+    bri: Optional[int] = Field(None, ge=0, le=254)
+    hue: Optional[int] = Field(None, ge=0, le=65535)
+    sat: Optional[int] = Field(None, ge=0, le=254)
+    ct: Optional[int] = Field(None, ge=153, le=500)
+    xy: Optional[List[confloat(ge=0, le=1)]] = None  # Fitted to the light's gamut
+    rgb: Optional[List[conint(ge=0, le=255)]] = None  # Converted to xy (and bri, unless set) for the light's gamut
+    transitiontime: Optional[int] = Field(None, ge=0)
+    alert: Optional[str] = None
+
+async def fetch_lights_data(hue):
+    """Fetch and process light data from one bridge's Philips Hue API."""
     try:
-        response = requests.get(HUE_API_URL)
-        response.raise_for_status()
+        response = await hue.get("/lights")
         lights = response.json()
 
         # Process response structure (dict or list) into a unified format
@@ -32,48 +82,134 @@ def fetch_lights_data():
             for light_id, info in lights.items():
                 processed_lights[light_id] = {
                     "name": info["name"],
+                    "type": info.get("type"),
                     "reachable": info["state"].get("reachable", False),
                     "on": info["state"].get("on", False),
-                    "state": info["state"]
+                    "state": info["state"],
+                    "capabilities": info.get("capabilities", {})
                 }
         elif isinstance(lights, list):
             for index, info in enumerate(lights):
                 processed_lights[str(index)] = {
                     "name": info.get("name", "Unknown"),
+                    "type": info.get("type"),
                     "reachable": info.get("state", {}).get("reachable", False),
                     "on": info.get("state", {}).get("on", False),
-                    "state": info.get("state", {})
+                    "state": info.get("state", {}),
+                    "capabilities": info.get("capabilities", {})
                 }
         else:
             logger.error("Unexpected lights response format.")
             raise HTTPException(status_code=500, detail="Unexpected lights response format")
 
-        logger.info("Successfully processed lights data.")
+        logger.debug("Successfully processed lights data.")
         return processed_lights
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error("Failed to retrieve lights data: %s", str(e))
         raise HTTPException(status_code=500, detail="Failed to retrieve lights data")
 
+def route_light(light_id):
+    """Return (bridge shard, local light ID) for a global light ID, or 404."""
+    try:
+        return app.state.bridges.route(light_id)
+    except KeyError:
+        logger.error("Light %d is not on a configured bridge.", light_id)
+        raise HTTPException(status_code=404, detail="Light not found")
+
+def light_gamut(light_id):
+    """The light's colour gamut from its bridge's saved inventory, or None."""
+    try:
+        bridge, local_id = app.state.bridges.route(light_id)
+    except KeyError:
+        return None
+    return bridge.inventory.gamut(local_id)
+
+def check_color(values, size, name):
+    """Reject an rgb or xy list of the wrong length with a 400."""
+    if values is not None and len(values) != size:
+        raise HTTPException(status_code=400, detail=f"{name} needs {size} values")
+
 # Endpoint to check the status of all lights
 @app.get("/api/v1/lights/status")
-def check_light_status():
-    status_info = fetch_lights_data()
-    return {light_id: {k: v for k, v in info.items() if k != "state"} for light_id, info in status_info.items()}
+async def check_light_status():
+    bridges = app.state.bridges
+    status_info = await bridges.get_lights()
+    return {
+        light_id: {**{k: v for k, v in info.items() if k not in ("state", "capabilities")}, "age": bridges.age(light_id), "stale": bridges.is_stale(light_id)}
+        for light_id, info in status_info.items()
+    }
 
-# Endpoint to retrieve all lights
+# Endpoint to retrieve all lights, merged across bridges
 @app.get("/api/v1/lights")
-def get_lights():
-    return fetch_lights_data()
+async def get_lights():
+    return await app.state.bridges.get_lights()
+
+# Per-bridge health: cache freshness, last refresh error and command stats
+@app.get("/api/v1/bridges")
+async def get_bridges():
+    return app.state.bridges.health()
+
+# Live light state: a snapshot, then per-light diffs as the pollers and acks change the cache
+@app.websocket("/api/v1/lights/stream")
+async def light_state_websocket(websocket: WebSocket):
+    """Push light state changes as JSON messages (see stateStream.py) instead of polling /status."""
+    await websocket.accept()
+    stream = app.state.bridges.stream
+    queue = stream.subscribe()
+
+    async def wait_closed():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass  # Clients have nothing to say on this stream
+
+    # Watch for the close as well, so an idle stream doesn't outlive its client
+    closed = asyncio.create_task(wait_closed())
+    try:
+        while True:
+            message = asyncio.create_task(queue.get())
+            await asyncio.wait((message, closed), return_when=asyncio.FIRST_COMPLETED)
+            if closed.done():
+                message.cancel()
+                break
+            await websocket.send_json(message.result())
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error("Light state stream error: %s", str(e))
+    finally:
+        closed.cancel()
+        stream.unsubscribe(queue)
+
+@app.get("/api/v1/lights/events")
+async def light_state_events(request: Request):
+    """The same stream as Server-Sent Events, for browsers and plain HTTP clients."""
+    stream = app.state.bridges.stream
+    queue = stream.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), Config.stream_keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"  # Keeps proxies from closing an idle stream
+                    continue
+                yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            stream.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 # Toggle light with enhanced reachability checks and error handling
 @app.put("/api/v1/lights/{light_id}/toggle")
-def toggle_light(light_id: int):
-    lights = fetch_lights_data()
-    if str(light_id) not in lights:
+async def toggle_light(light_id: int):
+    # Answer from the cache so a toggle costs a single bridge round trip
+    bridge, local_id = route_light(light_id)
+    lights = await bridge.cache.get()
+    if str(local_id) not in lights:
         logger.error(f"Light {light_id} not found in response.")
         raise HTTPException(status_code=404, detail="Light not found")
 
-    light_info = lights[str(light_id)]
+    light_info = lights[str(local_id)]
     if not light_info["reachable"]:
         logger.error(f"Light {light_id} is not reachable.")
         raise HTTPException(status_code=503, detail="Light not reachable")
@@ -83,59 +219,164 @@ def toggle_light(light_id: int):
     toggle_data = {"on": not current_state}
 
     # Send the toggle request
-    state_url = f"{HUE_API_URL}/{light_id}/state"
     try:
-        toggle_response = requests.put(state_url, json=toggle_data)
-        toggle_response.raise_for_status()
+        toggle_response = await bridge.hue.put_light_state(local_id, toggle_data)
         logger.info(f"Toggled light {light_id} to {'on' if not current_state else 'off'}")
-        return toggle_response.json()
-    except requests.exceptions.RequestException as e:
+        results = toggle_response.json()
+        bridge.shadow.invalidate(local_id)  # Toggles bypass the shadow
+        bridge.cache.apply(local_id, results)
+        return results
+    except httpx.HTTPError as e:
         logger.error("Failed to toggle light %d: %s", light_id, str(e))
         raise HTTPException(status_code=500, detail="Failed to toggle light")
 
 # Set brightness
 @app.put("/api/v1/lights/{light_id}/brightness/{value}")
-def set_brightness(light_id: int, value: int):
-    state_url = f"{HUE_API_URL}/{light_id}/state"
+async def set_brightness(light_id: int, value: int, transitiontime: int = None):
     brightness_data = {"bri": min(max(value, 0), 254)}
+    if transitiontime is not None:
+        brightness_data["transitiontime"] = max(transitiontime, 0)  # Bridge fades over this many 100 ms steps
 
+    bridge, local_id = route_light(light_id)
     try:
-        response = requests.put(state_url, json=brightness_data)
-        response.raise_for_status()
+        results = await bridge.commands.send_now(local_id, brightness_data)  # [] if it already has this brightness
         logger.info("Set brightness for light %d to %d", light_id, value)
-        return response.json()
+        return results
     
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error("Failed to set brightness for light %d: %s", light_id, str(e))
         raise HTTPException(status_code=500, detail="Failed to set brightness")
 
 # Set color
 @app.put("/api/v1/lights/{light_id}/color")
-def set_color(light_id: int, light_state: LightState):
-    state_url = f"{HUE_API_URL}/{light_id}/state"
-    color_data = {"hue": light_state.hue, "sat": light_state.sat}
+async def set_color(light_id: int, light_state: LightState):
+    """Set a colour as rgb ([0-255] x 3), xy ([0-1] x 2) or hue and sat; rgb and xy are fitted to the light's gamut."""
+    check_color(light_state.rgb, 3, "rgb")
+    check_color(light_state.xy, 2, "xy")
+    bridge, local_id = route_light(light_id)
+    if not bridge.inventory.supports(local_id, "hue"):
+        raise HTTPException(status_code=400, detail="Light does not support color")
 
+    gamut = bridge.inventory.gamut(local_id)
+    if light_state.rgb is not None:
+        color_data = rgb_state(*light_state.rgb, gamut)
+    elif light_state.xy is not None:
+        x, y = clamp_to_gamut(light_state.xy, gamut)
+        color_data = {"xy": [round(float(x), 4), round(float(y), 4)]}
+    elif light_state.hue is not None:
+        color_data = {"hue": light_state.hue, "sat": light_state.sat}
+    else:
+        raise HTTPException(status_code=400, detail="Give rgb, xy or hue")
     try:
-        response = requests.put(state_url, json=color_data)
-        response.raise_for_status()
-        logger.info("Set color for light %d: hue=%d, sat=%d", light_id, light_state.hue, light_state.sat)
-        return response.json()
+        results = await bridge.commands.send_now(local_id, color_data)  # [] if it already has this colour
+        logger.info("Set color for light %d: %s", light_id, color_data)
+        return results
     
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error("Failed to set color for light %d: %s", light_id, str(e))
         raise HTTPException(status_code=500, detail="Failed to set color")
 
+# Set many lights in one call
+@app.put("/api/v1/lights/batch")
+async def set_lights_batch(batch: Union[Dict[int, LightCommand], List[Dict[int, LightCommand]]]):
+    """Apply {light_id: state} entries (or a list of them, merged in order) in one request.
+
+    Each light's attributes become one command on its bridge's sender, so
+    the batch shares the rate budget and shadow with MIDI traffic, lights
+    go out up to HUE_PIPELINE at a time and bridges run in parallel.
+    Returns each light's Hue results, or an error for that light.
+    """
+    states = {}
+    for entries in batch if isinstance(batch, list) else [batch]:
+        for light_id, command in entries.items():
+            check_color(command.rgb, 3, "rgb")
+            check_color(command.xy, 2, "xy")
+            states.setdefault(light_id, {}).update({key: value for key, value in dict(command).items() if value is not None})
+
+    # Every RGB colour in the batch is converted in one vectorized pass; explicit on/bri win
+    rgb_lights = [light_id for light_id, state_data in states.items() if "rgb" in state_data]
+    if rgb_lights:
+        colors = rgb_states([states[light_id].pop("rgb") for light_id in rgb_lights], [light_gamut(light_id) for light_id in rgb_lights])
+        for light_id, color_data in zip(rgb_lights, colors):
+            states[light_id] = {**color_data, **states[light_id]}
+    # Explicit xy is fitted to each light's gamut, as on /color
+    for light_id, state_data in states.items():
+        if "xy" in state_data:
+            x, y = clamp_to_gamut(state_data["xy"], light_gamut(light_id))
+            state_data["xy"] = [round(float(x), 4), round(float(y), 4)]
+
+    results, pending = {}, {}
+    for light_id, state_data in states.items():
+        if not state_data:
+            results[light_id] = []
+            continue
+        try:
+            pending[light_id] = app.state.bridges.submit(light_id, state_data, ack=True)
+        except KeyError:
+            results[light_id] = {"error": "Light not found"}
+    outcomes = await asyncio.gather(*pending.values(), return_exceptions=True)
+    for light_id, outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error("Batch command for light %d failed: %s", light_id, str(outcome))
+            outcome = {"error": str(outcome) or type(outcome).__name__}
+        results[light_id] = outcome
+    logger.info("Applied batch of %d lights", len(states))
+    return results
+
+# MIDI -> light lookup tables, shared with hue.py (see midiMapping.json)
+mapping = load_mapping()
+
 # WebSocket for MIDI control
 @app.websocket("/api/v1/midi")
 async def midi_websocket(websocket: WebSocket):
+    """Receive binary batches of raw MIDI messages (see midiProtocol.py) and drive the lights.
+
+    Commands are coalesced by each bridge's sender, so this loop never waits
+    on a bridge. Events older than MIDI_MAX_AGE_MS relative to the newest
+    event seen on the connection are dropped, comparing timestamps modulo
+    2**32 so the sender's millisecond counter can wrap.
+    """
     await websocket.accept()
     logger.info("MIDI WebSocket connection accepted")
-    while True:
-        try:
-            data = await websocket.receive_text()
-            logger.info("Received MIDI data: %s", data)
-            # Process MIDI data here to control lights
-            await websocket.send_text(f"Received data: {data}")
-        except Exception as e:
-            logger.error("WebSocket connection error: %s", str(e))
-            break
+    commands = app.state.bridges
+    newest = None
+    invalid = 0
+    try:
+        while True:
+            frame = await websocket.receive_bytes()
+            try:
+                events = decode_batch(frame)
+            except ValueError as e:
+                logger.error("Discarding malformed MIDI batch: %s", str(e))
+                continue
+            for timestamp, status, data1, data2 in events:
+                if not valid_message(status, data1, data2):
+                    invalid += 1
+                    metrics.MIDI_INVALID.inc("websocket")
+                    logger.debug("Skipping invalid MIDI record %02x %02x %02x", status, data1, data2)
+                    continue
+                trace_id = metrics.new_trace()
+                if trace_id:
+                    metrics.MIDI_EVENTS.inc("websocket")
+                    metrics.trace(trace_id, "receive", source="websocket", timestamp=timestamp)
+                entry = mapping.lookup(status, data1, data2)
+                if entry is None or entry.effect is not None:
+                    continue  # Effects run in the local scripts, not on the server
+                if newest is None or timestamp_age(newest, timestamp) < 0:
+                    newest = timestamp
+                try:
+                    if timestamp_age(newest, timestamp) > Config.midi_max_age:
+                        commands.drop(entry.light, entry.group)  # Counted on the bridge it was for
+                    elif entry.group is not None:
+                        commands.submit_group(entry.group, entry.states[data2], trace_id)
+                    else:
+                        commands.submit(entry.light, entry.states[data2], trace_id)
+                except KeyError:
+                    logger.error("MIDI mapping targets %s on an unconfigured bridge", entry.light if entry.group is None else f"group {entry.group}")
+    except WebSocketDisconnect:
+        logger.info("MIDI WebSocket connection closed")
+    except Exception as e:
+        logger.error("WebSocket connection error: %s", str(e))
+    finally:
+        if invalid:
+            logger.warning("Skipped %d invalid MIDI records on the connection", invalid)
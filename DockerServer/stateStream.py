@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("name", "type", "reachable", "on")  # Top-level light fields streamed besides "state"
+
+def light_view(info):
+    """The streamed part of a cached light, copied so later cache updates don't alter it."""
+    view = {field: info.get(field) for field in FIELDS}
+    view["state"] = dict(info.get("state", {}))
+    return view
+
+def light_diff(old, new):
+    """Return the fields and state attributes that differ, or None if nothing does."""
+    diff = {field: new[field] for field in FIELDS if old.get(field) != new[field]}
+    state = {key: value for key, value in new["state"].items() if old["state"].get(key) != value}
+    if state:
+        diff["state"] = state
+    return diff or None
+
+class StateBroadcaster:
+    """Pushes per-light state changes from the server's bridge pollers to every subscriber.
+
+    Subscribers get a snapshot first, then only diffs:
+    {"type": "diff", "lights": {light_id: {changed fields, "state": {changed attributes}}}},
+    with None for a light that disappeared. However many clients watch, the
+    bridges see only the one background poller. A client that falls
+    `max_queue` messages behind is sent a fresh snapshot instead of the
+    backlog.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self.lights = {}  # Global light ID -> light_view() last published
+        self.subscribers = set()
+        self.stats = {"published": 0, "resyncs": 0}
+
+    def snapshot(self):
+        return {"type": "snapshot", "time": time.time(), "lights": dict(self.lights)}
+
+    def subscribe(self):
+        queue = asyncio.Queue(self.max_queue)
+        queue.put_nowait(self.snapshot())
+        self.subscribers.add(queue)
+        metrics.STREAM_CLIENTS.set(len(self.subscribers))
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        metrics.STREAM_CLIENTS.set(len(self.subscribers))
+
+    def publish(self, lights, removed=()):
+        """Diff {light_id: cached light} against what was last sent and push the changes."""
+        changes = {}
+        for light_id, info in lights.items():
+            view = light_view(info)
+            old = self.lights.get(light_id)
+            diff = view if old is None else light_diff(old, view)
+            if diff is not None:
+                changes[light_id] = diff
+                self.lights[light_id] = view
+        for light_id in removed:
+            if self.lights.pop(light_id, None) is not None:
+                changes[light_id] = None
+        if not changes or not self.subscribers:
+            return
+        message = {"type": "diff", "time": time.time(), "lights": changes}
+        self.stats["published"] += 1
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too slow to follow diffs; start it over from the current state
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.snapshot())
+                self.stats["resyncs"] += 1
@@ -0,0 +1,293 @@
+# audioInput.py
+import os
+import sys
+import time
+import wave
+import argparse
+import numpy as np
+import mido
+from dotenv import load_dotenv
+
+# Audio drives the lights through the same MIDI mapping as a controller: each
+# block of PCM updates a ring buffer, one windowed FFT gives band energies and
+# spectral-flux onsets, and the results come out as virtual MIDI messages on
+# AUDIO_CHANNEL (0-based, like midiMapping.json):
+#   CC AUDIO_CC_BASE + n   level of band n (see BANDS), 0-127, auto-gained
+#   note AUDIO_BEAT_NOTE   beat (bass onset), velocity = strength
+#   note AUDIO_ONSET_NOTE  onset anywhere in the spectrum, velocity = strength
+# Every buffer is allocated once, so a block costs the same on the first
+# second and the thousandth. The FFT writes into its own buffer too, except on
+# numpy 1.x, whose rfft has no out= and returns a new array per block.
+load_dotenv()
+AUDIO_BLOCK = int(os.getenv("AUDIO_BLOCK", 512))  # Samples per block, about 12 ms at 44.1 kHz
+AUDIO_FFT_SIZE = int(os.getenv("AUDIO_FFT_SIZE", 2048))  # Analysis window, a multiple of the block
+AUDIO_RATE = int(os.getenv("AUDIO_RATE", 44100))  # Sample rate of raw PCM on stdin
+AUDIO_CHANNEL = int(os.getenv("AUDIO_CHANNEL", 15))
+AUDIO_CC_BASE = 20
+AUDIO_BEAT_NOTE = 36
+AUDIO_ONSET_NOTE = 38
+
+RFFT_OUT = np.lib.NumpyVersion(np.__version__) >= "2.0.0"  # rfft(out=) arrived in numpy 2.0
+
+BANDS = [(20, 150), (150, 500), (500, 2000), (2000, 6000), (6000, 16000)]  # Hz: bass, low-mid, mid, presence, air
+FLUX_HISTORY = 43  # Blocks of flux (about half a second) behind the adaptive onset threshold
+ONSET_SENSITIVITY = 1.5  # Standard deviations above the recent mean that count as an onset
+ONSET_MIN_RISE = 1.5  # And at least this multiple of the mean, so steady tones don't trigger on jitter
+ONSET_FLOOR = 0.1  # And this fraction of the recent peak flux, so quiet passages don't either
+MIN_GAP = 0.1  # Seconds between onsets of one kind
+GAIN_DECAY = 0.999  # Per-block fall of each band's running peak
+
+SAMPLE_TYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+class PcmReader:
+    """Reads interleaved PCM from a binary stream into a reused mono float32 block."""
+
+    def __init__(self, stream, channels=1, sampwidth=2, block=AUDIO_BLOCK, limit=None):
+        if sampwidth not in SAMPLE_TYPES:
+            raise ValueError(f"unsupported sample width: {sampwidth} bytes")
+        self.stream = stream
+        self.channels = channels
+        self.block = block
+        self.limit = limit  # Bytes of audio left, for files with chunks after the data
+        self.raw = bytearray(block * channels * sampwidth)
+        self.samples = np.frombuffer(self.raw, dtype=SAMPLE_TYPES[sampwidth])
+        self.offset = 128 if sampwidth == 1 else 0  # 8-bit WAV is unsigned
+        self.scale = 1.0 / (128 if sampwidth == 1 else 2 ** (8 * sampwidth - 1))
+        self.mono = np.zeros(block, dtype=np.float32)
+
+    def read(self):
+        """Return the next block as floats in -1..1 (zero-padded at the end), or None when done."""
+        view = memoryview(self.raw)
+        if self.limit is not None:
+            view = view[:max(0, min(len(self.raw), self.limit))]
+        filled = 0
+        while filled < len(view):
+            count = self.stream.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        if self.limit is not None:
+            self.limit -= filled
+        if filled == 0:
+            return None
+        if filled < len(self.raw):
+            self.raw[filled:] = bytes(len(self.raw) - filled)
+        frames = self.samples.reshape(self.block, self.channels)
+        np.mean(frames, axis=1, out=self.mono)
+        if self.offset:
+            self.mono -= self.offset
+        self.mono *= self.scale
+        return self.mono
+
+    def close(self):
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_wav(path, block=AUDIO_BLOCK):
+    """Return (PcmReader, sample rate) for a WAV file; closing the reader closes the file."""
+    f = open(path, "rb")
+    try:
+        # Closing the wave reader leaves a file it was handed open, positioned at the samples
+        with wave.open(f) as wav:
+            channels, sampwidth = wav.getnchannels(), wav.getsampwidth()
+            limit = wav.getnframes() * channels * sampwidth
+            rate = wav.getframerate()
+        return PcmReader(f, channels, sampwidth, block, limit), rate
+    except Exception:
+        f.close()
+        raise
+
+def open_stdin(rate=AUDIO_RATE, channels=1, block=AUDIO_BLOCK):
+    """Raw signed 16-bit little-endian PCM on stdin, e.g. from `arecord -f S16_LE -r 44100 -c 1`."""
+    return PcmReader(sys.stdin.buffer, channels, 2, block), rate
+
+class AudioAnalyzer:
+    """Band energies and onsets from fixed-size blocks, vectorized into preallocated buffers.
+
+    Samples go into a mirrored ring buffer (every block is written twice,
+    `size` apart), so the latest `size` samples are always one contiguous
+    slice and never need to be copied into order.
+    """
+
+    def __init__(self, rate, block=AUDIO_BLOCK, size=AUDIO_FFT_SIZE, bands=BANDS):
+        if size % block:
+            raise ValueError("the FFT size must be a multiple of the block size")
+        self.rate = rate
+        self.block = block
+        self.size = size
+        self.ring = np.zeros(2 * size, dtype=np.float32)
+        self.position = 0
+        self.window = np.hanning(size).astype(np.float32)
+        self.windowed = np.zeros(size, dtype=np.float32)
+        self.spectrum = np.zeros(size // 2 + 1, dtype=np.complex64)
+        self.magnitude = np.zeros(size // 2 + 1, dtype=np.float32)
+        self.previous = np.zeros_like(self.magnitude)
+        self.rise = np.zeros_like(self.magnitude)
+        self.power = np.zeros(len(self.magnitude) + 1, dtype=np.float32)  # Trailing zero bin lets a band stop at Nyquist
+
+        # Bands as [start, stop) bin ranges, summed with one reduceat over the edges
+        hz_per_bin = rate / size
+        nyquist_bin = size // 2 + 1
+        self.bands = []
+        for low, high in bands:
+            start = min(int(low / hz_per_bin), nyquist_bin - 1)  # Bands above Nyquist shrink to the top bin
+            self.bands.append((start, max(min(int(high / hz_per_bin), nyquist_bin), start + 1)))
+        self.edges = np.array([edge for start, stop in self.bands for edge in (start, stop)], dtype=np.intp)
+        self.widths = np.array([stop - start for start, stop in self.bands], dtype=np.float32)
+        self.bass_stop = self.bands[0][1]
+        self.sums = np.zeros(len(self.edges), dtype=np.float32)
+        self.energy = np.zeros(len(bands), dtype=np.float32)
+        self.peak = np.full(len(bands), 1e-6, dtype=np.float32)
+        self.levels = np.zeros(len(bands), dtype=np.int32)
+
+        # Recent flux for the adaptive thresholds: all bins and bass only
+        self.flux = np.zeros((2, FLUX_HISTORY), dtype=np.float32)
+        self.flux_peak = [1e-6, 1e-6]  # Decaying peak flux, like the band gain
+        self.blocks = 0
+        self.last_onset = [-1.0, -1.0]  # Stream time of the last onset and beat
+
+    def process(self, samples):
+        """Analyze one block; returns (band levels 0-127, onset strength, beat strength).
+
+        Strengths are 0.0 when nothing was detected, else how far the flux
+        cleared its threshold (1.0 = just over it).
+        """
+        # Ring write, mirrored so ring[position + block : position + block + size] is the window
+        start = self.position
+        self.ring[start:start + self.block] = samples
+        self.ring[start + self.size:start + self.size + self.block] = samples
+        self.position = (start + self.block) % self.size
+        np.multiply(self.ring[start + self.block:start + self.block + self.size], self.window, out=self.windowed)
+        if RFFT_OUT:
+            np.fft.rfft(self.windowed, out=self.spectrum)
+        else:
+            self.spectrum[:] = np.fft.rfft(self.windowed)
+        np.abs(self.spectrum, out=self.magnitude)
+
+        # Band energy (mean power per bin), auto-gained against a decaying peak
+        np.square(self.magnitude, out=self.power[:-1])
+        np.add.reduceat(self.power, self.edges, out=self.sums)
+        np.divide(self.sums[::2], self.widths, out=self.energy)
+        np.multiply(self.peak, GAIN_DECAY, out=self.peak)
+        np.maximum(self.energy, self.peak, out=self.peak)
+        np.divide(self.energy, self.peak, out=self.energy)
+        np.sqrt(self.energy, out=self.energy)
+        np.multiply(self.energy, 127, out=self.energy)
+        self.levels[:] = self.energy
+
+        # Spectral flux: summed increases in magnitude since the last block
+        np.subtract(self.magnitude, self.previous, out=self.rise)
+        np.maximum(self.rise, 0, out=self.rise)
+        self.previous[:] = self.magnitude
+        slot = self.blocks % FLUX_HISTORY
+        self.flux[0, slot] = self.rise.sum()
+        self.flux[1, slot] = self.rise[:self.bass_stop].sum()
+        self.blocks += 1
+        now = self.blocks * self.block / self.rate
+        return self.levels, self._onset(0, slot, now), self._onset(1, slot, now)
+
+    def _onset(self, kind, slot, now):
+        history = self.flux[kind]
+        value = history[slot]
+        self.flux_peak[kind] = max(float(value), self.flux_peak[kind] * GAIN_DECAY)
+        if self.blocks < FLUX_HISTORY:
+            return 0.0  # Not enough history for a threshold yet
+        mean = history.mean()
+        threshold = max(mean + ONSET_SENSITIVITY * history.std(), ONSET_MIN_RISE * mean, ONSET_FLOOR * self.flux_peak[kind]) + 1e-3
+        if value <= threshold or now - self.last_onset[kind] < MIN_GAP:
+            return 0.0
+        self.last_onset[kind] = now
+        return float(value / threshold)
+
+def velocity(strength):
+    """Map an onset strength (1.0 = just over threshold, 3.0+ = very strong) to 1-127."""
+    return max(1, min(127, int(40 + 40 * (strength - 1))))
+
+class AudioEvents:
+    """Turns analyzer output into virtual MIDI messages; a CC only when its value changes."""
+
+    def __init__(self, channel=AUDIO_CHANNEL, bands=len(BANDS)):
+        self.channel = channel
+        self.sent = np.full(bands, -1, dtype=np.int32)
+        self.held = []  # Notes to release on the next block
+
+    def messages(self, levels, onset, beat):
+        messages = [mido.Message("note_off", channel=self.channel, note=note) for note in self.held]
+        self.held = []
+        for band in np.flatnonzero(levels != self.sent):
+            messages.append(mido.Message("control_change", channel=self.channel, control=AUDIO_CC_BASE + int(band), value=int(levels[band])))
+        self.sent[:] = levels
+        for note, strength in ((AUDIO_BEAT_NOTE, beat), (AUDIO_ONSET_NOTE, onset)):
+            if strength:
+                messages.append(mido.Message("note_on", channel=self.channel, note=note, velocity=velocity(strength)))
+                self.held.append(note)
+        return messages
+
+def analyze(reader, rate, realtime=False):
+    """Yield (stream time, messages, seconds spent on the block) for every block from a reader.
+
+    With `realtime`, blocks are released at the pace they would be played, for driving lights
+    from a file; live input on stdin is already paced by the sound card.
+    """
+    analyzer = AudioAnalyzer(rate, reader.block)
+    events = AudioEvents()
+    start = time.monotonic()
+    offset = 0.0
+    while True:
+        samples = reader.read()
+        if samples is None:
+            return
+        begin = time.perf_counter()
+        messages = events.messages(*analyzer.process(samples))
+        spent = time.perf_counter() - begin
+        offset += reader.block / rate
+        if realtime:
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        yield offset, messages, spent
+
+def audio_events(path):
+    """Timed (offset_s, message) list for a WAV file, in the form benchmark.py replays."""
+    reader, rate = open_wav(path)
+    with reader:
+        return [(offset, message) for offset, messages, _ in analyze(reader, rate) for message in messages]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+# Main Script: offline analysis benchmark
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze a WAV file (or raw PCM on stdin) and report the per-block cost.")
+    parser.add_argument("source", help="WAV file, or - for signed 16-bit mono PCM on stdin")
+    parser.add_argument("--block", type=int, default=AUDIO_BLOCK)
+    parser.add_argument("--max-block-ms", type=float, help="Fail if the p99 block time exceeds this")
+    args = parser.parse_args()
+
+    reader, rate = open_stdin(block=args.block) if args.source == "-" else open_wav(args.source, args.block)
+    times, counts = [], {"control_change": 0, "beats": 0, "onsets": 0}
+    duration = 0.0
+    with reader:
+        for duration, messages, spent in analyze(reader, rate):
+            times.append(spent)
+            for message in messages:
+                if message.type == "control_change":
+                    counts["control_change"] += 1
+                elif message.type == "note_on":
+                    counts["beats" if message.note == AUDIO_BEAT_NOTE else "onsets"] += 1
+
+    budget = 1000 * args.block / rate
+    p99 = 1000 * percentile(times, 99)
+    print(f"{args.source}: {duration:.1f} s of audio at {rate} Hz in {len(times)} blocks of {args.block} samples ({budget:.1f} ms each)")
+    print(f"  Block time ms: p50 {1000 * percentile(times, 50):.3f}, p99 {p99:.3f}, max {1000 * max(times, default=0.0):.3f}")
+    print(f"  Realtime factor: {duration / max(sum(times), 1e-9):.0f}x")
+    print(f"  Events: {counts['control_change']} band CCs, {counts['beats']} beats, {counts['onsets']} onsets")
+    if args.max_block_ms is not None and p99 > args.max_block_ms:
+        print(f"FAIL: p99 block time {p99:.3f} ms > {args.max_block_ms} ms")
+        sys.exit(1)
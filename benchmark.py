@@ -0,0 +1,174 @@
+# benchmark.py
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import mido
+from fakeBridge import FakeBridge
+
+# Replays synthetic or recorded MIDI through hue.py's handlers against the
+# fake bridge and reports MIDI-to-ack latency, command throughput, and how
+# many updates were coalesced or dropped on the way.
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+# MIDI sources: lists of (offset_s, mido.Message)
+def cc_sweep(duration, rate):
+    """Mod wheel and master fader sweeping up and down at `rate` messages per second."""
+    events = []
+    for index in range(int(duration * rate)):
+        value = abs(127 - (index * 4) % 254)
+        events.append((index / rate, mido.Message("control_change", control=1 if index % 2 else 7, value=value)))
+    return events
+
+def note_bursts(duration, rate):
+    """Chords of note on/off on the mapped keys."""
+    events = []
+    notes = [60, 64, 65, 48]
+    for index in range(int(duration * rate / 2)):
+        note = notes[index % len(notes)]
+        events.append((2 * index / rate, mido.Message("note_on", note=note, velocity=100)))
+        events.append(((2 * index + 1) / rate, mido.Message("note_off", note=note)))
+    return events
+
+def midi_file(path):
+    """Timed messages from a recorded .mid file."""
+    events, offset = [], 0.0
+    for message in mido.MidiFile(path):
+        offset += message.time
+        if not message.is_meta:
+            events.append((offset, message))
+    return events
+
+def audio_file(path):
+    """Virtual MIDI from a recorded WAV file, as audioInput.py produces it live."""
+    import audioInput
+    return audioInput.audio_events(path)
+
+def replay(events, handle):
+    """Feed events to `handle` at their offsets from now."""
+    start = time.monotonic()
+    for offset, message in events:
+        delay = start + offset - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        handle(message)
+
+class Recorder:
+    """Collects scheduler acks as MIDI-to-ack latencies."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+
+    def on_ack(self, target, queued_at, ok):
+        if ok:
+            with self.lock:
+                self.latencies.append(time.monotonic() - queued_at)
+
+    def reset(self):
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+        return latencies
+
+def run_scenario(name, events, hue, scheduler, recorder, bridge, drain_timeout=10.0):
+    """Replay one event list and return its report."""
+    recorder.reset()
+    scheduler_before = scheduler.stats()
+    bridge_before = dict(bridge.stats)
+
+    start = time.monotonic()
+    replay(events, hue.process_midi_message)
+    deadline = time.monotonic() + drain_timeout
+    while scheduler.stats()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - start
+
+    latencies = recorder.reset()
+    scheduler_after = scheduler.stats()
+    delta = {key: scheduler_after[key] - scheduler_before[key] for key in ("submitted", "merged", "dropped", "sent", "failed")}
+    return {
+        "scenario": name,
+        "midi_events": len(events),
+        "commands": delta["sent"],
+        "commands_per_second": delta["sent"] / elapsed,
+        "coalesced": delta["merged"],
+        "superseded": delta["dropped"],
+        "failed": delta["failed"],
+        "bridge_rate_limited": bridge.stats["rate_limited"] - bridge_before["rate_limited"],
+        "bridge_dropped": bridge.stats["dropped"] - bridge_before["dropped"],
+        "latency_p50_ms": 1000 * percentile(latencies, 50),
+        "latency_p95_ms": 1000 * percentile(latencies, 95),
+        "latency_p99_ms": 1000 * percentile(latencies, 99),
+        "latency_max_ms": 1000 * max(latencies, default=0.0),
+    }
+
+def print_report(report):
+    print(f"\n{report['scenario']}: {report['midi_events']} MIDI events -> {report['commands']} commands "
+          f"({report['commands_per_second']:.1f}/s)")
+    print(f"  MIDI-to-ack latency ms: p50 {report['latency_p50_ms']:.1f}, p95 {report['latency_p95_ms']:.1f}, "
+          f"p99 {report['latency_p99_ms']:.1f}, max {report['latency_max_ms']:.1f}")
+    print(f"  coalesced {report['coalesced']}, superseded {report['superseded']}, failed {report['failed']}, "
+          f"bridge rate-limited {report['bridge_rate_limited']}, bridge dropped {report['bridge_dropped']}")
+
+# Main Script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HueMIDI against a fake bridge.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per synthetic scenario")
+    parser.add_argument("--midi-rate", type=float, default=100.0, help="Synthetic MIDI messages per second")
+    parser.add_argument("--midi-file", action="append", default=[], help="Recorded .mid file to replay (repeatable)")
+    parser.add_argument("--audio-file", action="append", default=[], help="Recorded .wav file to analyze and replay (repeatable)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake bridge latency per request, seconds")
+    parser.add_argument("--bridge-rate", type=float, default=10.0, help="Fake bridge command rate limit (0 = unlimited)")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of bridge connections dropped")
+    parser.add_argument("--json", help="Write the reports to this file")
+    parser.add_argument("--max-p95-ms", type=float, help="Fail if any scenario's p95 latency exceeds this")
+    parser.add_argument("--min-commands-per-second", type=float, help="Fail if any scenario sends fewer commands per second")
+    args = parser.parse_args()
+
+    bridge = FakeBridge(latency=args.latency, rate_limit=args.bridge_rate or None, drop_rate=args.drop_rate).start()
+
+    # Point the scripts at the fake bridge before they load their settings
+    os.environ["BRIDGE_IP"] = bridge.address
+    os.environ["USERNAME"] = "benchmark"
+    os.environ["BRIDGES"] = ""
+    os.environ["HUE_OUTPUT"] = "rest"
+    os.environ["HUE_INVENTORY_PATH"] = os.path.join(tempfile.gettempdir(), "huemidi-benchmark-inventory.json")  # Keep the fake bridge out of the real inventory
+    import hue
+    from commandScheduler import get_scheduler
+
+    recorder = Recorder()
+    # hue.py sends through this scheduler; get_scheduler raises if it already ran without the recorder
+    scheduler = get_scheduler(hue.bridges.clients[0], on_ack=recorder.on_ack)
+
+    scenarios = [("cc_sweep", cc_sweep(args.duration, args.midi_rate)), ("note_bursts", note_bursts(args.duration, args.midi_rate))]
+    scenarios += [(os.path.basename(path), midi_file(path)) for path in args.midi_file]
+    scenarios += [(os.path.basename(path), audio_file(path)) for path in args.audio_file]
+
+    reports = []
+    for name, events in scenarios:
+        report = run_scenario(name, events, hue, scheduler, recorder, bridge)
+        print_report(report)
+        reports.append(report)
+    bridge.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    failures = []
+    for report in reports:
+        if args.max_p95_ms is not None and report["latency_p95_ms"] > args.max_p95_ms:
+            failures.append(f"{report['scenario']}: p95 latency {report['latency_p95_ms']:.1f} ms > {args.max_p95_ms} ms")
+        if args.min_commands_per_second is not None and report["commands_per_second"] < args.min_commands_per_second:
+            failures.append(f"{report['scenario']}: {report['commands_per_second']:.1f} commands/s < {args.min_commands_per_second}")
+    for failure in failures:
+        print("FAIL", failure)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,145 @@
+# bridgeMap.py
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from dotenv import load_dotenv
+from hueClient import get_client
+from commandScheduler import get_scheduler
+from lightGroups import get_group_cache
+from lightInventory import get_inventory
+
+logger = logging.getLogger(__name__)
+
+# Several bridges share one light namespace: a global light ID is the bridge's
+# position in BRIDGES times LIGHT_ID_STRIDE plus the bridge's own light ID, so
+# the first bridge keeps its IDs (5 is light 5 on bridge 0, 1005 is light 5 on
+# bridge 1). BRIDGES is a comma-separated list of username@ip entries; without
+# it the single BRIDGE_IP/USERNAME pair is used.
+load_dotenv()
+LIGHT_ID_STRIDE = 1000
+
+def load_bridges():
+    """Return the configured bridges as a list of (bridge_ip, username)."""
+    bridges = []
+    for entry in os.getenv("BRIDGES", "").split(","):
+        entry = entry.strip()
+        if entry:
+            username, _, bridge_ip = entry.rpartition("@")
+            bridges.append((bridge_ip, username))
+    return bridges or [(os.getenv("BRIDGE_IP"), os.getenv("USERNAME"))]
+
+def split_id(light_id):
+    """Split a global light ID into (bridge index, local light ID)."""
+    return divmod(int(light_id), LIGHT_ID_STRIDE)
+
+def global_id(index, local_id):
+    return index * LIGHT_ID_STRIDE + int(local_id)
+
+class BridgeRouter:
+    """Routes commands for global light IDs to the bridge that owns each light.
+
+    Every bridge has its own pooled client and its own rate-limited
+    scheduler, so a busy bridge never holds back commands for another.
+    """
+
+    def __init__(self, bridges, light_ids=()):
+        self.bridges = bridges
+        local_ids = {}
+        for light_id in light_ids:
+            index, local_id = split_id(light_id)
+            local_ids.setdefault(index, []).append(local_id)
+        self.clients = [get_client(bridge_ip, username, light_ids=local_ids.get(index, ()))
+                        for index, (bridge_ip, username) in enumerate(bridges)]
+        self.pool = ThreadPoolExecutor(max_workers=len(bridges))  # One synchronous fan-out per bridge
+
+    def route(self, light_id):
+        """Return (client, local light ID) for a global light ID."""
+        index, local_id = split_id(light_id)
+        if not 0 <= index < len(self.clients):
+            raise KeyError(f"Light {light_id} is on bridge {index}, but only {len(self.clients)} are configured")
+        return self.clients[index], local_id
+
+    def set_light_state(self, light_id, state_data):
+        """Send a command right away, trimmed to what the light supports ([] if nothing is left).
+
+        It skips the scheduler's queue, so the scheduler's shadow forgets the light first.
+        """
+        client, local_id = self.route(light_id)
+        state_data = get_inventory(client).filter(local_id, state_data)
+        if state_data is None:
+            return []
+        get_scheduler(client).shadow.bypass(local_id)
+        return client.set_light_state(local_id, state_data)
+
+    def gamut(self, light_id):
+        """The light's colour gamut from its bridge's saved inventory, or None."""
+        client, local_id = self.route(light_id)
+        return get_inventory(client).gamut(local_id)
+
+    def submit(self, light_id, state_data, trace_id=0, ack=False):
+        """Queue a command on the owning bridge's scheduler; with `ack=True`, return its Future."""
+        client, local_id = self.route(light_id)
+        return get_scheduler(client).submit(local_id, state_data, trace_id, ack)
+
+    def submit_group(self, group_id, state_data, trace_id=0, ack=False):
+        """Queue a group action; group 0 (all lights) goes to every bridge.
+
+        With `ack=True`, returns a Future (a list of them for group 0).
+        """
+        if int(group_id) == 0:
+            return [get_scheduler(client).submit_group(0, state_data, trace_id, ack) for client in self.clients]
+        client, local_id = self.route(group_id)
+        return get_scheduler(client).submit_group(local_id, state_data, trace_id, ack)
+
+    def apply(self, states):
+        """Send {light_id: state} targets, one group-aware batch per bridge, bridges in parallel."""
+        by_bridge = {}
+        for light_id, state_data in states.items():
+            index, local_id = split_id(light_id)
+            by_bridge.setdefault(index, {})[local_id] = state_data
+        if len(by_bridge) == 1:
+            index, local_states = by_bridge.popitem()
+            return get_group_cache(self.clients[index]).apply(local_states)
+        futures = [self.pool.submit(get_group_cache(self.clients[index]).apply, local_states)
+                   for index, local_states in by_bridge.items()]
+        return [future.result() for future in futures]
+
+    def get_lights(self):
+        """Return the merged inventory of every bridge, keyed by global light ID."""
+        lights = {}
+        for index, client in enumerate(self.clients):
+            bridge_lights = client.get_lights()
+            get_inventory(client).update(bridge_lights)
+            get_scheduler(client).shadow.sync({light_id: info["state"] for light_id, info in bridge_lights.items()})
+            for local_id, info in bridge_lights.items():
+                lights[str(global_id(index, local_id))] = info
+        return lights
+
+    def health(self):
+        """Return reachability, scheduler stats and recent Hue errors for each bridge."""
+        health = []
+        for index, ((bridge_ip, _), client) in enumerate(zip(self.bridges, self.clients)):
+            entry = {"bridge": index, "bridge_ip": bridge_ip, "reachable": True}
+            try:
+                client.get("/config").raise_for_status()
+            except requests.exceptions.RequestException as e:
+                entry.update(reachable=False, error=str(e))
+            scheduler = get_scheduler(client)
+            entry["scheduler"] = scheduler.stats()
+            entry["recent_errors"] = [{"target": target, **error} for target, error in list(scheduler.errors)[-10:]]
+            health.append(entry)
+        return health
+
+# Shared router for the configured bridges
+_router = None
+_router_lock = threading.Lock()
+
+def get_router(light_ids=()):
+    """Return the shared router for BRIDGES (or BRIDGE_IP), creating it on first use."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = BridgeRouter(load_bridges(), light_ids)
+    return _router
@@ -0,0 +1,177 @@
+# colorConvert.py
+import os
+import time
+import threading
+import argparse
+from functools import lru_cache
+import numpy as np
+from dotenv import load_dotenv
+
+# RGB to CIE xy for Hue lights. Each lamp can only show colours inside its
+# gamut triangle (A, B or C, saved per light in the inventory), so a colour is
+# converted with the Wide RGB D65 matrix Philips publishes and then clamped to
+# the nearest point of that triangle. Single colours are memoized; whole-rig
+# frames go through one lookup table per gamut, built on first use, so a frame
+# is a few array indexing operations however many lights it has. Colour and
+# brightness are separate in xy, so each colour is scaled up to full brightness
+# before the lookup and the table only covers the three faces of the RGB cube
+# where one channel is at its maximum.
+load_dotenv()
+COLOR_LUT_BITS = int(os.getenv("COLOR_LUT_BITS", 8))  # Table resolution per RGB channel (8 = every level, 1.5 MB per gamut)
+
+GAMUTS = {  # Red, green, blue corners in CIE xy
+    "A": ((0.704, 0.296), (0.2151, 0.7106), (0.138, 0.08)),
+    "B": ((0.675, 0.322), (0.409, 0.518), (0.167, 0.04)),
+    "C": ((0.6915, 0.3083), (0.17, 0.7), (0.1532, 0.0475)),
+}
+GAMUT_NAMES = tuple(GAMUTS)
+DEFAULT_GAMUT = "C"  # For lights that don't report one
+WHITE_POINT = (0.3127, 0.329)  # D65, used for black
+RGB_TO_XYZ = np.array([
+    [0.664511, 0.154324, 0.162028],
+    [0.283881, 0.668433, 0.047685],
+    [0.000088, 0.072310, 0.986039],
+])
+XYZ_TO_RGB = np.linalg.inv(RGB_TO_XYZ)
+
+def gamut_name(gamut):
+    """The gamut letter to use for a light's reported gamut (None or "other" fall back to DEFAULT_GAMUT)."""
+    return gamut if gamut in GAMUTS else DEFAULT_GAMUT
+
+def clamp_to_gamut(xy, gamut=None):
+    """Move xy points (..., 2) outside a gamut triangle to the nearest point on its edge."""
+    corners = np.array(GAMUTS[gamut_name(gamut)])
+    edges = np.roll(corners, -1, axis=0) - corners
+    points = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    relative = points[:, None, :] - corners[None]  # (N, 3 edges, 2)
+    cross = edges[:, 0] * relative[..., 1] - edges[:, 1] * relative[..., 0]
+    inside = (cross >= 0).all(axis=1) | (cross <= 0).all(axis=1)
+    along = np.clip((relative * edges).sum(axis=-1) / (edges ** 2).sum(axis=-1), 0, 1)
+    closest = corners + along[..., None] * edges
+    nearest = closest[np.arange(len(points)), ((points[:, None] - closest) ** 2).sum(axis=-1).argmin(axis=1)]
+    return np.where(inside[:, None], points, nearest).reshape(np.shape(xy))
+
+def srgb_to_xy(rgb, gamut=None):
+    """Exact conversion of sRGB colours (..., 3) in 0-1 to xy (..., 2) inside a gamut."""
+    rgb = np.asarray(rgb, dtype=np.float64)
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ RGB_TO_XYZ.T
+    total = xyz.sum(axis=-1, keepdims=True)
+    xy = np.where(total > 0, xyz[..., :2] / np.where(total > 0, total, 1), WHITE_POINT)
+    return clamp_to_gamut(xy, gamut)
+
+def brightness(rgb):
+    """Hue brightness (0-254) of 8-bit RGB colours (..., 3): their brightest channel."""
+    return (np.asarray(rgb).max(axis=-1).astype(np.int32) * 254 + 127) // 255
+
+@lru_cache(maxsize=4096)
+def rgb_to_xy(red, green, blue, gamut=None):
+    """Exact ((x, y), bri) for one 8-bit RGB colour; memoized, since palettes repeat.
+
+    xy is the colour's at full brightness and bri carries the level, as the lamp shows it.
+    """
+    peak = max(red, green, blue, 1)
+    x, y = srgb_to_xy(np.array([red, green, blue]) / peak, gamut)
+    return (round(float(x), 4), round(float(y), 4)), int(brightness((red, green, blue)))
+
+def rgb_state(red, green, blue, gamut=None):
+    """A light state for an 8-bit RGB colour; black turns the light off."""
+    xy, bri = rgb_to_xy(int(red), int(green), int(blue), gamut)
+    if bri == 0:
+        return {"on": False}
+    return {"on": True, "xy": list(xy), "bri": bri}
+
+def xy_to_rgb(x, y, bri=254):
+    """Approximate sRGB (0-1 each) of an xy colour at a brightness, for RGB outputs such as streaming."""
+    if y <= 0:
+        return 0.0, 0.0, 0.0
+    linear = XYZ_TO_RGB @ np.array([x / y, 1.0, (1 - x - y) / y])
+    linear = np.clip(linear, 0, None)
+    linear /= max(linear.max(), 1e-9)
+    rgb = np.where(linear <= 0.0031308, 12.92 * linear, 1.055 * linear ** (1 / 2.4) - 0.055)
+    return tuple(float(channel) * bri / 254 for channel in rgb)
+
+# Lookup tables: (gamut, brightest channel, other two channels) -> xy
+OTHER_CHANNELS = np.array([[1, 2], [0, 2], [0, 1]])
+_tables = None
+_tables_lock = threading.Lock()
+
+def get_tables():
+    """Return the (gamuts, 3 * levels**2, 2) float32 xy table, building it on first use."""
+    global _tables
+    with _tables_lock:
+        if _tables is None:
+            levels = np.linspace(0, 1, 1 << COLOR_LUT_BITS)
+            others = np.stack(np.meshgrid(levels, levels, indexing="ij"), axis=-1).reshape(-1, 2)
+            faces = []
+            for channel, (first, second) in enumerate(OTHER_CHANNELS):
+                face = np.ones((len(others), 3))
+                face[:, first], face[:, second] = others[:, 0], others[:, 1]
+                faces.append(face)
+            grid = np.concatenate(faces)
+            _tables = np.stack([srgb_to_xy(grid, gamut) for gamut in GAMUT_NAMES]).astype(np.float32)
+    return _tables
+
+def gamut_indexes(gamuts):
+    """Table row for each light's gamut, to pass to rgb_frame() frame after frame."""
+    return np.array([GAMUT_NAMES.index(gamut_name(gamut)) for gamut in gamuts], dtype=np.intp)
+
+def rgb_frame(rgb, gamuts):
+    """Convert a whole-rig frame of 8-bit RGB (N, 3) to xy (N, 2) and bri (N,) via the tables.
+
+    `gamuts` is one gamut per light, or gamut_indexes() of them. Black comes
+    back with bri 0 and the white point.
+    """
+    rgb = np.asarray(rgb, dtype=np.int32)
+    if not isinstance(gamuts, np.ndarray):
+        gamuts = gamut_indexes(gamuts)
+    bits = COLOR_LUT_BITS
+    top = (1 << bits) - 1
+    peak = rgb.max(axis=1)
+    brightest = rgb.argmax(axis=1)
+    scaled = (rgb * (top / np.maximum(peak, 1))[:, None] + 0.5).astype(np.intp)  # At full brightness
+    first, second = OTHER_CHANNELS[brightest].T
+    rows = np.arange(len(rgb))
+    index = (brightest << (2 * bits)) | (scaled[rows, first] << bits) | scaled[rows, second]
+    xy = get_tables()[gamuts, index]
+    if not peak.all():
+        xy[peak == 0] = WHITE_POINT
+    return xy, (peak * 254 + 127) // 255
+
+def rgb_states(rgb, gamuts):
+    """Light states for a frame of 8-bit RGB colours, in order; black turns a light off."""
+    xy, bri = rgb_frame(rgb, gamuts)
+    return [{"on": True, "xy": [round(float(x), 4), round(float(y), 4)], "bri": int(level)} if level else {"on": False}
+            for (x, y), level in zip(xy, bri)]
+
+# Main Script: compare table lookups with the exact conversion
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time RGB to xy conversion for a rig and check the table error.")
+    parser.add_argument("--lights", type=int, default=100, help="Lights per frame")
+    parser.add_argument("--frames", type=int, default=1000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    get_tables()
+    print(f"Tables: {len(GAMUT_NAMES)} gamuts x {3 << (2 * COLOR_LUT_BITS)} colours in {1000 * (time.perf_counter() - start):.0f} ms")
+
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, (args.frames, args.lights, 3))
+    gamuts = gamut_indexes([GAMUT_NAMES[index % len(GAMUT_NAMES)] for index in range(args.lights)])
+    start = time.perf_counter()
+    for frame in frames:
+        rgb_frame(frame, gamuts)
+    per_frame = (time.perf_counter() - start) / args.frames
+    print(f"Table lookup: {1e6 * per_frame:.1f} us per {args.lights}-light frame")
+
+    start = time.perf_counter()
+    for frame in frames[:100]:
+        full = frame / np.maximum(frame.max(axis=1, keepdims=True), 1)
+        for index, gamut in enumerate(GAMUT_NAMES):
+            srgb_to_xy(full[gamuts == index], gamut)
+    print(f"Exact conversion: {1e6 * (time.perf_counter() - start) / 100:.1f} us per frame")
+
+    colors = rng.integers(1, 256, (20000, 3))
+    full = colors / colors.max(axis=1, keepdims=True)
+    errors = [np.abs(rgb_frame(colors, [gamut] * len(colors))[0] - srgb_to_xy(full, gamut)).max() for gamut in GAMUT_NAMES]
+    print(f"Max table error in xy: {max(errors):.4f}")
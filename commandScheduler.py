@@ -0,0 +1,315 @@
+# commandScheduler.py
+import os
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from dotenv import load_dotenv
+import metrics
+from shadowState import ShadowState
+from lightInventory import get_inventory
+
+logger = logging.getLogger(__name__)
+
+# The bridge handles roughly 10 light commands per second
+load_dotenv()
+RATE_LIMIT = float(os.getenv("HUE_RATE_LIMIT", 10))
+PIPELINE = int(os.getenv("HUE_PIPELINE", 2))  # Requests in flight per bridge, never two for one light
+ERROR_HISTORY = 100  # Recent Hue errors kept per scheduler
+SHADOW_POLL = float(os.getenv("HUE_SHADOW_POLL", 5))  # Seconds between state polls that catch changes made elsewhere (0 = off)
+
+class PendingCommands:
+    """Latest-wins buffer of light commands waiting to go to the bridge.
+
+    Each target (a light ID, or ("group", id)) holds at most one pending
+    state. A newer command for the same target is merged into it, so `bri`/`hue`/`sat`/`ct` changes go out as one
+    PUT body and an attribute that is set again replaces the older value.
+    """
+
+    def __init__(self):
+        self.pending = OrderedDict()  # Target -> state, oldest first
+        self.queued_at = {}  # Target -> monotonic time of its oldest merged update
+        self.traces = {}  # Target -> trace ID of its newest merged update
+        self.futures = {}  # Target -> futures waiting for the merged command's ack
+        self.lock = threading.Lock()
+        self.stats = {"submitted": 0, "merged": 0, "dropped": 0, "sent": 0, "failed": 0}
+
+    def add(self, light_id, state_data, trace_id=0, future=None):
+        with self.lock:
+            self.stats["submitted"] += 1
+            self.traces[light_id] = trace_id
+            if future is not None:
+                self.futures.setdefault(light_id, []).append(future)
+            current = self.pending.get(light_id)
+            if current is None:
+                self.pending[light_id] = dict(state_data)
+                self.queued_at[light_id] = time.monotonic()
+                return
+            self.stats["merged"] += 1
+            for key, value in state_data.items():
+                if key in current:
+                    self.stats["dropped"] += 1  # Superseded before it was sent
+                current[key] = value
+
+    def pop(self, skip=()):
+        """Remove and return the oldest (light_id, state, queued_at, trace_id, futures) entry, or None.
+
+        Targets in `skip` (for example ones with a request in flight) stay queued.
+        """
+        with self.lock:
+            for light_id in self.pending:
+                if light_id not in skip:
+                    break
+            else:
+                return None
+            state_data = self.pending.pop(light_id)
+            return (light_id, state_data, self.queued_at.pop(light_id), self.traces.pop(light_id),
+                    self.futures.pop(light_id, ()))
+
+    def __len__(self):
+        return len(self.pending)
+
+def hue_errors(results):
+    """Return the error entries of a Hue response body."""
+    if not isinstance(results, list):
+        return []
+    return [result["error"] for result in results if isinstance(result, dict) and "error" in result]
+
+class CommandScheduler:
+    """Sends coalesced light commands to one bridge at a fixed rate.
+
+    Sending is fire-and-forget: `submit` returns at once, up to `pipeline`
+    requests run concurrently, and responses are parsed on a separate
+    thread. Per-light Hue errors are kept in `errors` and passed to
+    `on_error(target, error)`. `on_ack(target, queued_at, ok)` is called
+    after each response, with the monotonic time the oldest update in that
+    command was queued. Callers that need confirmation pass `ack=True` to
+    get a Future of the Hue response body.
+
+    Each command is trimmed to the attributes its light supports and diffed
+    against the last acknowledged state of its target right before it goes
+    out; unchanged attributes are stripped and a command with nothing left
+    is not sent (its futures resolve to `[]`). Every `poll` seconds the
+    bridge's light states are checked against that shadow, so lights changed
+    from elsewhere are sent in full again.
+    """
+
+    def __init__(self, client, rate=RATE_LIMIT, on_ack=None, on_error=None, pipeline=PIPELINE, poll=SHADOW_POLL):
+        self.client = client
+        self.poll = poll
+        self.on_ack = on_ack
+        self.on_error = on_error
+        self.interval = 1.0 / rate
+        self.commands = PendingCommands()
+        self.shadow = ShadowState()
+        self.inventory = get_inventory(client)
+        self.errors = deque(maxlen=ERROR_HISTORY)  # (target, Hue error) pairs, newest last
+        self.in_flight = set()  # Targets with a request on the wire
+        self.slots = threading.Semaphore(pipeline)
+        self.io = ThreadPoolExecutor(max_workers=pipeline)
+        self.responses = queue.SimpleQueue()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._parser = threading.Thread(target=self._parse, daemon=True)
+        self._poller = threading.Thread(target=self._poll, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._parser.start()
+        if self.poll > 0:
+            self._poller.start()
+        return self
+
+    def stop(self, flush=True):
+        """Stop the worker, optionally sending whatever is still pending first."""
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+        self.io.shutdown(wait=True)  # Let in-flight requests finish before their targets go again
+        while flush:
+            item = self.commands.pop()
+            if item is None:
+                break
+            self._request(item, time.perf_counter())  # Sent whole: earlier acks may not be parsed yet
+        self.responses.put(None)
+        self._parser.join()
+
+    def submit(self, light_id, state_data, trace_id=0, ack=False):
+        """Queue a command without blocking; it may be merged with newer ones.
+
+        With `ack=True`, returns a Future resolved with the bridge's response
+        to the command this update went out in.
+        """
+        future = Future() if ack else None
+        self.commands.add(light_id, state_data, trace_id, future)
+        metrics.QUEUE_DEPTH.set(len(self.commands), "scheduler")
+        self._wake.set()
+        return future
+
+    def submit_group(self, group_id, state_data, trace_id=0, ack=False):
+        """Queue a group action; it is coalesced like a light command."""
+        return self.submit(("group", group_id), state_data, trace_id, ack)
+
+    def stats(self):
+        with self.commands.lock:
+            stats = dict(self.commands.stats)
+        stats["pending"] = len(self.commands)
+        stats["in_flight"] = len(self.in_flight)
+        stats["errors"] = len(self.errors)
+        with self.shadow.lock:
+            stats.update(self.shadow.stats)
+        stats["filtered"] = self.inventory.stats["filtered"]
+        return stats
+
+    def _trim(self, target, state_data):
+        """Return the part of a command worth sending, or None."""
+        if not isinstance(target, tuple):
+            state_data = self.inventory.filter(target, state_data)
+            if state_data is None:
+                return None
+        return self.shadow.diff(target, state_data)
+
+    def _request(self, item, started):
+        """Send one command and hand the raw response to the parser thread."""
+        target = item[0]
+        try:
+            if isinstance(target, tuple):
+                response = self.client.put(f"/groups/{target[1]}/action", item[1])
+            else:
+                response = self.client.put_light_state(target, item[1])
+        except requests.exceptions.RequestException as e:
+            response = e
+        self.responses.put((item, response, time.perf_counter() - started))
+
+    def _dispatch(self, item):
+        target, state_data, queued_at, trace_id, futures = item
+        if metrics.ENABLED:
+            metrics.QUEUE_DEPTH.set(len(self.commands), "scheduler")
+            metrics.QUEUE_WAIT_SECONDS.observe(time.monotonic() - queued_at, "scheduler")
+            metrics.trace(trace_id, "send", target=target)
+        self.in_flight.add(target)
+
+        def send():
+            try:
+                self._request(item, time.perf_counter())
+            except Exception as e:
+                self.responses.put((item, e, 0.0))  # The parser still has to release the target
+            finally:
+                self.slots.release()
+                self._wake.set()
+
+        self.io.submit(send)
+
+    def _parse(self):
+        """Parse responses, record errors and resolve acks, off the send path."""
+        while True:
+            entry = self.responses.get()
+            if entry is None:
+                return
+            (target, state_data, queued_at, trace_id, futures), response, elapsed = entry
+            results, ok = None, False
+            if isinstance(response, Exception):
+                self.shadow.invalidate(target)
+                with self.commands.lock:  # Shared with the submitting threads
+                    self.commands.stats["failed"] += 1
+                logger.error("Failed to send command to %s: %s", target, str(response))
+            else:
+                try:
+                    results = response.json()
+                    ok = True
+                except ValueError as e:
+                    response = e
+                    logger.error("Unreadable response for %s: %s", target, str(e))
+                with self.commands.lock:
+                    self.commands.stats["sent" if ok else "failed"] += 1
+                self.shadow.ack(target, results)
+                for error in hue_errors(results):
+                    self.errors.append((target, error))
+                    logger.warning("Bridge error for %s: %s", target, error.get("description", error))
+                    if self.on_error is not None:
+                        self.on_error(target, error)
+            # Only now can the target go again: its next diff needs this ack
+            self.in_flight.discard(target)
+            self._wake.set()
+
+            if metrics.ENABLED:
+                light = f"group/{target[1]}" if isinstance(target, tuple) else target
+                metrics.BRIDGE_REQUEST_SECONDS.observe(elapsed, "PUT", "groups" if isinstance(target, tuple) else "lights")
+                if ok:
+                    metrics.count_errors(results, self.client.bridge_ip, light)
+                else:
+                    metrics.BRIDGE_ERRORS.inc(self.client.bridge_ip, str(light))
+                metrics.MIDI_TO_ACK_SECONDS.observe(time.monotonic() - queued_at, "scheduler")
+                metrics.trace(trace_id, "ack", ok=ok)
+            for future in futures:
+                if ok:
+                    future.set_result(results)
+                else:
+                    future.set_exception(response)
+            if self.on_ack is not None:
+                self.on_ack(target, queued_at, ok)
+
+    def _poll(self):
+        """Check the shadow against the bridge's light states, so changes from the Hue app or other clients are noticed."""
+        while not self._stopped.wait(self.poll):
+            if not self.shadow.states:
+                continue  # Nothing to check
+            try:
+                lights = self.client.get_lights()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.debug("Shadow state poll failed: %s", str(e))
+                continue
+            if isinstance(lights, dict):
+                self.shadow.sync({light_id: info["state"] for light_id, info in lights.items() if "state" in info})
+
+    def _run(self):
+        next_send = time.monotonic()
+        while not self._stopped.is_set():
+            # Hold off until the rate budget allows another command
+            delay = next_send - time.monotonic()
+            if delay > 0 and self._stopped.wait(delay):
+                break
+            self.slots.acquire()
+            if self._stopped.is_set():
+                self.slots.release()
+                break
+
+            self._wake.clear()
+            item = self.commands.pop(skip=self.in_flight)
+            if item is None:
+                self.slots.release()
+                self._wake.wait()
+                continue
+            changed = self._trim(item[0], item[1])
+            if changed is None:
+                # Nothing would change, so it costs no rate budget
+                self.slots.release()
+                for future in item[4]:
+                    future.set_result([])
+                continue
+            item = (item[0], changed, *item[2:])
+
+            next_send = max(next_send, time.monotonic()) + self.interval
+            self._dispatch(item)
+
+# Shared schedulers, one per bridge client
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(client, **kwargs):
+    """Return the running scheduler for a client, starting it on first use.
+
+    Settings only apply to the first call; asking for different ones once the
+    scheduler runs raises ValueError rather than silently ignoring them.
+    """
+    with _schedulers_lock:
+        entry = _schedulers.get(client)
+        if entry is None:
+            entry = _schedulers[client] = (CommandScheduler(client, **kwargs).start(), kwargs)
+        elif kwargs and kwargs != entry[1]:
+            raise ValueError(f"the scheduler for {client.bridge_ip} is already running with other settings")
+    return entry[0]
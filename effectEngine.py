@@ -0,0 +1,111 @@
+# effectEngine.py
+import heapq
+import inspect
+import logging
+import itertools
+import threading
+from showClock import WallClock
+
+logger = logging.getLogger(__name__)
+
+STOPPED_RECHECK = 0.05  # Seconds between checks while the clock's transport is stopped
+
+class EffectEngine:
+    """Runs light effects as scheduled, cancellable steps on one background thread.
+
+    An effect is a generator: each step sends its commands and then yields
+    the time until its next step, in the clock's units (seconds on the
+    default WallClock, beats on a TempoClock). Deadlines are absolute
+    positions on the clock, so steps stay on the beat grid when the tempo
+    changes or a step runs late; an overdue step runs at once and the next
+    one is still due at its grid position. Every step after the first is
+    sent its deadline, so effects can tell how late they are (see
+    showClock.step_effect, which skips missed steps). Effects are keyed (for
+    example by effect name and target light), so triggering a key that is
+    already running restarts it and effects on different keys overlap.
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock or WallClock()
+        self.queue = []  # (deadline, order, key, effect)
+        self.active = {}  # Key -> the effect currently allowed to run
+        self.order = itertools.count()
+        self.steps = 0  # Steps run so far
+        self.condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        with self.condition:
+            self._stopped = True
+            self.active.clear()
+            self.condition.notify_all()
+        self._thread.join()
+
+    def trigger(self, key, effect, delay=0.0):
+        """Start (or restart) an effect generator under a key, `delay` clock units from now."""
+        with self.condition:
+            self.active[key] = effect
+            heapq.heappush(self.queue, (self.clock.position() + delay, next(self.order), key, effect))
+            self.condition.notify()
+
+    def stop(self, key):
+        """Cancel the effect running under a key, if any."""
+        with self.condition:
+            self.active.pop(key, None)
+            self.condition.notify_all()
+
+    def current_step(self):
+        """Number of the step running on the calling thread, or None outside the engine."""
+        return self.steps if threading.current_thread() is self._thread else None
+
+    def running(self, key):
+        return key in self.active
+
+    def wait(self):
+        """Block until no effects are running."""
+        with self.condition:
+            while self.active and not self._stopped:
+                self.condition.wait()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self._stopped:
+                    if self.queue:
+                        delay = self.clock.seconds_until(self.queue[0][0])
+                        if delay is not None and delay <= 0:
+                            break
+                        self.condition.wait(STOPPED_RECHECK if delay is None else delay)
+                    else:
+                        self.condition.wait()
+                if self._stopped:
+                    return
+                deadline, _, key, effect = heapq.heappop(self.queue)
+                if self.active.get(key) is not effect:
+                    continue  # Cancelled or retriggered since it was scheduled
+                self.steps += 1
+
+            # Run the step outside the lock so triggers never wait on it
+            try:
+                delay = next(effect) if inspect.getgeneratorstate(effect) == inspect.GEN_CREATED else effect.send(deadline)
+            except StopIteration:
+                delay = None
+            except Exception as e:
+                logger.error("Effect %s failed: %s", key, str(e))
+                delay = None
+
+            with self.condition:
+                if self.active.get(key) is not effect:
+                    continue
+                if delay is None:
+                    del self.active[key]
+                    if not self.active:
+                        self.condition.notify_all()  # Wake wait()
+                else:
+                    # Schedule from the step's deadline so timing stays on the grid, even after a late step
+                    heapq.heappush(self.queue, (deadline + delay, next(self.order), key, effect))
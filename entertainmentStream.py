@@ -0,0 +1,154 @@
+# entertainmentStream.py
+import os
+import math
+import time
+import socket
+import struct
+import colorsys
+import threading
+from dotenv import load_dotenv
+from colorConvert import xy_to_rgb
+
+# Streaming output settings
+load_dotenv()
+OUTPUT = os.getenv("HUE_OUTPUT", "rest")  # "rest" or "stream"
+STREAM_HOST = os.getenv("STREAM_HOST")  # Frame receiver such as streamReceiver.py; required for HUE_OUTPUT=stream
+STREAM_PORT = int(os.getenv("STREAM_PORT", 2100))
+STREAM_RATE = float(os.getenv("STREAM_RATE", 25))  # Frames per second (25-50)
+
+# Frames use the Hue Entertainment layout but go out as plain UDP, with no DTLS
+# handshake and no entertainment group activation, so a real bridge drops them.
+# They are meant for streamReceiver.py or a custom receiver.
+#
+# Hue Entertainment frame layout (API v1)
+#   header: "HueStream", version 1.0, sequence, 2 reserved, colour space, 1 reserved
+#   per light: type (0x00 = light), light ID (uint16), R, G, B (uint16 each)
+PROTOCOL = b"HueStream"
+HEADER_SIZE = 16
+LIGHT_SIZE = 9
+SEQUENCE_OFFSET = 11
+COLOR_SPACE_RGB = 0x00
+MAX_LIGHTS_PER_FRAME = 10  # The bridge reads at most 10 lights per message
+
+def build_frame(light_ids):
+    """Return a zeroed frame buffer with the header and light IDs filled in."""
+    frame = bytearray(HEADER_SIZE + LIGHT_SIZE * len(light_ids))
+    struct.pack_into(">9sBBBxxBx", frame, 0, PROTOCOL, 1, 0, 0, COLOR_SPACE_RGB)
+    for index, light_id in enumerate(light_ids):
+        struct.pack_into(">BH", frame, HEADER_SIZE + LIGHT_SIZE * index, 0x00, int(light_id))
+    return frame
+
+def ct_to_rgb(ct):
+    """Approximate the RGB colour (0-1 each) of a colour temperature in mireds."""
+    kelvin = 10000 / max(153, min(ct, 500))  # Hundreds of kelvin
+    if kelvin <= 66:
+        red = 255
+        green = 99.4708025861 * math.log(kelvin) - 161.1195681661
+        blue = 0 if kelvin <= 19 else 138.5177312231 * math.log(kelvin - 10) - 305.0447927307
+    else:
+        red = 329.698727446 * (kelvin - 60) ** -0.1332047592
+        green = 288.1221695283 * (kelvin - 60) ** -0.0755148492
+        blue = 255
+    return tuple(max(0.0, min(channel / 255, 1.0)) for channel in (red, green, blue))
+
+class EntertainmentStream:
+    """Streams the rig's colour state as fixed-size UDP frames to STREAM_HOST.
+
+    The receiver is streamReceiver.py or a custom one; a Hue bridge drops
+    these frames (see above). Frames are allocated once; light updates write
+    straight into them and each tick only bumps the sequence byte and sends
+    the buffers.
+    """
+
+    def __init__(self, light_ids, host=STREAM_HOST, port=STREAM_PORT, rate=STREAM_RATE):
+        self.rate = rate
+        self.interval = 1.0 / rate
+        self.frames = []
+        self.slots = {}  # Light ID -> (frame, offset of its RGB values)
+        for start in range(0, len(light_ids), MAX_LIGHTS_PER_FRAME):
+            chunk = light_ids[start:start + MAX_LIGHTS_PER_FRAME]
+            frame = build_frame(chunk)
+            self.frames.append(frame)
+            for index, light_id in enumerate(chunk):
+                self.slots[str(light_id)] = (frame, HEADER_SIZE + LIGHT_SIZE * index + 3)
+        self.states = {key: {"on": True, "bri": 254, "hue": 0, "sat": 0, "ct": 366, "xy": [0.3127, 0.329], "colormode": "hs"} for key in self.slots}
+
+        if not host:
+            raise ValueError("STREAM_HOST is not set: streaming needs a frame receiver such as streamReceiver.py")
+        self.sequence = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect((host, port))
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.sock.close()
+
+    def set_rgb(self, light_id, red, green, blue):
+        """Set a light's colour directly (16-bit channels, 0-65535)."""
+        frame, offset = self.slots[str(light_id)]
+        struct.pack_into(">HHH", frame, offset, red, green, blue)
+
+    def set_light_state(self, light_id, state_data):
+        """Apply a REST-style state body (on/bri/hue/sat/xy/ct) to the frame."""
+        state = self.states[str(light_id)]
+        state.update(state_data)
+        if "xy" in state_data:
+            state["colormode"] = "xy"
+        elif "ct" in state_data:
+            state["colormode"] = "ct"
+        elif "hue" in state_data or "sat" in state_data:
+            state["colormode"] = "hs"
+
+        if not state["on"]:
+            red = green = blue = 0.0
+        elif state["colormode"] == "ct":
+            level = state["bri"] / 254
+            red, green, blue = (channel * level for channel in ct_to_rgb(state["ct"]))
+        elif state["colormode"] == "xy":
+            red, green, blue = xy_to_rgb(*state["xy"], state["bri"])
+        else:
+            red, green, blue = colorsys.hsv_to_rgb(state["hue"] / 65535, state["sat"] / 254, state["bri"] / 254)
+        self.set_rgb(light_id, int(red * 65535), int(green * 65535), int(blue * 65535))
+        return [{"success": {f"/lights/{light_id}/state/{key}": value}} for key, value in state_data.items()]
+
+    def tick(self):
+        """Send the current frames once."""
+        self.sequence = (self.sequence + 1) & 0xFF
+        for frame in self.frames:
+            frame[SEQUENCE_OFFSET] = self.sequence
+            self.sock.send(frame)
+
+    def _run(self):
+        deadline = time.monotonic()
+        while not self._stopped.is_set():
+            try:
+                self.tick()
+            except OSError:
+                pass  # Nobody listening yet; keep the frame clock running
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                deadline = time.monotonic()  # Fell behind, don't burst to catch up
+            elif self._stopped.wait(delay):
+                break
+
+# Shared stream, started on first use
+_stream = None
+_stream_lock = threading.Lock()
+
+def get_stream(light_ids, **kwargs):
+    """Return the running stream for the rig, or None when HUE_OUTPUT is not "stream"."""
+    global _stream
+    if OUTPUT != "stream":
+        return None
+    with _stream_lock:
+        if _stream is None:
+            _stream = EntertainmentStream(list(light_ids), **kwargs).start()
+    return _stream
@@ -0,0 +1,207 @@
+# fakeBridge.py
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-in for a Philips Hue bridge (REST API v1), for benchmarks and
+# development without hardware. It serves lights, light state and groups,
+# and can add per-request latency, enforce a command rate limit and drop
+# connections.
+
+LIGHT_TYPES = [
+    ("Extended color light", "C"),
+    ("Extended color light", "C"),
+    ("Dimmable light", None),
+    ("Dimmable light", None),
+    ("Extended color light", "C"),
+]
+
+def make_lights(count):
+    """Build an inventory of colour and white lights, in the order of the sample rig."""
+    lights = {}
+    for index in range(count):
+        light_type, gamut = LIGHT_TYPES[index % len(LIGHT_TYPES)]
+        state = {"on": False, "bri": 254, "alert": "none", "reachable": True}
+        if gamut:
+            state.update(hue=0, sat=0, ct=366, xy=[0.3127, 0.329], colormode="ct")
+        lights[str(index + 1)] = {
+            "name": f"Fake {'Color' if gamut else 'White'} {index + 1}",
+            "type": light_type,
+            "modelid": "LCT015" if gamut else "LWB010",
+            "state": state,
+            "capabilities": {"control": {"colorgamuttype": gamut, "ct": {"min": 153, "max": 500}} if gamut else {}},
+        }
+    return lights
+
+class FakeBridge:
+    """Threaded HTTP server emulating the bridge, with adjustable misbehaviour."""
+
+    def __init__(self, host="127.0.0.1", port=0, lights=5, latency=0.0, rate_limit=None, drop_rate=0.0):
+        self.lights = make_lights(lights)
+        self.groups = {"0": {"name": "All lights", "type": "LightGroup", "lights": list(self.lights)}}
+        self.latency = latency
+        self.rate_limit = rate_limit  # Light and group commands per second, None for unlimited
+        self.drop_rate = drop_rate
+        self.stats = {"requests": 0, "commands": 0, "rate_limited": 0, "dropped": 0}
+        self.lock = threading.Lock()
+        self.tokens = rate_limit or 0
+        self.refilled_at = time.monotonic()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.address = f"{host}:{self.port}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def take_token(self):
+        """Spend one command from the token bucket; False when the bridge is over budget."""
+        if self.rate_limit is None:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.rate_limit, self.tokens + (now - self.refilled_at) * self.rate_limit)
+        self.refilled_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def _handler(self):
+        bridge = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real bridge
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, data, status=200):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def read_json(self):
+                length = int(self.headers.get("Content-Length", 0))
+                return json.loads(self.rfile.read(length) or b"null")
+
+            def error(self, error_type, description):
+                self.send_json([{"error": {"type": error_type, "address": self.path, "description": description}}])
+
+            def handle_request(self, method):
+                with bridge.lock:
+                    bridge.stats["requests"] += 1
+                    if bridge.drop_rate and random.random() < bridge.drop_rate:
+                        bridge.stats["dropped"] += 1
+                        self.close_connection = True
+                        return
+                if bridge.latency:
+                    time.sleep(bridge.latency)
+                data = self.read_json() if method in ("PUT", "POST") else None
+
+                if self.path.rstrip("/") in ("/api", "/api/config"):
+                    if method == "POST":
+                        return self.send_json([{"success": {"username": "fakebridgeuser"}}])
+                    return self.send_json({"name": "Fake bridge", "bridgeid": "FAKE000000000001", "apiversion": "1.50.0"})
+
+                match = re.fullmatch(r"/api/[^/]+/(lights|groups)(?:/(\w+))?(?:/(state|action))?/?", self.path)
+                if not match:
+                    return self.error(4, "method, " + method + ", not available for resource, " + self.path)
+                resource, item_id, command = match.groups()
+                items = bridge.lights if resource == "lights" else bridge.groups
+
+                if command and method == "PUT":
+                    with bridge.lock:
+                        allowed = bridge.take_token()
+                        if allowed:
+                            bridge.stats["commands"] += 1
+                        else:
+                            bridge.stats["rate_limited"] += 1
+                    if not allowed:
+                        return self.send_json([{"error": {"type": 901, "address": self.path, "description": "Internal error, 503"}}], 429)
+                    if item_id not in items:
+                        return self.error(3, f"resource, /{resource}/{item_id}, not available")
+                    prefix = f"/{resource}/{item_id}/{command}"
+                    unsupported = []
+                    if resource == "lights":
+                        # Like the real bridge, white lamps reject colour attributes one by one
+                        state = items[item_id]["state"]
+                        unsupported = [key for key in data if key not in ("transitiontime", "alert", "effect")
+                                       and key not in state and key.removesuffix("_inc") not in state]
+                        data = {key: value for key, value in data.items() if key not in unsupported}
+                    targets = [item_id] if resource == "lights" else items[item_id].get("lights", [])
+                    with bridge.lock:
+                        for target in targets:
+                            if target in bridge.lights:
+                                state = bridge.lights[target]["state"]
+                                state.update({k: v for k, v in data.items() if k in state})
+                    errors = [{"error": {"type": 6, "address": f"{prefix}/{key}", "description": f"parameter, {key}, not available"}}
+                              for key in unsupported]
+                    return self.send_json(errors + [{"success": {f"{prefix}/{key}": value}} for key, value in data.items()])
+
+                if method == "GET":
+                    if item_id is None:
+                        # Like the real bridge, group 0 (all lights) is not listed
+                        return self.send_json({key: value for key, value in items.items() if key != "0"})
+                    if item_id not in items:
+                        return self.error(3, f"resource, /{resource}/{item_id}, not available")
+                    return self.send_json(items[item_id])
+
+                if resource == "groups" and method == "POST" and item_id is None:
+                    with bridge.lock:
+                        group_id = str(max(int(key) for key in bridge.groups) + 1)
+                        bridge.groups[group_id] = data
+                    return self.send_json([{"success": {"id": group_id}}])
+
+                if resource == "groups" and method == "DELETE" and item_id in items:
+                    with bridge.lock:
+                        del bridge.groups[item_id]
+                    return self.send_json([{"success": f"/groups/{item_id} deleted"}])
+
+                return self.error(4, "method, " + method + ", not available for resource, " + self.path)
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_PUT(self):
+                self.handle_request("PUT")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+            def do_DELETE(self):
+                self.handle_request("DELETE")
+
+        return Handler
+
+# Main Script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in Hue bridge.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--lights", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every request")
+    parser.add_argument("--rate-limit", type=float, default=10, help="Commands per second before errors (0 = unlimited)")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of requests whose connection is dropped")
+    args = parser.parse_args()
+
+    bridge = FakeBridge("0.0.0.0", args.port, args.lights, args.latency, args.rate_limit or None, args.drop_rate)
+    print(f"Fake bridge on port {bridge.port}; set BRIDGE_IP=127.0.0.1:{bridge.port}")
+    try:
+        bridge.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Stats:", bridge.stats)
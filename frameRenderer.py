@@ -0,0 +1,62 @@
+# frameRenderer.py
+import numpy as np
+from showClock import run_steps
+
+# Effect definitions map a channel to a constant or a wave:
+#   {"hue": {"wave": "saw", "low": 0, "high": 65535, "period": 4.0, "spread": 0.1},
+#    "sat": 254,
+#    "bri": {"wave": "steps", "values": [254, 100], "period": 1.0}}
+# `period` is in seconds (beats when played on a TempoClock) and `spread`
+# offsets each successive light's phase by that fraction of a period. Channels left out are not sent.
+CHANNELS = ("hue", "sat", "bri", "ct")
+UNSET = -1
+
+WAVES = {
+    "saw": lambda x: x,
+    "sine": lambda x: 0.5 - 0.5 * np.cos(2 * np.pi * x),
+    "triangle": lambda x: 1 - np.abs(2 * x - 1),
+    "square": lambda x: (x < 0.5).astype(float),
+}
+
+def render_channel(spec, n_lights, frames, fps):
+    """Render one channel as an (n_lights, frames) array."""
+    if not isinstance(spec, dict):
+        return np.full((n_lights, frames), spec, dtype=np.int32)
+
+    # Phase of every light at every frame, in periods (0-1)
+    t = np.arange(frames) / fps
+    offsets = np.arange(n_lights)[:, None] * spec.get("spread", 0.0)
+    x = (t[None, :] / spec["period"] + offsets) % 1.0
+
+    if spec["wave"] == "steps":
+        values = np.asarray(spec["values"], dtype=np.int32)
+        return values[np.minimum((x * len(values)).astype(np.intp), len(values) - 1)]
+    low, high = spec.get("low", 0), spec["high"]
+    return (low + WAVES[spec["wave"]](x) * (high - low)).astype(np.int32)
+
+def render(effect, n_lights, frames, fps=25):
+    """Render an effect as an (n_lights, frames, channels) int array in one pass.
+
+    Channels follow CHANNELS; channels the effect doesn't set hold UNSET.
+    """
+    rendered = np.full((n_lights, frames, len(CHANNELS)), UNSET, dtype=np.int32)
+    for index, channel in enumerate(CHANNELS):
+        if channel in effect:
+            rendered[:, :, index] = render_channel(effect[channel], n_lights, frames, fps)
+    return rendered
+
+def frame_states(rendered, frame):
+    """Return the REST state body for each light at one frame."""
+    active = [index for index in range(len(CHANNELS)) if rendered[0, frame, index] != UNSET]
+    values = rendered[:, frame, active].tolist()
+    names = [CHANNELS[index] for index in active]
+    return [dict(zip(names, row)) for row in values]
+
+def play_rendered(rendered, light_ids, send, fps=25, clock=None):
+    """Send each frame as {light_id: state} to `send` at the frame rate.
+
+    Frames are due at absolute deadlines and late frames are dropped. With a
+    TempoClock, `fps` is frames per beat instead of per second.
+    """
+    steps = [(frame / fps, frame) for frame in range(rendered.shape[1])]
+    return run_steps(steps, lambda frame: send(dict(zip(light_ids, frame_states(rendered, frame)))), clock)
@@ -1,6 +1,7 @@
 import requests
 from dotenv import load_dotenv
 import os
+from lightInventory import LightInventory
 
 load_dotenv()
 
@@ -22,8 +23,13 @@ def get_lights():
 
         # Check if lights is a dictionary or a list
         if isinstance(lights, dict):
-            for light_id, light_info in lights.items():
-                print(f"Light ID: {light_id}, Name: {light_info['name']}")
+            # Save names and capabilities for the other scripts (see lightInventory.py)
+            inventory = LightInventory(bridge_ip).load()
+            inventory.update(lights, requests.get(f"http://{bridge_ip}/api/config").json().get("bridgeid"))
+            for light_id, entry in inventory.lights.items():
+                gamut = f", Gamut: {entry['gamut']}" if entry["gamut"] else ""
+                print(f"Light ID: {light_id}, Name: {entry['name']}, Type: {entry['type']}, Supports: {', '.join(entry['capabilities'])}{gamut}")
+            print("Saved to", inventory.path)
         elif isinstance(lights, list):
             for light in lights:
                 print(f"Light ID: {light.get('id', 'Unknown')}, Name: {light.get('name', 'Unknown')}")
@@ -1,27 +1,53 @@
-import requests
+import argparse
+import itertools
 import mido
-import time
 from dotenv import load_dotenv
-import os
-
-# Retrieve bridge IP and username from environment variables
+from bridgeMap import get_router
+from entertainmentStream import get_stream
+from midiMapping import load_mapping
+from colorConvert import rgb_state, clamp_to_gamut
+from effectEngine import EffectEngine
+from showClock import get_clock, step_effect, CLOCK_TYPES
+import metrics
+
+# Bridges come from BRIDGES (or BRIDGE_IP and USERNAME), see bridgeMap.py
 load_dotenv()
-bridge_ip = os.getenv("BRIDGE_IP")
-username = os.getenv("USERNAME")
-light_id = 5  # Set the light ID you want to control
+light_id = 5  # Set the light ID you want to control (global ID across bridges)
+bridges = get_router(light_ids=[light_id])  # One keep-alive client and scheduler per bridge
+mapping = load_mapping()  # MIDI -> light lookup tables compiled from midiMapping.json
+stream = get_stream(sorted({light_id, *mapping.light_ids}))  # UDP frame output when HUE_OUTPUT=stream, else None
+clock = get_clock()  # Effect steps are in beats, following MIDI clock on the input port
+engine = EffectEngine(clock).start()  # Runs triggered effects off the MIDI input thread, on beat deadlines
 
-# Light ID: 1, Name: Color One
-# Light ID: 2, Name: Color Two
-# Light ID: 3, Name: Hue white lamp 1
-# Light ID: 4, Name: Hue white lamp 2
-# Light ID: 5, Name: Color Three
+# Light IDs, names and capabilities: run getLightIDs.py. They are saved in
+# .inventory.json, and commands are trimmed to what each light supports, so
+# colour changes skip white lamps instead of failing on the bridge.
 
 # Philips Hue API Functions
 def set_light_state(state_data):
     """Send a command to set the light's state."""
-    url = f"http://{bridge_ip}/api/{username}/lights/{light_id}/state"
-    response = requests.put(url, json=state_data)
-    return response.json()
+    if stream is not None:
+        return stream.set_light_state(light_id, state_data)
+    return bridges.set_light_state(light_id, state_data)
+
+def queue_light_state(state_data, target=light_id, trace_id=0, ack=False):
+    """Queue a command on the rate-limited scheduler without blocking.
+
+    Responses are parsed off the MIDI thread; pass `ack=True` to get a
+    Future of the bridge's response instead.
+    """
+    if stream is not None:
+        stream.set_light_state(target, state_data)  # Goes out with the next frame
+        return None
+    return bridges.submit(target, state_data, trace_id, ack)
+
+def queue_group_action(group_id, state_data, trace_id=0):
+    """Queue a group action; group 0 (all lights) also covers the streamed rig."""
+    if stream is not None and group_id == 0:
+        for target in stream.slots:
+            stream.set_light_state(target, state_data)
+        return
+    bridges.submit_group(group_id, state_data, trace_id)
 
 def turn_on_light():
     """Turn the light on."""
@@ -42,60 +68,109 @@ def set_color(hue, sat=254):
     sat = max(0, min(sat, 254))    # Clamp saturation between 0-254
     return set_light_state({"hue": hue, "sat": sat})
 
+def set_rgb(red, green, blue):
+    """Set the color of the light from 8-bit RGB, converted to xy within the light's gamut."""
+    return set_light_state(rgb_state(red, green, blue, bridges.gamut(light_id)))
+
+def set_xy(x, y):
+    """Set the color of the light as CIE xy, moved into the light's gamut if outside it."""
+    x, y = clamp_to_gamut((x, y), bridges.gamut(light_id))
+    return set_light_state({"xy": [round(float(x), 4), round(float(y), 4)]})
+
 def set_temperature(ct):
     """Set the color temperature of the light (153-500)."""
     ct = max(153, min(ct, 500))  # Clamp ct between 153-500
     return set_light_state({"ct": ct})
 
-def cycle_colors():
-    """Cycle through a set of colors."""
+# Effects: (beat, state) steps sent at absolute beat deadlines on the shared
+# clock, so they stay in phase with MIDI clock and follow tempo and transport
+def cycle_colors(target=light_id):
+    """Cycle through a set of colors, one every two beats."""
     colors = [0, 10000, 20000, 30000, 40000, 50000, 60000]
-    for hue in colors:
-        set_color(hue)
-        time.sleep(1)
+    steps = [(2 * index, {"hue": hue, "sat": 254}) for index, hue in enumerate(colors)]
+    return step_effect(steps, lambda state: queue_light_state(state, target), clock)
+
+def strobe(target=light_id):
+    """Flash the light on eighth notes until the effect is stopped."""
+    flash_on = {"on": True, "bri": 254, "transitiontime": 0}
+    flash_off = {"on": False, "transitiontime": 0}
+    steps = ((0.5 * step, flash_off if step % 2 else flash_on) for step in itertools.count())
+    return step_effect(steps, lambda state: queue_light_state(state, target), clock)
 
 # MIDI Event Handling
-def process_midi_message(message):
-    """Process incoming MIDI messages and map them to light functions."""
-    if message.type == 'note_on':
-        if message.note == 60:  # Middle C
-            turn_on_light()
-        elif message.note == 62:  # D key
-            turn_off_light()
-        elif message.note == 64:  # E key
-            set_brightness(200)
-        elif message.note == 65:  # F key
-            set_brightness(50)
-        elif message.note == 67:  # G key
-            cycle_colors()
-
-    elif message.type == 'control_change':
-        if message.control == 1:  # Modulation wheel (brightness control)
-            brightness_value = int((message.value / 127) * 254)
-            set_brightness(brightness_value)
-
-        elif message.control == 2:  # Another MIDI control (hue control)
-            hue_value = int((message.value / 127) * 65535)
-            set_color(hue_value)
-
-        elif message.control == 3:  # Another MIDI control (temperature control)
-            ct_value = int((message.value / 127) * 347 + 153)
-            set_temperature(ct_value)
+EFFECTS = {"cycle_colors": cycle_colors, "strobe": strobe}
+
+def process_midi_message(message, trace_id=0):
+    """Look up a MIDI message in the compiled mapping and apply it to the lights."""
+    data = message.bytes()
+    if len(data) != 3:
+        return
+    entry = mapping.lookup(*data)
+    if entry is None:
+        return
+
+    if entry.effect is not None:
+        # Effects run on the engine thread; retriggering restarts them
+        key = (entry.effect, entry.light)
+        if entry.stop:
+            engine.stop(key)
+        else:
+            engine.trigger(key, EFFECTS[entry.effect](entry.light))
+    elif entry.group is not None:
+        queue_group_action(entry.group, entry.states[data[2]], trace_id)
+    else:
+        # Messages arrive far faster than the bridge accepts them, so they
+        # are coalesced by the scheduler instead of sent one by one
+        queue_light_state(entry.states[data[2]], entry.light, trace_id)
 
 # Main MIDI Loop
 def listen_for_midi():
-    """Listen for MIDI inputs and map to light functions."""
+    """Listen for MIDI inputs and map to light functions.
+
+    Every handler returns without waiting on the bridge, so the port is
+    always drained as soon as messages arrive.
+    """
+    # With HUE_METRICS=1 each message gets a trace ID and dispatch timing
+    handle = metrics.traced(process_midi_message) if metrics.ENABLED else process_midi_message
     with mido.open_input('Your MIDI Device Name') as inport:
         print("Listening for MIDI inputs...")
-        for msg in inport:
-            process_midi_message(msg)
+        try:
+            for msg in inport:
+                if msg.type in CLOCK_TYPES:
+                    clock.handle(msg)  # DAW tempo and transport
+                else:
+                    handle(msg)
+        finally:
+            for bridge in bridges.health():
+                print(f"Bridge {bridge['bridge']} ({bridge['bridge_ip']}) scheduler stats:", bridge["scheduler"])
+
+def listen_for_audio(source="-"):
+    """Drive the lights from audio: a WAV file (played back in real time) or raw PCM on stdin.
+
+    Band levels, beats and onsets arrive as virtual MIDI (see audioInput.py)
+    and go through the same mapping as the controller.
+    """
+    import audioInput
+    handle = metrics.traced(process_midi_message, source="audio") if metrics.ENABLED else process_midi_message
+    reader, rate = audioInput.open_stdin() if source == "-" else audioInput.open_wav(source)
+    print(f"Listening for audio on {source}...")
+    with reader:
+        for offset, messages, spent in audioInput.analyze(reader, rate, realtime=source != "-"):
+            for msg in messages:
+                handle(msg)
 
 # Main Script
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Control Hue lights from MIDI or audio.")
+    parser.add_argument("--audio", metavar="SOURCE", help="Drive the lights from a WAV file, or - for signed 16-bit mono PCM on stdin")
+    args = parser.parse_args()
+
     # Turn on light initially
     turn_on_light()
     set_brightness(100)
     set_color(10000)  # A soft white color
 
+    if args.audio:
+        listen_for_audio(args.audio)
     # Start listening for MIDI inputs
     # listen_for_midi()
@@ -0,0 +1,112 @@
+# hueClient.py
+import os
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+import metrics
+
+# Connection settings, overridable from the environment
+load_dotenv()
+POOL_SIZE = int(os.getenv("HUE_POOL_SIZE", 4))  # Keep-alive sockets per bridge
+TIMEOUT = float(os.getenv("HUE_TIMEOUT", 2.0))  # Seconds before a bridge call gives up
+
+class HueClient:
+    """Pooled keep-alive connection to a single Philips Hue bridge.
+
+    One instance is shared by every thread talking to the same bridge. The
+    pool blocks when all sockets are busy instead of opening new ones, so the
+    bridge never sees more than `pool_size` concurrent connections from us.
+    """
+
+    def __init__(self, bridge_ip, username, pool_size=POOL_SIZE, timeout=TIMEOUT, light_ids=()):
+        self.bridge_ip = bridge_ip
+        self.username = username
+        self.timeout = timeout
+        self.base_url = f"http://{bridge_ip}/api/{username}"
+        self.lights_url = f"{self.base_url}/lights"
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+
+        # Light ID -> state URL, built once instead of on every command
+        self.state_urls = {}
+        for light_id in light_ids:
+            self.state_url(light_id)
+
+    def state_url(self, light_id):
+        """Return the prebuilt state URL for a light, building it on first use."""
+        url = self.state_urls.get(light_id)
+        if url is None:
+            url = self.state_urls.setdefault(light_id, f"{self.lights_url}/{light_id}/state")
+        return url
+
+    # Raw requests (return the Response so callers can check status)
+    def get(self, path=""):
+        return self.session.get(f"{self.base_url}{path}", timeout=self.timeout)
+
+    def put(self, path, data):
+        return self.session.put(f"{self.base_url}{path}", json=data, timeout=self.timeout)
+
+    def post(self, path, data):
+        return self.session.post(f"{self.base_url}{path}", json=data, timeout=self.timeout)
+
+    def delete(self, path):
+        return self.session.delete(f"{self.base_url}{path}", timeout=self.timeout)
+
+    def put_light_state(self, light_id, state_data):
+        return self.session.put(self.state_url(light_id), json=state_data, timeout=self.timeout)
+
+    def put_raw(self, url, body):
+        """PUT an already-encoded JSON body, as stored in compiled shows."""
+        return self.session.put(url, data=body, headers={"Content-Type": "application/json"}, timeout=self.timeout)
+
+    # Philips Hue API Functions
+    def get_lights(self):
+        """Return the bridge's full light inventory."""
+        return self.session.get(self.lights_url, timeout=self.timeout).json()
+
+    def set_light_state(self, light_id, state_data):
+        """Send a command to set the light's state."""
+        if not metrics.ENABLED:
+            return self.put_light_state(light_id, state_data).json()
+        return self._timed("lights", light_id, lambda: self.put_light_state(light_id, state_data).json())
+
+    def set_group_action(self, group_id, state_data):
+        """Send one command that sets the state of every light in a group."""
+        if not metrics.ENABLED:
+            return self.put(f"/groups/{group_id}/action", state_data).json()
+        return self._timed("groups", f"group/{group_id}", lambda: self.put(f"/groups/{group_id}/action", state_data).json())
+
+    def _timed(self, resource, light, send):
+        """Run a PUT, recording its latency and any failure or Hue error against the light."""
+        start = time.perf_counter()
+        try:
+            results = send()
+        except (requests.exceptions.RequestException, ValueError):
+            metrics.BRIDGE_ERRORS.inc(self.bridge_ip, str(light))
+            raise
+        finally:
+            metrics.BRIDGE_REQUEST_SECONDS.observe(time.perf_counter() - start, "PUT", resource)
+        metrics.count_errors(results, self.bridge_ip, light)
+        return results
+
+    def close(self):
+        self.session.close()
+
+# Shared clients, one per bridge
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(bridge_ip, username, **kwargs):
+    """Return the shared client for a bridge, creating it on first use."""
+    key = (bridge_ip, username)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = HueClient(bridge_ip, username, **kwargs)
+    return client
@@ -0,0 +1,95 @@
+# keyframes.py
+import math
+from showClock import WallClock, run_steps, step_effect
+
+# Fades are described as keyframes: (time_s, value) or (time_s, value, easing),
+# where easing shapes the segment leading into that keyframe. The bridge
+# interpolates linearly over a command's `transitiontime` (in 100 ms units),
+# so a linear segment costs one PUT and curved segments are split only until
+# the straight-line approximation is within `tolerance` of the curve.
+
+TOLERANCE = 4  # Largest allowed error, in attribute units
+MIN_SEGMENT = 0.1  # transitiontime resolution in seconds
+
+EASINGS = {
+    "linear": lambda x: x,
+    "ease": lambda x: 0.5 - 0.5 * math.cos(math.pi * x),
+    "ease_in": lambda x: x * x,
+    "ease_out": lambda x: 1 - (1 - x) * (1 - x),
+}
+
+def segment_value(start, end, easing, t):
+    """Value of the segment from keyframe `start` to `end` at time t."""
+    (t0, v0), (t1, v1) = start[:2], end[:2]
+    x = (t - t0) / (t1 - t0) if t1 > t0 else 1.0
+    return v0 + (v1 - v0) * EASINGS[easing](x)
+
+def split_segment(start, end, easing, tolerance, t0=None, t1=None):
+    """Return the inner breakpoints needed to follow a curved segment between t0 and t1."""
+    t0 = start[0] if t0 is None else t0
+    t1 = end[0] if t1 is None else t1
+    if easing == "linear" or t1 - t0 < 2 * MIN_SEGMENT:
+        return []
+
+    # Worst error of the straight line against the curve, checked at a few samples
+    v0 = segment_value(start, end, easing, t0)
+    v1 = segment_value(start, end, easing, t1)
+    worst_t, worst_error = None, 0.0
+    for i in range(1, 8):
+        t = t0 + (t1 - t0) * i / 8
+        error = abs(segment_value(start, end, easing, t) - (v0 + (v1 - v0) * i / 8))
+        if error > worst_error:
+            worst_t, worst_error = t, error
+    if worst_error <= tolerance:
+        return []
+
+    # Break at the worst point, snapped to the transitiontime grid
+    steps = min(max(1, round((worst_t - t0) / MIN_SEGMENT)), round((t1 - t0) / MIN_SEGMENT) - 1)
+    middle = round(t0 + steps * MIN_SEGMENT, 3)
+    return (split_segment(start, end, easing, tolerance, t0, middle)
+            + [(middle, segment_value(start, end, easing, middle))]
+            + split_segment(start, end, easing, tolerance, middle, t1))
+
+def compile_keyframes(keyframes, attribute, tolerance=TOLERANCE):
+    """Compile keyframes into [(offset_s, state)] commands that use transitiontime.
+
+    The first command sets the starting value immediately; each following
+    command fades to the next breakpoint over the time until it.
+    """
+    points = [tuple(keyframes[0][:2])]
+    for start, end in zip(keyframes, keyframes[1:]):
+        easing = end[2] if len(end) > 2 else "linear"
+        points.extend(split_segment(start, end, easing, tolerance))
+        points.append(tuple(end[:2]))
+
+    commands = [(points[0][0], {attribute: int(round(points[0][1])), "transitiontime": 0})]
+    for (t0, _), (t1, value) in zip(points, points[1:]):
+        commands.append((t0, {attribute: int(round(value)), "transitiontime": int(round((t1 - t0) * 10))}))
+    return commands
+
+def duration(commands):
+    """Seconds until the last command's transition finishes."""
+    offset, state = commands[-1]
+    return offset + state.get("transitiontime", 0) / 10
+
+def play(commands, send):
+    """Send compiled (offset_s, state) commands at their offsets from now.
+
+    Commands that fall behind are skipped rather than delaying the rest.
+    Returns once the last transition has finished.
+    """
+    clock = WallClock()
+    start = clock.position()
+    run_steps(commands, send, clock, start)
+    clock.wait_until(start + duration(commands))
+
+def effect(commands, send, clock=None):
+    """Generator form of play() for an effect engine running on `clock` (seconds by default).
+
+    Offsets are converted to the clock's units when the fade starts, so a
+    fade played on a TempoClock still lasts as long as its transitiontimes.
+    """
+    clock = clock or WallClock()
+    scale = clock.units(1.0)
+    yield from step_effect([(offset * scale, state) for offset, state in commands], send, clock)
+    yield (duration(commands) - commands[-1][0]) * scale  # Let the last transition finish
@@ -0,0 +1,103 @@
+# lightGroups.py
+import atexit
+import logging
+import threading
+from lightInventory import get_inventory
+from commandScheduler import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+GROUP_NAME_PREFIX = "HueMIDI"
+
+class GroupCache:
+    """Bridge groups keyed by light set, so multi-light effects can fan out in one call.
+
+    Existing bridge groups with exactly the requested lights are reused;
+    otherwise a LightGroup is created and deleted again by `cleanup()`.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.groups = None  # frozenset of light IDs -> group ID
+        self.created = []
+        self.lock = threading.Lock()
+
+    def _load(self):
+        groups = self.client.get("/groups").json()
+        self.groups = {}
+        if isinstance(groups, dict):
+            for group_id, info in groups.items():
+                self.groups.setdefault(frozenset(info.get("lights", [])), group_id)
+
+    def group_for(self, light_ids):
+        """Return the group ID for a set of lights, creating the group if needed."""
+        key = frozenset(str(light_id) for light_id in light_ids)
+        with self.lock:
+            if self.groups is None:
+                self._load()
+            group_id = self.groups.get(key)
+            if group_id is not None:
+                return group_id
+
+            lights = sorted(key, key=int)
+            name = f"{GROUP_NAME_PREFIX} {','.join(lights)}"[:32]  # Bridge limit
+            result = self.client.post("/groups", {"name": name, "type": "LightGroup", "lights": lights}).json()
+            group_id = result[0]["success"]["id"]
+            logger.info("Created group %s for lights %s", group_id, ", ".join(lights))
+            self.groups[key] = group_id
+            self.created.append(group_id)
+            return group_id
+
+    def apply(self, states):
+        """Send {light_id: state} targets using one group action when they all match.
+
+        The writes skip the scheduler's queue, so its shadow forgets their targets first.
+        """
+        shadow = get_scheduler(self.client).shadow
+        light_ids = list(states)
+        first = states[light_ids[0]]
+        if len(light_ids) > 1 and all(states[light_id] == first for light_id in light_ids):
+            try:
+                group_id = self.group_for(light_ids)
+                shadow.bypass(("group", group_id))
+                return self.client.set_group_action(group_id, first)
+            except (KeyError, IndexError, TypeError):
+                logger.error("Could not create a group for lights %s; sending per light", light_ids)
+        # Group actions set what each light supports; per light, trim to it (e.g. no xy for white lamps)
+        inventory = get_inventory(self.client)
+        results = []
+        for light_id, state in states.items():
+            state = inventory.filter(light_id, state)
+            if state is None:
+                results.append([])
+                continue
+            shadow.bypass(light_id)
+            results.append(self.client.set_light_state(light_id, state))
+        return results
+
+    def cleanup(self):
+        """Delete the groups this cache created."""
+        with self.lock:
+            if not self.created:
+                return
+            for group_id in self.created:
+                try:
+                    self.client.delete(f"/groups/{group_id}")
+                except Exception as e:
+                    logger.error("Failed to delete group %s: %s", group_id, str(e))
+            for key in [key for key, group_id in self.groups.items() if group_id in self.created]:
+                del self.groups[key]
+            self.created = []
+
+# Shared group caches, one per bridge client
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_group_cache(client):
+    """Return the group cache for a client; created groups are removed at exit."""
+    with _caches_lock:
+        cache = _caches.get(client)
+        if cache is None:
+            cache = _caches[client] = GroupCache(client)
+            atexit.register(cache.cleanup)
+    return cache
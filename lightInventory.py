@@ -0,0 +1,177 @@
+# lightInventory.py
+import os
+import json
+import time
+import logging
+import threading
+import requests
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Light names, types, gamuts and supported attributes are saved per bridge in
+# HUE_INVENTORY_PATH, so scripts start from disk instead of a GET /lights.
+# At startup the saved bridge ID is checked against the bridge's small public
+# /api/config, then the full inventory is refreshed in the background every
+# HUE_INVENTORY_REFRESH seconds. Commands are trimmed to the attributes each
+# light supports, so white lamps never get hue/sat/xy/ct they would reject.
+load_dotenv()
+INVENTORY_PATH = os.getenv("HUE_INVENTORY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".inventory.json"))
+INVENTORY_REFRESH = float(os.getenv("HUE_INVENTORY_REFRESH", 300))
+
+OPTIONS = {"transitiontime", "alert"}  # Accepted by every light
+CAPABILITY_ATTRIBUTES = {
+    "on": {"on"},
+    "bri": {"bri", "bri_inc"},
+    "ct": {"ct", "ct_inc"},
+    "color": {"hue", "sat", "xy", "effect", "hue_inc", "sat_inc", "xy_inc"},
+}
+
+def capabilities(info):
+    """Return what a light can do (on, bri, ct, color), from its reported state."""
+    state = info.get("state", {})
+    found = [capability for capability, key in (("on", "on"), ("bri", "bri"), ("ct", "ct"), ("color", "xy")) if key in state]
+    return found or ["on"]
+
+def light_entry(info):
+    """The persisted part of a bridge light: identity and capabilities, not state."""
+    control = info.get("capabilities", {}).get("control", {})
+    return {
+        "name": info.get("name", "Unknown"),
+        "type": info.get("type"),
+        "modelid": info.get("modelid"),
+        "gamut": control.get("colorgamuttype"),
+        "capabilities": capabilities(info),
+    }
+
+def fetch_bridge_id(client):
+    """Return the bridge ID from the unauthenticated /api/config, a small and cheap request."""
+    response = client.session.get(f"http://{client.bridge_ip}/api/config", timeout=client.timeout)
+    return response.json().get("bridgeid")
+
+class LightInventory:
+    """One bridge's saved light inventory and the attribute filter built from it.
+
+    Lights the inventory doesn't know (yet) are passed through unfiltered.
+    """
+
+    def __init__(self, bridge_ip, path=INVENTORY_PATH):
+        self.bridge_ip = bridge_ip
+        self.path = path
+        self.bridge_id = None
+        self.lights = {}  # Light ID (str) -> light_entry()
+        self.allowed = {}  # Light ID (str) -> attributes it accepts
+        self.refreshed_at = None  # time.time() of the last fetch from the bridge, saved or live
+        self.lock = threading.Lock()
+        self.stats = {"filtered": 0}
+
+    def load(self):
+        """Read this bridge's saved entry, if there is one."""
+        try:
+            with open(self.path) as f:
+                saved = json.load(f).get(self.bridge_ip)
+        except (OSError, ValueError):
+            saved = None
+        if saved:
+            self._set(saved.get("lights", {}), saved.get("bridgeid"), saved.get("refreshed_at"))
+        return self
+
+    def _set(self, lights, bridge_id, refreshed_at):
+        with self.lock:
+            self.lights = lights
+            self.allowed = {light_id: OPTIONS.union(*(CAPABILITY_ATTRIBUTES[c] for c in entry["capabilities"]))
+                            for light_id, entry in lights.items()}
+            self.bridge_id = bridge_id
+            self.refreshed_at = refreshed_at
+
+    def check(self, bridge_id):
+        """Keep the saved inventory only if it was taken from this bridge; returns whether it was."""
+        if bridge_id is None or bridge_id == self.bridge_id:
+            return True
+        if self.bridge_id is not None:
+            logger.warning("Saved inventory for %s is from bridge %s, not %s; dropping it", self.bridge_ip, self.bridge_id, bridge_id)
+            self._set({}, bridge_id, None)
+            return False
+        self.bridge_id = bridge_id
+        if self.lights:
+            self.save()  # Saved before the ID was known
+        return True
+
+    def update(self, lights, bridge_id=None):
+        """Rebuild from a {light_id: bridge light} inventory and save it when something changed."""
+        entries = {str(light_id): light_entry(info) for light_id, info in lights.items()}
+        bridge_id = bridge_id or self.bridge_id
+        changed = entries != self.lights or bridge_id != self.bridge_id
+        self._set(entries, bridge_id, time.time())
+        if changed:
+            self.save()
+
+    def save(self):
+        """Write this bridge's entry, keeping other bridges', via a rename so readers never see half a file."""
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        with self.lock:
+            saved[self.bridge_ip] = {"bridgeid": self.bridge_id, "refreshed_at": self.refreshed_at, "lights": self.lights}
+        try:
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(saved, f, indent=2)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            logger.error("Could not save the light inventory to %s: %s", self.path, str(e))
+
+    def supports(self, light_id, attribute):
+        allowed = self.allowed.get(str(light_id))
+        return allowed is None or attribute in allowed
+
+    def gamut(self, light_id):
+        """The light's colour gamut ("A", "B" or "C"), or None if it has none or is unknown."""
+        entry = self.lights.get(str(light_id))
+        return entry and entry.get("gamut")
+
+    def filter(self, light_id, state_data):
+        """Return the attributes of a command the light accepts, or None if it accepts none of them."""
+        allowed = self.allowed.get(str(light_id))
+        if allowed is None:
+            return state_data
+        kept = {key: value for key, value in state_data.items() if key in allowed}
+        if len(kept) == len(state_data):
+            return state_data
+        self.stats["filtered"] += len(state_data) - len(kept)
+        logger.debug("Light %s doesn't support %s", light_id, ", ".join(sorted(set(state_data) - set(kept))))
+        return kept if set(kept) - {"transitiontime"} else None
+
+    def refresh(self, client):
+        """Fetch the full inventory from the bridge."""
+        lights = client.get_lights()
+        if not isinstance(lights, dict):
+            raise ValueError(f"unexpected lights response: {lights}")
+        self.update(lights)
+
+    def watch(self, client, interval=INVENTORY_REFRESH):
+        """Check the bridge ID, then refresh on a timer; runs on a background thread."""
+        try:
+            self.check(fetch_bridge_id(client))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning("Could not check the bridge ID of %s: %s", self.bridge_ip, str(e))
+        while True:
+            try:
+                self.refresh(client)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.error("Light inventory refresh for %s failed: %s", self.bridge_ip, str(e))
+            time.sleep(interval)
+
+# Shared inventories, one per bridge client
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+def get_inventory(client):
+    """Return the client's inventory, loaded from disk at once and kept fresh in the background."""
+    with _inventories_lock:
+        inventory = _inventories.get(client)
+        if inventory is None:
+            inventory = _inventories[client] = LightInventory(client.bridge_ip).load()
+            threading.Thread(target=inventory.watch, args=(client,), daemon=True).start()
+    return inventory
@@ -1,21 +1,32 @@
 # lightShow1.py
-import requests
 import time
 from dotenv import load_dotenv
-import os
+from bridgeMap import get_router
+from entertainmentStream import get_stream
+from keyframes import compile_keyframes, play
+from frameRenderer import render, play_rendered
+from showClock import get_clock, run_steps
+from colorConvert import rgb_state, rgb_states, clamp_to_gamut
 
-# Retrieve bridge IP and username from environment variables
+# Bridges come from BRIDGES (or BRIDGE_IP and USERNAME), see bridgeMap.py
 load_dotenv()
-bridge_ip = os.getenv("BRIDGE_IP")
-username = os.getenv("USERNAME")
 light_ids = [1, 2, 5]  # List of lights to control
+bridges = get_router(light_ids=light_ids)  # One keep-alive client per bridge
+stream = get_stream(light_ids)  # UDP frame output when HUE_OUTPUT=stream, else None
+clock = get_clock()  # Beats at SHOW_BPM, or following MIDI clock on MIDI_CLOCK_PORT
 
 # Philips Hue API Functions
 def set_light_state(light_id, state_data):
     """Send a command to set the light's state."""
-    url = f"http://{bridge_ip}/api/{username}/lights/{light_id}/state"
-    response = requests.put(url, json=state_data)
-    return response.json()
+    if stream is not None:
+        return stream.set_light_state(light_id, state_data)
+    return bridges.set_light_state(light_id, state_data)
+
+def set_lights_state(states):
+    """Send {light_id: state} targets; matching states go out as one group action."""
+    if stream is not None:
+        return [stream.set_light_state(light_id, state) for light_id, state in states.items()]
+    return bridges.apply(states)
 
 def turn_on_light(light_id):
     """Turn the light on."""
@@ -36,44 +47,68 @@ def set_color(light_id, hue, sat=254):
     sat = max(0, min(sat, 254))
     return set_light_state(light_id, {"hue": hue, "sat": sat})
 
+def set_rgb(light_id, red, green, blue):
+    """Set the color of the light from 8-bit RGB, converted to xy within the light's gamut."""
+    return set_light_state(light_id, rgb_state(red, green, blue, bridges.gamut(light_id)))
+
+def set_xy(light_id, x, y):
+    """Set the color of the light as CIE xy, moved into the light's gamut if outside it."""
+    x, y = clamp_to_gamut((x, y), bridges.gamut(light_id))
+    return set_light_state(light_id, {"xy": [round(float(x), 4), round(float(y), 4)]})
+
+def set_lights_rgb(colors):
+    """Send a whole-rig RGB frame {light_id: (red, green, blue)}, converted in one vectorized pass."""
+    light_ids = list(colors)
+    states = rgb_states([colors[light_id] for light_id in light_ids], [bridges.gamut(light_id) for light_id in light_ids])
+    return set_lights_state(dict(zip(light_ids, states)))
+
 def set_temperature(light_id, ct):
     """Set the color temperature of the light (153-500)."""
     ct = max(153, min(ct, 500))
     return set_light_state(light_id, {"ct": ct})
 
+# Effect definitions for the frame renderer (see frameRenderer.py), periods in beats
+CYCLE_COLORS = {"hue": {"wave": "steps", "values": [0, 10000, 20000, 30000, 40000, 50000, 60000], "period": 7}, "sat": 254}
+CHANGE_TEMPERATURE = {"ct": {"wave": "steps", "values": [153, 200, 300, 400, 500], "period": 5}}
+RAINBOW_WAVE = {"hue": {"wave": "saw", "low": 0, "high": 65535, "period": 8}, "sat": 254}
+
+# 8-bit RGB colours, e.g. a palette from the visuals, converted to xy per light gamut
+PALETTE = [(255, 40, 0), (255, 0, 120), (60, 0, 255), (0, 200, 255)]
+
+def run_effect(effect, lights, beats, steps_per_beat):
+    """Render an effect for all lights at once and play it on the beat."""
+    rendered = render(effect, len(lights), int(beats * steps_per_beat), steps_per_beat)
+    play_rendered(rendered, lights, set_lights_state, steps_per_beat, clock)
+
 # Light Show Functions
-def cycle_colors(lights, duration=10):
-    """Cycle through colors on multiple lights for a given duration."""
-    colors = [0, 10000, 20000, 30000, 40000, 50000, 60000]
-    start_time = time.time()
-    while time.time() - start_time < duration:
-        for hue in colors:
-            for light_id in lights:
-                set_color(light_id, hue)
-            time.sleep(0.5)  # Change every 0.5 seconds
+def cycle_colors(lights, beats=16):
+    """Cycle through colors on multiple lights, one step per beat."""
+    run_effect(CYCLE_COLORS, lights, beats, steps_per_beat=1)
 
 def fade_brightness(lights, duration=5):
     """Fade brightness up and down on multiple lights for a given duration."""
+    # Up and back down over 3.4 s; the bridge interpolates with transitiontime
+    fade = compile_keyframes([(0, 0), (1.7, 254), (3.4, 0)], "bri")
     start_time = time.time()
     while time.time() - start_time < duration:
-        for brightness in range(0, 255, 15):  # Fade up
-            for light_id in lights:
-                set_brightness(light_id, brightness)
-            time.sleep(0.1)
-        for brightness in range(255, 0, -15):  # Fade down
-            for light_id in lights:
-                set_brightness(light_id, brightness)
-            time.sleep(0.1)
-
-def change_temperature(lights, duration=5):
-    """Cycle through color temperatures on multiple lights for a given duration."""
-    temperatures = [153, 200, 300, 400, 500]
-    start_time = time.time()
-    while time.time() - start_time < duration:
-        for ct in temperatures:
-            for light_id in lights:
-                set_temperature(light_id, ct)
-            time.sleep(0.5)
+        play(fade, lambda state: set_lights_state({light_id: state for light_id in lights}))
+
+def change_temperature(lights, beats=8):
+    """Cycle through color temperatures on multiple lights, one step per beat."""
+    run_effect(CHANGE_TEMPERATURE, lights, beats, steps_per_beat=1)
+
+def rainbow_wave(lights, beats=8):
+    """Roll a rainbow across the lights, each one phase-shifted from the last."""
+    effect = {**RAINBOW_WAVE, "hue": {**RAINBOW_WAVE["hue"], "spread": 1 / len(lights)}}
+    # Per-light REST commands are rate limited; frames can go at the stream rate
+    steps_per_beat = max(1, round(stream.rate * clock.seconds(1))) if stream is not None else 1
+    run_effect(effect, lights, beats, steps_per_beat)
+
+def palette_chase(lights, palette=PALETTE, beats=8):
+    """Rotate an RGB palette across the lights, one step per beat."""
+    steps = [(beat, {light_id: palette[(beat + index) % len(palette)] for index, light_id in enumerate(lights)})
+             for beat in range(beats)]
+    run_steps(steps, set_lights_rgb, clock)
 
 # Main Script
 if __name__ == "__main__":
@@ -84,9 +119,11 @@ if __name__ == "__main__":
         set_color(light_id, 10000)  # Set an initial soft white color
 
     # Run a small light show
-    cycle_colors(light_ids, duration=5)
+    cycle_colors(light_ids, beats=10)
     fade_brightness(light_ids, duration=3)
-    change_temperature(light_ids, duration=2)
+    change_temperature(light_ids, beats=4)
+    rainbow_wave(light_ids, beats=8)
+    palette_chase(light_ids, beats=8)
 
     # Turn off lights after the show
     for light_id in light_ids:
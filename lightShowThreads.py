@@ -1,23 +1,22 @@
 # lightShowThreads.py
-import requests
-import time
-import threading
 from dotenv import load_dotenv
-import os
+from bridgeMap import get_router
+from keyframes import compile_keyframes, effect as keyframe_effect
+from showClock import get_clock, step_effect
+from showRunner import ShowRunner
 
-# Retrieve bridge IP and username from environment variables
+# Bridges come from BRIDGES (or BRIDGE_IP and USERNAME), see bridgeMap.py
 load_dotenv()
-bridge_ip = os.getenv("BRIDGE_IP")
-username = os.getenv("USERNAME")
 light_ids = [1]  # Update as needed with available Light IDs
 # light_ids = [1, 2, 5]  # Light IDs to control
+bridges = get_router(light_ids=light_ids)  # One keep-alive client per bridge
+clock = get_clock()  # Beats at SHOW_BPM, or following MIDI clock on MIDI_CLOCK_PORT
+runner = ShowRunner(clock=clock)  # One effect loop on beat deadlines and a bounded request pool for every light
 
 # Philips Hue API Functions
 def set_light_state(light_id, state_data):
     """Send a command to set the light's state."""
-    url = f"http://{bridge_ip}/api/{username}/lights/{light_id}/state"
-    response = requests.put(url, json=state_data)
-    return response.json()
+    return bridges.set_light_state(light_id, state_data)
 
 def turn_on_light(light_id):
     """Turn the light on."""
@@ -43,33 +42,26 @@ def set_temperature(light_id, ct):
     ct = max(153, min(ct, 500))
     return set_light_state(light_id, {"ct": ct})
 
-# Light Show Threads
-def light_show_1():
-    """Light 1: Cycle through a set of colors."""
-    if len(light_ids) > 0:
-        colors = [0, 10000, 20000, 30000, 40000, 50000, 60000]
-        for hue in colors:
-            set_color(light_ids[0], hue)
-            time.sleep(0.5)
+# Light Shows: effect generators on one shared loop; requests go through the runner's bounded pool
+def light_show_1(light_id):
+    """Cycle through a set of colors, one per beat."""
+    colors = [0, 10000, 20000, 30000, 40000, 50000, 60000]
+    yield from step_effect(enumerate(colors), lambda hue: runner.send(light_id, set_color, light_id, hue), clock)
+    yield 1  # Hold the last color for its beat
 
-def light_show_2():
-    """Light 2: Fade brightness up and down."""
-    if len(light_ids) > 1:
-        for _ in range(2):  # Repeat fade twice
-            for brightness in range(0, 255, 15):  # Fade up
-                set_brightness(light_ids[1], brightness)
-                time.sleep(0.1)
-            for brightness in range(255, 0, -15):  # Fade down
-                set_brightness(light_ids[1], brightness)
-                time.sleep(0.1)
+def light_show_2(light_id):
+    """Fade brightness up and down, twice."""
+    fade = compile_keyframes([(0, 0), (1.7, 254), (3.4, 0)], "bri")  # Up, then down
+    for _ in range(2):  # Repeat fade twice
+        yield from keyframe_effect(fade, lambda state: runner.send(light_id, set_light_state, light_id, state), clock)
 
-def light_show_3():
-    """Light 3: Cycle through color temperatures."""
-    if len(light_ids) > 2:
-        colors = [30000, 40000, 50000, 60000, 0, 10000, 20000]
-        for hue in colors:
-            set_color(light_ids[2], hue)
-            time.sleep(0.5)
+def light_show_3(light_id):
+    """Cycle through color temperatures, one per beat."""
+    colors = [30000, 40000, 50000, 60000, 0, 10000, 20000]
+    yield from step_effect(enumerate(colors), lambda hue: runner.send(light_id, set_color, light_id, hue), clock)
+    yield 1  # Hold the last color for its beat
+
+LIGHT_SHOWS = [light_show_1, light_show_2, light_show_3]
 
 # Main Script
 if __name__ == "__main__":
@@ -78,22 +70,14 @@ if __name__ == "__main__":
         turn_on_light(light_id)
         set_brightness(light_id, 100)
 
-    # Start threads for each light's unique effect
-    thread1 = threading.Thread(target=light_show_1)
-    thread2 = threading.Thread(target=light_show_2)
-    thread3 = threading.Thread(target=light_show_3)
-
-    # Start the threads
-    thread1.start()
-    thread2.start()
-    thread3.start()
-
-    # Wait for all threads to complete
-    thread1.join()
-    thread2.join()
-    thread3.join()
+    # Start every light's effect together on the next beat; one loop runs them all
+    runner.start()
+    delay = clock.next_beat() - clock.position()  # In beats, like every step on the runner
+    for index, light_id in enumerate(light_ids):
+        runner.trigger(light_id, LIGHT_SHOWS[index % len(LIGHT_SHOWS)](light_id), delay)
+    runner.wait()
+    runner.shutdown()
 
     # Turn off lights after the show
     for light_id in light_ids:
         turn_off_light(light_id)
-
@@ -0,0 +1,148 @@
+# metrics.py
+import os
+import time
+import logging
+import itertools
+import threading
+from dotenv import load_dotenv
+
+# Hot-path timing and counters, rendered in Prometheus text format. Recording
+# is off unless HUE_METRICS=1 (or enable() is called); instrumented code checks
+# ENABLED before reading clocks, so disabled metrics cost one attribute lookup.
+load_dotenv()
+ENABLED = os.getenv("HUE_METRICS", "0") == "1"
+
+trace_logger = logging.getLogger("huemidi.trace")
+_trace_ids = itertools.count(1)
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = flag
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}  # Label values tuple -> value
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def label_text(self, label_values, extra=""):
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labels, label_values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        if not ENABLED:
+            return
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        return [f"{self.name}{self.label_text(key)} {value}" for key, value in self.values.items()]
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        if not ENABLED:
+            return
+        self.values[label_values] = value
+
+    def render(self):
+        return [f"{self.name}{self.label_text(key)} {value}" for key, value in self.values.items()]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def observe(self, value, *label_values):
+        if not ENABLED:
+            return
+        with self.lock:
+            counts = self.values.get(label_values)
+            if counts is None:
+                counts = self.values[label_values] = [0] * len(BUCKETS) + [0, 0.0]  # Buckets, count, sum
+            for index, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def render(self):
+        lines = []
+        for key, counts in self.values.items():
+            for bound, count in zip(BUCKETS, counts):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self.label_text(key, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{self.label_text(key, le)} {counts[-2]}")
+            lines.append(f"{self.name}_count{self.label_text(key)} {counts[-2]}")
+            lines.append(f"{self.name}_sum{self.label_text(key)} {counts[-1]}")
+        return lines
+
+REGISTRY = []
+
+# Command path
+MIDI_EVENTS = Counter("huemidi_midi_events_total", "MIDI messages received", ("source",))
+MIDI_INVALID = Counter("huemidi_midi_invalid_total", "MIDI records skipped as out of range", ("source",))
+DISPATCH_SECONDS = Histogram("huemidi_midi_dispatch_seconds", "Time to decode and map one MIDI message", ("source",))
+QUEUE_DEPTH = Gauge("huemidi_queue_depth", "Commands waiting for the bridge", ("queue",))
+QUEUE_WAIT_SECONDS = Histogram("huemidi_queue_wait_seconds", "Time a command waited in the queue", ("queue",))
+MIDI_TO_ACK_SECONDS = Histogram("huemidi_midi_to_ack_seconds", "Time from MIDI receipt to bridge ack", ("queue",))
+
+# Bridge calls
+BRIDGE_REQUEST_SECONDS = Histogram("huemidi_bridge_request_seconds", "Bridge request latency", ("method", "resource"))
+BRIDGE_ERRORS = Counter("huemidi_bridge_errors_total", "Failed bridge calls and Hue error responses", ("bridge", "light"))  # Light IDs are per bridge
+
+# DockerServer endpoints
+HTTP_REQUESTS = Counter("huemidi_http_requests_total", "API requests served", ("method", "endpoint", "status"))
+HTTP_REQUEST_SECONDS = Histogram("huemidi_http_request_seconds", "API request latency", ("endpoint",))
+STREAM_CLIENTS = Gauge("huemidi_stream_clients", "Clients subscribed to the light state stream")
+
+def count_errors(results, bridge, light):
+    """Count the error entries in a Hue response body against a bridge's light."""
+    if isinstance(results, list):
+        for result in results:
+            if isinstance(result, dict) and "error" in result:
+                BRIDGE_ERRORS.inc(bridge, str(light))
+
+def new_trace():
+    """Return a fresh trace ID for a MIDI event (0 when metrics are off)."""
+    return next(_trace_ids) if ENABLED else 0
+
+def trace(trace_id, stage, **fields):
+    """Log one stage of a traced event at debug level."""
+    if trace_id and trace_logger.isEnabledFor(logging.DEBUG):
+        details = " ".join(f"{key}={value}" for key, value in fields.items())
+        trace_logger.debug("trace=%d stage=%s t=%.6f %s", trace_id, stage, time.monotonic(), details)
+
+def traced(handler, source="midi"):
+    """Wrap a `handler(message, trace_id)` so each message gets a trace ID and dispatch timing."""
+    def handle(message):
+        trace_id = next(_trace_ids)
+        MIDI_EVENTS.inc(source)
+        trace(trace_id, "receive", source=source)
+        start = time.perf_counter()
+        handler(message, trace_id)
+        DISPATCH_SECONDS.observe(time.perf_counter() - start, source)
+        trace(trace_id, "dispatch")
+    return handle
+
+def render():
+    """Return every metric in Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        with metric.lock:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
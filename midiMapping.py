@@ -0,0 +1,116 @@
+# midiMapping.py
+import os
+import json
+import math
+from collections import namedtuple
+from dotenv import load_dotenv
+
+# Mapping config location, overridable from the environment
+load_dotenv()
+MAPPING_PATH = os.getenv("MIDI_MAPPING", os.path.join(os.path.dirname(os.path.abspath(__file__)), "midiMapping.json"))
+
+# Attribute ranges on the Hue REST API
+RANGES = {"bri": (0, 254), "hue": (0, 65535), "sat": (0, 254), "ct": (153, 500)}
+
+# MIDI status nibbles with a lookup table
+NOTE_OFF = 0x8
+NOTE_ON = 0x9
+CONTROL_CHANGE = 0xB
+
+# One compiled mapping. `light` or `group` is the target (the other is None),
+# `effect` names an effect to trigger (or to stop, when `stop` is set), and
+# `states` holds 128 prebuilt state bodies indexed by the message's data byte
+# (velocity or CC value). The state dicts are shared between messages and
+# must be treated as read-only.
+Mapping = namedtuple("Mapping", "light group effect states stop", defaults=(False,))
+
+def curve_table(curve, curves):
+    """Return 128 levels (0.0-1.0) for a named or custom curve."""
+    if curve == "linear":
+        return [value / 127 for value in range(128)]
+    if curve == "log":
+        return [math.log10(1 + 9 * value / 127) for value in range(128)]
+    if curve == "exp":
+        return [(10 ** (value / 127) - 1) / 9 for value in range(128)]
+
+    # Custom curve: [midi_value, level] control points, linearly interpolated
+    points = sorted(curves[curve])
+    levels = []
+    for value in range(128):
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if x0 <= value <= x1:
+                levels.append(y0 + (y1 - y0) * (value - x0) / ((x1 - x0) or 1))
+                break
+        else:
+            levels.append(points[0][1] if value < points[0][0] else points[-1][1])
+    return levels
+
+def value_table(attribute, curve, curves, low=None, high=None):
+    """Return 128 attribute values for a curve, scaled into the attribute's range."""
+    default_low, default_high = RANGES[attribute]
+    low = default_low if low is None else low
+    high = default_high if high is None else high
+    return [int(low + level * (high - low)) for level in curve_table(curve, curves)]
+
+def compile_entry(entry, curves):
+    """Compile one config entry into a Mapping."""
+    if "effect" in entry and entry.get("light") is None:
+        # Effect generators drive a single light and would be called with None
+        raise ValueError(f"effect {entry['effect']!r} needs a light, not a group: {entry}")
+    fixed = entry.get("set", {})
+    if "attribute" in entry:
+        attribute = entry["attribute"]
+        values = value_table(attribute, entry.get("curve", "linear"), curves, entry.get("min"), entry.get("max"))
+        states = tuple({**fixed, attribute: value} for value in values)
+    else:
+        states = (fixed,) * 128
+    return Mapping(entry.get("light"), entry.get("group"), entry.get("effect"), states)
+
+def valid_message(status, data1, data2):
+    """Whether a raw 3-byte message has a status byte and 7-bit data bytes, as MIDI requires."""
+    return 0x80 <= status <= 0xFF and 0 <= data1 <= 127 and 0 <= data2 <= 127
+
+class MidiMapping:
+    """MIDI -> light lookup tables, indexed by [status nibble][channel * 128 + note/CC]."""
+
+    def __init__(self, tables, light_ids=()):
+        self.tables = tables
+        self.light_ids = sorted(set(light_ids))  # Every light targeted by the mapping
+
+    def lookup(self, status, data1, data2):
+        """Return the Mapping for a raw 3-byte MIDI message, or None (also for malformed messages)."""
+        if not valid_message(status, data1, data2):
+            return None  # A data byte over 127 would index the next channel's entries
+        if status >> 4 == NOTE_ON and data2 == 0:
+            status -= 0x10  # Note on with velocity 0 is a note off
+        return self.tables[status >> 4][((status & 0x0F) << 7) | data1]
+
+def compile_mapping(config):
+    """Compile a mapping config into flat per-status lookup tables."""
+    curves = config.get("curves", {})
+    empty = [None] * 2048  # Shared by every status without mappings
+    tables = [empty] * 16
+    light_ids = [entry["light"] for entry in config.get("notes", []) + config.get("controls", []) if "light" in entry]
+    for status in (NOTE_OFF, NOTE_ON, CONTROL_CHANGE):
+        tables[status] = [None] * 2048
+
+    for entry in config.get("notes", []):
+        index = (entry.get("channel", 0) << 7) | entry["note"]
+        tables[NOTE_ON][index] = compile_entry(entry, curves)
+        if "release" in entry:
+            release = {"light": entry.get("light"), "group": entry.get("group"), "set": entry["release"]}
+            tables[NOTE_OFF][index] = compile_entry(release, curves)
+        elif entry.get("hold") and "effect" in entry:
+            # Held effects run until the note is released
+            tables[NOTE_OFF][index] = compile_entry(entry, curves)._replace(stop=True)
+
+    for entry in config.get("controls", []):
+        index = (entry.get("channel", 0) << 7) | entry["cc"]
+        tables[CONTROL_CHANGE][index] = compile_entry(entry, curves)
+
+    return MidiMapping(tables, light_ids)
+
+def load_mapping(path=MAPPING_PATH):
+    """Load and compile the mapping config file."""
+    with open(path) as f:
+        return compile_mapping(json.load(f))
@@ -0,0 +1,27 @@
+# midiProtocol.py
+import struct
+
+# Binary MIDI batch frame, as sent to the /api/v1/midi WebSocket: a run of
+# fixed-size records, one per raw MIDI message
+#   timestamp (uint32, milliseconds on the sender's clock), status, data1, data2
+RECORD = struct.Struct("<I3B")
+RECORD_SIZE = RECORD.size
+TIMESTAMP_MASK = 0xFFFFFFFF  # Sender timestamps wrap after about 49.7 days
+
+def encode_batch(events):
+    """Pack (timestamp_ms, status, data1, data2) tuples into one binary frame."""
+    frame = bytearray(RECORD_SIZE * len(events))
+    for index, (timestamp, status, data1, data2) in enumerate(events):
+        RECORD.pack_into(frame, index * RECORD_SIZE, timestamp & TIMESTAMP_MASK, status, data1, data2)
+    return bytes(frame)
+
+def decode_batch(frame):
+    """Iterate the (timestamp_ms, status, data1, data2) records in a binary frame."""
+    if len(frame) % RECORD_SIZE:
+        raise ValueError(f"MIDI batch length {len(frame)} is not a multiple of {RECORD_SIZE}")
+    return RECORD.iter_unpack(frame)
+
+def timestamp_age(newest, timestamp):
+    """Milliseconds `timestamp` is behind `newest`, across the wrap; negative if it is ahead."""
+    age = (newest - timestamp) & TIMESTAMP_MASK
+    return age - (TIMESTAMP_MASK + 1) if age > TIMESTAMP_MASK >> 1 else age
@@ -0,0 +1,183 @@
+# shadowState.py
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+# The bridge's command budget is better spent on real changes: every sender
+# keeps the last acknowledged state of each target and strips attributes a
+# command would set to the value they already have. An entry is trusted for
+# HUE_SHADOW_TTL seconds after it was last confirmed (0 disables stripping),
+# and dropped as soon as a poll shows the light was changed from elsewhere.
+load_dotenv()
+SHADOW_TTL = float(os.getenv("HUE_SHADOW_TTL", 10))
+
+ALWAYS_SEND = {"alert", "effect", "scene", "transitiontime"}  # Actions and options, not state
+COLOR_MODES = {  # Setting one colour model makes the light forget the others
+    "xy": ("hue", "sat", "ct"),
+    "ct": ("hue", "sat", "xy"),
+    "hue": ("xy", "ct"),
+    "sat": ("xy", "ct"),
+}
+TOLERANCE = {"hue": 100, "sat": 2, "ct": 2, "xy": 0.01}  # Read-back values drift slightly from what was set
+
+def normalize(value):
+    """Make values from commands and responses comparable (xy lists vs tuples, float noise)."""
+    if isinstance(value, (list, tuple)):
+        return tuple(round(v, 4) if isinstance(v, float) else v for v in value)
+    return value
+
+def same(attribute, a, b):
+    """Whether a polled value matches the shadowed one, within read-back tolerance."""
+    tolerance = TOLERANCE.get(attribute)
+    if tolerance is None or isinstance(a, bool) or isinstance(b, bool):
+        return a == b
+    if isinstance(a, tuple) and isinstance(b, tuple):
+        return len(a) == len(b) and all(abs(x - y) <= tolerance for x, y in zip(a, b))
+    try:
+        return abs(a - b) <= tolerance
+    except TypeError:
+        return a == b
+
+def target_key(target):
+    """Lights are keyed by int ID whether they arrive as 5 or "5"; groups stay ("group", id)."""
+    return target if isinstance(target, tuple) else int(target)
+
+class ShadowState:
+    """Last acknowledged state per target, used to strip redundant writes.
+
+    `diff` is called right before a command is sent, with no other request in
+    flight for that target, so the shadow it compares against is current.
+    """
+
+    def __init__(self, ttl=SHADOW_TTL):
+        self.ttl = ttl
+        self.states = {}  # Target -> {attribute: value} last acknowledged
+        self.confirmed = {}  # Target -> monotonic time its shadow was last confirmed
+        self.writes = {True: 0, False: 0}  # Group writes and light writes diffed so far
+        self.seen = {}  # Target -> (group writes, light writes) when its last command was diffed
+        self.lock = threading.Lock()
+        self.stats = {"stripped": 0, "unchanged": 0, "invalidated": 0}
+
+    def _known(self, key):
+        confirmed = self.confirmed.get(key)
+        if confirmed is None or time.monotonic() - confirmed > self.ttl:
+            self.states.pop(key, None)
+            self.confirmed.pop(key, None)
+            return {}
+        return self.states[key]
+
+    def _forget(self, groups, keep=None):
+        """Drop every group shadow (groups=True) or every light shadow (groups=False), except `keep`."""
+        for key in [key for key in self.states if isinstance(key, tuple) == groups and key != keep]:
+            del self.states[key]
+            del self.confirmed[key]
+
+    def diff(self, target, state_data):
+        """Return the attributes of a command that would change the target, or None if nothing would."""
+        key = target_key(target)
+        with self.lock:
+            known = self._known(key)
+            changed = {attribute: value for attribute, value in state_data.items()
+                       if attribute in ALWAYS_SEND or attribute.endswith("_inc")
+                       or attribute not in known or known[attribute] != normalize(value)}
+            # A group write changes its member lights and a light write breaks
+            # its groups' uniform state, so neither side's shadow holds anymore.
+            # Groups overlap (group 0 holds every light), so a group write also
+            # drops every other group's shadow.
+            is_group = isinstance(key, tuple)
+            self._forget(groups=True, keep=key)
+            if is_group:
+                self._forget(groups=False)
+            self.writes[is_group] += 1
+            self.seen[key] = (self.writes[True], self.writes[False])
+            self.stats["stripped"] += len(state_data) - len(changed)
+            if not set(changed) - {"transitiontime"}:
+                self.stats["unchanged"] += 1
+                return None
+            return changed
+
+    def ack(self, target, results):
+        """Record the success entries of the response to a diffed command.
+
+        An error, or a write diffed while this one was in flight that may have
+        changed the target (any group write; for a group, any light write
+        too), makes the target unknown instead.
+        """
+        key = target_key(target)
+        succeeded = {}
+        failed = not isinstance(results, list)
+        for result in results if not failed else ():
+            if isinstance(result, dict) and "error" in result:
+                failed = True
+            for address, value in result.get("success", {}).items() if isinstance(result, dict) else ():
+                succeeded[address.rsplit("/", 1)[-1]] = normalize(value)
+        with self.lock:
+            seen = self.seen.pop(key, None)
+            current = (self.writes[True], self.writes[False])
+            overtaken = seen is None or (seen != current if isinstance(key, tuple) else seen[0] != current[0])
+            if failed or overtaken:
+                # An error, or another write went out meanwhile and may have changed it
+                self._invalidate(key)
+                return
+            known = self._known(key)
+            for attribute, value in succeeded.items():
+                if attribute in ALWAYS_SEND:
+                    continue
+                if attribute.endswith("_inc"):
+                    known.pop(attribute[:-4], None)  # Relative change, the result isn't reported
+                    continue
+                for other in COLOR_MODES.get(attribute, ()):
+                    if other not in succeeded:
+                        known.pop(other, None)
+                known[attribute] = value
+            self.states[key] = known
+            self.confirmed[key] = time.monotonic()
+
+    def _invalidate(self, key):
+        if self.states.pop(key, None) is not None:
+            self.stats["invalidated"] += 1
+        self.confirmed.pop(key, None)
+
+    def invalidate(self, target=None):
+        """Forget one target, or everything when target is None."""
+        with self.lock:
+            if target is None:
+                self.stats["invalidated"] += len(self.states)
+                self.states.clear()
+                self.confirmed.clear()
+            else:
+                self._invalidate(target_key(target))
+
+    def bypass(self, target):
+        """Forget what a write sent around the shadow (straight to the bridge) may change.
+
+        Call it before the write goes out; an ack still in flight for the
+        target no longer describes it and is discarded.
+        """
+        key = target_key(target)
+        with self.lock:
+            is_group = isinstance(key, tuple)
+            self._invalidate(key)
+            self.seen.pop(key, None)
+            self._forget(groups=True)
+            if is_group:
+                self._forget(groups=False)
+            self.writes[is_group] += 1
+
+    def sync(self, lights):
+        """Check polled {light_id: state} against the shadow, dropping lights changed elsewhere."""
+        with self.lock:
+            now = time.monotonic()
+            for light_id, state in lights.items():
+                key = target_key(light_id)
+                known = self.states.get(key)
+                if known is None:
+                    continue
+                if not state.get("reachable", True) or any(
+                        not same(attribute, value, normalize(state[attribute]))
+                        for attribute, value in known.items() if attribute in state):
+                    self._invalidate(key)
+                    self._forget(groups=True)
+                else:
+                    self.confirmed[key] = now
@@ -0,0 +1,233 @@
+# showClock.py
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+import mido
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Show timing: steps fire at absolute deadlines on a clock, either wall time in
+# seconds or musical time in beats. A TempoClock runs at SHOW_BPM until MIDI
+# clock arrives, then follows the DAW's tempo and transport.
+load_dotenv()
+SHOW_BPM = float(os.getenv("SHOW_BPM", 120))
+MIDI_CLOCK_PORT = os.getenv("MIDI_CLOCK_PORT")  # Input carrying MIDI clock for the show scripts
+PPQN = 24  # MIDI clock ticks per beat
+TEMPO_SMOOTHING = 0.1  # Weight of each new tick interval in the tempo estimate
+CLOCK_TYPES = ("clock", "start", "stop", "continue", "songpos")
+
+class WallClock:
+    """Monotonic time in seconds."""
+
+    def position(self):
+        return time.monotonic()
+
+    def wait_until(self, position):
+        delay = position - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def seconds_until(self, position):
+        return position - time.monotonic()
+
+    def units(self, seconds):
+        return seconds
+
+class TempoClock:
+    """Musical time in beats, free-running at a set tempo or locked to MIDI clock.
+
+    Without MIDI clock the position advances at `bpm` from creation. Once
+    clock ticks arrive, each tick re-anchors the position (24 per beat), the
+    tempo follows the smoothed tick interval, and start/stop/continue and
+    song position messages drive the transport.
+    """
+
+    def __init__(self, bpm=SHOW_BPM):
+        self.seconds_per_beat = 60.0 / bpm
+        self.anchor_beat = 0.0
+        self.anchor_time = time.monotonic()
+        self.running = True
+        self.external = False  # True once MIDI clock has been seen
+        self.ticks = 0
+        self.last_tick = None
+        self.condition = threading.Condition()
+
+    @property
+    def bpm(self):
+        return 60.0 / self.seconds_per_beat
+
+    def seconds(self, beats):
+        """Convert a beat count to seconds at the current tempo."""
+        return beats * self.seconds_per_beat
+
+    def units(self, seconds):
+        """Convert seconds to beats at the current tempo."""
+        return seconds / self.seconds_per_beat
+
+    def _position(self, now):
+        if not self.running:
+            return self.anchor_beat
+        beats = (now - self.anchor_time) / self.seconds_per_beat
+        if self.external:
+            beats = min(beats, 1.0 / PPQN)  # Never run ahead of the next tick
+        return self.anchor_beat + beats
+
+    def position(self):
+        with self.condition:
+            return self._position(time.monotonic())
+
+    def next_beat(self, multiple=1):
+        """Return the next beat position that is a multiple of `multiple` (e.g. 4 for the next bar)."""
+        return math.ceil(self.position() / multiple) * multiple
+
+    def wait_until(self, beat):
+        """Block until the clock reaches `beat`, following tempo changes and stops."""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                remaining = beat - self._position(now)
+                if remaining <= 0:
+                    return
+                # Re-check on every tick, or after the time the beat is due
+                self.condition.wait(remaining * self.seconds_per_beat if self.running else None)
+
+    def seconds_until(self, beat):
+        """Seconds to wait before checking for `beat` again (<= 0 once reached), or None while stopped.
+
+        Waits are capped at one clock tick, so callers that can't wait on
+        the clock itself still follow tempo changes and relocations.
+        """
+        with self.condition:
+            remaining = beat - self._position(time.monotonic())
+            if remaining <= 0:
+                return remaining * self.seconds_per_beat
+            if not self.running:
+                return None
+            return min(remaining, 1.0 / PPQN) * self.seconds_per_beat
+
+    def handle(self, message):
+        """Apply a mido clock, start, stop, continue or songpos message."""
+        now = time.monotonic()
+        with self.condition:
+            if message.type == "clock":
+                if not self.running:
+                    return
+                if self.last_tick is not None:
+                    interval = (now - self.last_tick) * PPQN
+                    if 0.1 < interval < 5.0:  # Ignore gaps from a stalled or restarted clock
+                        self.seconds_per_beat += TEMPO_SMOOTHING * (interval - self.seconds_per_beat)
+                self.external = True
+                self.last_tick = now
+                self.ticks += 1
+                self.anchor_beat = self.ticks / PPQN
+            elif message.type == "start":
+                self.ticks = 0
+                self.anchor_beat = 0.0
+                self.running = True
+                self.last_tick = None
+            elif message.type == "stop":
+                self.anchor_beat = self._position(now)
+                self.running = False
+            elif message.type == "continue":
+                self.running = True
+                self.last_tick = None
+            elif message.type == "songpos":
+                self.ticks = message.pos * 6  # Song position is counted in sixteenth notes
+                self.anchor_beat = self.ticks / PPQN
+            else:
+                return
+            self.anchor_time = now
+            self.condition.notify_all()
+
+    def listen(self, port_name=MIDI_CLOCK_PORT):
+        """Follow MIDI clock from an input port on a background thread."""
+        def run():
+            with mido.open_input(port_name) as inport:
+                for message in inport:
+                    if message.type in CLOCK_TYPES:
+                        self.handle(message)
+        threading.Thread(target=run, daemon=True).start()
+        return self
+
+def run_steps(steps, send, clock=None, origin=None):
+    """Send (at, value) steps at absolute deadlines `origin + at` on a clock.
+
+    `at` is in the clock's units: seconds on the default WallClock, beats on
+    a TempoClock. A step is skipped once the next later step is overdue, so a
+    slow send costs that step instead of delaying the rest of the show.
+    Steps sharing an offset go out in order (e.g. a fade's start value and
+    the fade itself). Returns (sent, skipped).
+    """
+    clock = clock or WallClock()
+    origin = clock.position() if origin is None else origin
+    following = [None] * len(steps)  # Offset of the next strictly later step
+    for index in range(len(steps) - 2, -1, -1):
+        later = steps[index + 1][0]
+        following[index] = later if later > steps[index][0] else following[index + 1]
+    sent = skipped = 0
+    for index, (at, value) in enumerate(steps):
+        if following[index] is not None and clock.position() > origin + following[index]:
+            skipped += 1
+            continue
+        clock.wait_until(origin + at)
+        send(value)
+        sent += 1
+    if skipped:
+        logger.debug("Skipped %d late steps of %d", skipped, len(steps))
+    return sent, skipped
+
+def step_effect(steps, send, clock):
+    """EffectEngine form of run_steps: send (at, value) steps `at` clock units after the effect starts.
+
+    The engine keeps the deadlines and sends each one back in; like
+    run_steps, a step is skipped once the next later step is overdue. `steps`
+    can be any iterable, such as an endless generator for a held effect.
+    """
+    origin = yield 0  # The engine answers with the start deadline
+    upcoming = iter(steps)
+    buffered = deque()
+
+    def following(at):
+        """Offset of the next strictly later step, reading ahead as far as needed."""
+        for step in buffered:
+            if step[0] > at:
+                return step[0]
+        for step in upcoming:
+            buffered.append(step)
+            if step[0] > at:
+                return step[0]
+        return None
+
+    position = 0
+    while True:
+        if not buffered:
+            step = next(upcoming, None)
+            if step is None:
+                return
+            buffered.append(step)
+        at, value = buffered.popleft()
+        if at > position:
+            yield at - position
+            position = at
+        later = following(at)
+        if later is not None and clock.position() > origin + later:
+            continue
+        send(value)
+
+# Shared tempo clock for the scripts
+_clock = None
+_clock_lock = threading.Lock()
+
+def get_clock():
+    """Return the shared TempoClock, following MIDI_CLOCK_PORT when it is set."""
+    global _clock
+    with _clock_lock:
+        if _clock is None:
+            _clock = TempoClock()
+            if MIDI_CLOCK_PORT:
+                _clock.listen(MIDI_CLOCK_PORT)
+    return _clock
@@ -0,0 +1,295 @@
+# showCompiler.py
+import os
+import sys
+import json
+import math
+import mmap
+import struct
+import hashlib
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+import mido
+import requests
+from dotenv import load_dotenv
+from midiMapping import MAPPING_PATH, compile_mapping
+from commandScheduler import RATE_LIMIT
+from bridgeMap import load_bridges, split_id, get_router
+from showClock import WallClock, run_steps
+
+logger = logging.getLogger(__name__)
+
+# Rehearsed shows are compiled ahead of time: a .mid file is run through the
+# MIDI mapping, coalesced and paced per bridge exactly like the live scheduler,
+# and stored as a binary timeline of ready-to-send JSON bodies. Playback
+# memory-maps the file, so nothing is parsed or mapped at showtime.
+#
+# File layout (little-endian):
+#   header   magic, version, lane count, cache key
+#   lanes    (first record, record count) per bridge
+#   records  (time_ms, kind, local target ID, body offset, body length)
+#   bodies   deduplicated JSON state bodies
+load_dotenv()
+SHOW_CACHE_DIR = os.getenv("SHOW_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".showcache"))
+
+MAGIC = b"HMSH"
+VERSION = 1
+HEADER = struct.Struct("<4sHH32s")
+LANE = struct.Struct("<II")
+RECORD = struct.Struct("<IBHIH")
+LIGHT, GROUP = 0, 1
+
+def cache_key(midi_bytes, mapping_bytes, rate, lanes):
+    """Hash everything the compiled timeline depends on."""
+    digest = hashlib.sha256()
+    for part in (MAGIC, struct.pack("<HdH", VERSION, rate, lanes), midi_bytes, mapping_bytes):
+        digest.update(hashlib.sha256(part).digest())
+    return digest.digest()
+
+def midi_events(midi_file):
+    """Return [(offset_s, status, data1, data2)] for the 3-byte messages in a .mid file."""
+    events, offset = [], 0.0
+    for message in midi_file:
+        offset += message.time
+        if not message.is_meta:
+            data = message.bytes()
+            if len(data) == 3:
+                events.append((offset, *data))
+    return events
+
+def map_events(events, mapping, lanes):
+    """Run events through the mapping, returning ([(offset_s, lane, target, state)], stats)."""
+    commands, stats = [], {"events": len(events), "mapped": 0, "effects_skipped": 0}
+    for offset, status, data1, data2 in events:
+        entry = mapping.lookup(status, data1, data2)
+        if entry is None:
+            continue
+        if entry.effect is not None:
+            stats["effects_skipped"] += 1  # Effects run live on the effect engine
+            continue
+        stats["mapped"] += 1
+        state = entry.states[data2]
+        if entry.group is not None:
+            if int(entry.group) == 0:
+                # Group 0 is every light, so it takes a slot on every bridge
+                for lane in range(lanes):
+                    commands.append((offset, lane, ("group", 0), state))
+            else:
+                lane, local_id = split_id(entry.group)
+                commands.append((offset, lane, ("group", local_id), state))
+        else:
+            lane, local_id = split_id(entry.light)
+            commands.append((offset, lane, local_id, state))
+    return commands, stats
+
+def schedule_lane(commands, rate):
+    """Coalesce and pace one bridge's commands like CommandScheduler, dropping unchanged attributes.
+
+    Returns [(time_ms, target, state)] with no two sends closer than 1/rate.
+    Times are whole milliseconds, as stored, so the spacing survives the file.
+    """
+    interval = math.ceil(1000 / rate)
+    pending = OrderedDict()  # Target -> [queued_at, state]
+    shadow = {}  # Target -> attributes last sent
+    timeline = []
+    next_free = 0
+
+    def send_due(until):
+        nonlocal next_free
+        while pending and next_free <= until:
+            target, (queued_at, state) = pending.popitem(last=False)
+            if isinstance(target, tuple):
+                shadow.clear()  # A group action may change any light on the bridge
+            sent = shadow.setdefault(target, {})
+            changed = {key: value for key, value in state.items() if key == "transitiontime" or sent.get(key) != value}
+            if set(changed) - {"transitiontime"}:
+                at = max(next_free, math.ceil(queued_at * 1000))
+                timeline.append((at, target, changed))
+                sent.update(changed)
+                next_free = at + interval
+
+    for offset, target, state in commands:
+        send_due(offset * 1000)
+        if target in pending:
+            pending[target][1].update(state)
+        else:
+            pending[target] = [offset, dict(state)]
+    send_due(float("inf"))
+    return timeline
+
+def compile_show(midi_path, mapping_path=MAPPING_PATH, rate=RATE_LIMIT, lanes=None):
+    """Compile a .mid file to show bytes; returns (data, report)."""
+    lanes = lanes or len(load_bridges())
+    with open(midi_path, "rb") as f:
+        midi_bytes = f.read()
+    with open(mapping_path, "rb") as f:
+        mapping_bytes = f.read()
+    mapping = compile_mapping(json.loads(mapping_bytes))
+
+    commands, report = map_events(midi_events(mido.MidiFile(midi_path)), mapping, lanes)
+    timelines = [schedule_lane([(offset, target, state) for offset, lane, target, state in commands if lane == index], rate)
+                 for index in range(lanes)]
+
+    # Records per lane, with identical bodies stored once
+    bodies, body_offsets, records = bytearray(), {}, []
+    lane_table = []
+    for timeline in timelines:
+        lane_table.append((len(records), len(timeline)))
+        for at, target, state in timeline:
+            body = json.dumps(state, separators=(",", ":")).encode()
+            if body not in body_offsets:
+                body_offsets[body] = len(bodies)
+                bodies += body
+            kind, target_id = (GROUP, target[1]) if isinstance(target, tuple) else (LIGHT, target)
+            records.append((at, kind, target_id, body_offsets[body], len(body)))
+
+    data = bytearray(HEADER.pack(MAGIC, VERSION, lanes, cache_key(midi_bytes, mapping_bytes, rate, lanes)))
+    for lane in lane_table:
+        data += LANE.pack(*lane)
+    for record in records:
+        data += RECORD.pack(*record)
+    data += bodies
+
+    report.update(
+        commands=[len(timeline) for timeline in timelines],
+        duration=max((timeline[-1][0] / 1000 for timeline in timelines if timeline), default=0.0),
+        unique_bodies=len(body_offsets),
+        size=len(data),
+    )
+    return bytes(data), report
+
+def load_show(midi_path, mapping_path=MAPPING_PATH, rate=RATE_LIMIT, cache_dir=SHOW_CACHE_DIR):
+    """Return the path of the compiled show, compiling it only when the cache misses."""
+    lanes = len(load_bridges())
+    with open(midi_path, "rb") as f:
+        midi_bytes = f.read()
+    with open(mapping_path, "rb") as f:
+        key = cache_key(midi_bytes, f.read(), rate, lanes)
+    path = os.path.join(cache_dir, key.hex()[:32] + ".show")
+    if os.path.exists(path):
+        return path
+    data, report = compile_show(midi_path, mapping_path, rate, lanes)
+    logger.info("Compiled %s: %s", midi_path, report)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)  # Never leave a half-written show in the cache
+    return path
+
+class ShowLane:
+    """One bridge's records, decoded from the mapped file as they are reached."""
+
+    def __init__(self, buffer, records_at, first, count, bodies_at):
+        self.buffer = buffer
+        self.offset = records_at + RECORD.size * first
+        self.count = count
+        self.bodies_at = bodies_at
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        """Return (time_s, (kind, target, body bytes)) for a record."""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        time_ms, kind, target, body_offset, body_length = RECORD.unpack_from(self.buffer, self.offset + RECORD.size * index)
+        start = self.bodies_at + body_offset
+        return time_ms / 1000, (kind, target, self.buffer[start:start + body_length])
+
+class ShowFile:
+    """A compiled show opened with mmap."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, lanes, self.key = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} show file")
+        table = [LANE.unpack_from(self.buffer, HEADER.size + LANE.size * index) for index in range(lanes)]
+        records_at = HEADER.size + LANE.size * lanes
+        bodies_at = records_at + RECORD.size * sum(count for _, count in table)
+        self.lanes = [ShowLane(self.buffer, records_at, first, count, bodies_at) for first, count in table]
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+def play_show(show, router, start=None):
+    """Send every lane's commands to its bridge at their offsets, bridges in parallel.
+
+    Bodies go out as stored; a late command is skipped if the next one on its
+    bridge is already due, and a failed request is logged and counted without
+    stopping the lane. Returns [(sent, skipped, failed)] for every lane; a
+    lane without a configured bridge counts all its commands as failed.
+    """
+    clock = WallClock()
+    start = clock.position() + 0.5 if start is None else start  # Time for every lane to reach its first deadline
+    results = [(0, 0, len(lane)) for lane in show.lanes]
+
+    def play_lane(index):
+        client = router.clients[index]
+        failed = 0
+
+        def send(command):
+            nonlocal failed
+            kind, target, body = command
+            url = client.state_url(target) if kind == LIGHT else f"{client.base_url}/groups/{target}/action"
+            try:
+                client.put_raw(url, body)
+            except requests.exceptions.RequestException as e:
+                failed += 1
+                logger.error("Show command to %s failed: %s", url, str(e))
+
+        try:
+            sent, skipped = run_steps(show.lanes[index], send, clock, start)
+            results[index] = (sent - failed, skipped, failed)
+        except Exception:
+            logger.exception("Playing lane %d stopped", index)
+
+    lanes = min(len(show.lanes), len(router.clients))
+    if lanes < len(show.lanes):
+        logger.error("The show has %d lanes but only %d bridges are configured", len(show.lanes), lanes)
+    threads = [threading.Thread(target=play_lane, args=(index,)) for index in range(lanes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def peak_rate(show):
+    """Return the most commands any bridge gets within one second."""
+    peak = 0
+    for lane in show.lanes:
+        times = [round(lane[index][0] * 1000) for index in range(len(lane))]
+        start = 0
+        for end, at in enumerate(times):
+            while at - times[start] >= 1000:
+                start += 1
+            peak = max(peak, end - start + 1)
+    return peak
+
+# Main Script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile a MIDI file into a cached light show and optionally play it.")
+    parser.add_argument("midi_file")
+    parser.add_argument("--mapping", default=MAPPING_PATH)
+    parser.add_argument("--rate", type=float, default=RATE_LIMIT, help="Commands per second per bridge")
+    parser.add_argument("--play", action="store_true", help="Play the show on the configured bridges")
+    args = parser.parse_args()
+
+    path = load_show(args.midi_file, args.mapping, args.rate)
+    show = ShowFile(path)
+    counts = [len(lane) for lane in show.lanes]
+    duration = max((lane[len(lane) - 1][0] for lane in show.lanes if len(lane)), default=0.0)
+    peak = peak_rate(show)
+    print(f"Show: {path}")
+    print(f"  {sum(counts)} commands over {duration:.1f} s, per bridge: {counts}")
+    print(f"  Peak {peak} commands in any second (limit {args.rate:g})")
+    if peak > args.rate:
+        print("FAIL: the show exceeds the bridge rate limit")
+        sys.exit(1)
+    if args.play:
+        for index, (sent, skipped, failed) in enumerate(play_show(show, get_router())):
+            print(f"  Bridge {index}: sent {sent}, skipped {skipped} late, failed {failed}")
+    show.close()
@@ -0,0 +1,103 @@
+# showRunner.py
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from effectEngine import EffectEngine
+
+logger = logging.getLogger(__name__)
+
+# Shows with many lights run every effect on one EffectEngine thread; the
+# blocking bridge calls go to a small fixed pool. However many effects run,
+# the thread count stays at 1 + SHOW_MAX_IN_FLIGHT.
+load_dotenv()
+SHOW_MAX_IN_FLIGHT = int(os.getenv("SHOW_MAX_IN_FLIGHT", os.getenv("HUE_POOL_SIZE", 4)))  # Concurrent requests
+SHOW_RATE = float(os.getenv("SHOW_RATE", os.getenv("HUE_RATE_LIMIT", 10)))  # Requests started per second
+
+class ShowRunner:
+    """One scheduler loop for all effects plus a bounded, rate-paced I/O pool.
+
+    Effects are EffectEngine generators that call `send(key, fn, *args)`
+    instead of making requests themselves. At most `max_in_flight` calls
+    run at once and they start no faster than `rate` per second. While the
+    pool is busy, newer calls replace older pending ones with the same key
+    (usually the light ID), so a slow bridge drops stale steps instead of
+    building a backlog. Calls made in the same effect step are all kept, in
+    order, so a fade's start value is never merged away by the fade. Effects run on `clock` (wall time by default), so
+    their steps and trigger delays are in its units, e.g. beats.
+    """
+
+    def __init__(self, max_in_flight=SHOW_MAX_IN_FLIGHT, rate=SHOW_RATE, clock=None):
+        self.engine = EffectEngine(clock)
+        self.max_in_flight = max_in_flight
+        self.interval = 1.0 / rate if rate else 0.0
+        self.pool = ThreadPoolExecutor(max_workers=max_in_flight)
+        self.pending = OrderedDict()  # Key -> (effect step, [(fn, args)]), oldest first
+        self.in_flight = 0
+        self.next_start = time.monotonic()
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.stats = {"sent": 0, "superseded": 0, "failed": 0}
+
+    def start(self):
+        self.engine.start()
+        return self
+
+    def trigger(self, key, effect, delay=0.0):
+        """Run an effect generator on the shared loop."""
+        self.engine.trigger(key, effect, delay)
+
+    def send(self, key, fn, *args):
+        """Queue a blocking call without blocking the effect loop."""
+        step = self.engine.current_step()
+        with self.lock:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                self.pool.submit(self._work, [(fn, args)])
+                return
+            pending = self.pending.get(key)
+            if pending is not None and step is not None and pending[0] == step:
+                pending[1].append((fn, args))  # Same step: e.g. a fade's start value, then the fade
+                return
+            if pending is not None:
+                self.stats["superseded"] += len(pending[1])
+            self.pending[key] = (step, [(fn, args)])
+
+    def _work(self, calls):
+        while True:
+            for fn, args in calls:
+                # Pace request starts across the whole pool
+                with self.lock:
+                    start = max(self.next_start, time.monotonic())
+                    self.next_start = start + self.interval
+                delay = start - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                try:
+                    fn(*args)
+                    outcome = "sent"
+                except Exception as e:
+                    outcome = "failed"
+                    logger.error("Show request failed: %s", str(e))
+                with self.lock:  # Every pool thread counts here
+                    self.stats[outcome] += 1
+            with self.lock:
+                if not self.pending:
+                    self.in_flight -= 1
+                    self.idle.notify_all()
+                    return
+                _, (_, calls) = self.pending.popitem(last=False)
+
+    def wait(self):
+        """Block until every effect has finished and every request has been sent."""
+        self.engine.wait()
+        with self.lock:
+            while self.in_flight:
+                self.idle.wait()
+
+    def shutdown(self):
+        self.engine.shutdown()
+        self.pool.shutdown()
@@ -0,0 +1,110 @@
+# streamReceiver.py
+import time
+import socket
+import struct
+import argparse
+import statistics
+from entertainmentStream import PROTOCOL, HEADER_SIZE, LIGHT_SIZE, SEQUENCE_OFFSET, STREAM_PORT
+
+# Local stand-in for the bridge's entertainment receiver. It decodes frames
+# from entertainmentStream.py and reports frame jitter and loss.
+
+def decode_frame(data):
+    """Return (sequence, {light_id: (r, g, b)}) for a frame, or None if it is malformed."""
+    if len(data) < HEADER_SIZE or data[:len(PROTOCOL)] != PROTOCOL or (len(data) - HEADER_SIZE) % LIGHT_SIZE:
+        return None
+    lights = {}
+    for light_type, light_id, red, green, blue in struct.iter_unpack(">BHHHH", data[HEADER_SIZE:]):
+        lights[light_id] = (red, green, blue)
+    return data[SEQUENCE_OFFSET], lights
+
+class StreamReceiver:
+    """Collects per-stream arrival times and sequence gaps."""
+
+    def __init__(self, port=STREAM_PORT, host="0.0.0.0"):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.buffer = bytearray(2048)
+        self.streams = {}  # (sender, first light ID) -> stats
+        self.lights = {}
+        self.malformed = 0
+
+    def receive(self, timeout=None):
+        """Receive and account for one frame; returns False on timeout."""
+        self.sock.settimeout(None if timeout is None else max(timeout, 0.001))  # 0 would make the socket non-blocking
+        try:
+            size, sender = self.sock.recvfrom_into(self.buffer)
+        except socket.timeout:
+            return False
+        arrival = time.monotonic()
+        decoded = decode_frame(bytes(self.buffer[:size]))
+        if decoded is None:
+            self.malformed += 1
+            return True
+        sequence, lights = decoded
+        self.lights.update(lights)
+
+        key = (sender, next(iter(lights), None))
+        stats = self.streams.setdefault(key, {"frames": 0, "lost": 0, "reordered": 0, "intervals": [], "last_sequence": None, "last_arrival": None})
+        if stats["last_sequence"] is not None:
+            step = (sequence - stats["last_sequence"]) & 0xFF
+            if step == 0 or step >= 0x80:
+                # At or behind the newest frame: a duplicate or late packet, not a gap
+                stats["reordered"] += 1
+                if step:
+                    stats["frames"] += 1
+                    stats["lost"] = max(stats["lost"] - 1, 0)  # It was counted lost when the gap opened
+                return True
+            stats["lost"] += step - 1
+            stats["intervals"].append(arrival - stats["last_arrival"])
+        stats["frames"] += 1
+        stats["last_sequence"] = sequence
+        stats["last_arrival"] = arrival
+        return True
+
+    def report(self, reset=True):
+        """Return frame rate, jitter and loss for each stream seen since the last report."""
+        reports = {}
+        for key, stats in self.streams.items():
+            intervals = stats["intervals"]
+            expected = stats["frames"] + stats["lost"]
+            mean = statistics.fmean(intervals) if intervals else 0.0
+            reports[key] = {
+                "frames": stats["frames"],
+                "lost": stats["lost"],
+                "reordered": stats["reordered"],
+                "loss_pct": 100.0 * stats["lost"] / expected if expected else 0.0,
+                "fps": 1.0 / mean if mean else 0.0,
+                "jitter_ms": 1000 * statistics.pstdev(intervals) if len(intervals) > 1 else 0.0,
+                "max_gap_ms": 1000 * max(intervals) if intervals else 0.0,
+            }
+            if reset:
+                stats.update(frames=0, lost=0, reordered=0, intervals=[])
+        return reports
+
+    def close(self):
+        self.sock.close()
+
+# Main Script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode entertainment frames and report jitter and loss.")
+    parser.add_argument("--port", type=int, default=STREAM_PORT)
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between reports")
+    args = parser.parse_args()
+
+    receiver = StreamReceiver(args.port)
+    print(f"Listening for entertainment frames on UDP port {args.port}...")
+    next_report = time.monotonic() + args.interval
+    try:
+        while True:
+            receiver.receive(timeout=max(0.0, next_report - time.monotonic()))
+            if time.monotonic() >= next_report:
+                for (sender, first_light), stats in receiver.report().items():
+                    print(f"{sender[0]} lights {first_light}+: {stats['fps']:.1f} fps, "
+                          f"jitter {stats['jitter_ms']:.2f} ms, max gap {stats['max_gap_ms']:.1f} ms, "
+                          f"lost {stats['lost']} ({stats['loss_pct']:.1f}%), reordered {stats['reordered']}")
+                next_report += args.interval
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.close()
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The scripts are flat modules at the repository root (and in DockerServer/ for the server)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "DockerServer")]
+
+# Keep test bridges out of the real saved inventory
+os.environ["HUE_INVENTORY_PATH"] = os.path.join(tempfile.mkdtemp(prefix="huemidi-tests-"), "inventory.json")
@@ -0,0 +1,47 @@
+import wave
+import numpy as np
+import audioInput
+from audioInput import AUDIO_BEAT_NOTE, AudioAnalyzer, analyze, open_wav
+
+RATE = 44100
+
+def write_wav(path, samples):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes((samples * 32767).astype("<i2").tobytes())
+
+def kicks(seconds=2.0, every=0.5):
+    """Silence with a short 60 Hz burst every `every` seconds."""
+    t = np.arange(int(seconds * RATE)) / RATE
+    return np.where(t % every < 0.05, np.sin(2 * np.pi * 60 * t), 0.0)
+
+def test_open_wav_closes_the_file(tmp_path):
+    write_wav(tmp_path / "kicks.wav", kicks())
+    reader, rate = open_wav(str(tmp_path / "kicks.wav"))
+    with reader:
+        assert rate == RATE
+        blocks = list(analyze(reader, rate))
+    assert reader.stream.closed
+    assert blocks[-1][0] >= 2.0
+
+def test_beats_follow_the_kicks(tmp_path):
+    write_wav(tmp_path / "kicks.wav", kicks())
+    reader, rate = open_wav(str(tmp_path / "kicks.wav"))
+    with reader:
+        beats = [offset for offset, messages, _ in analyze(reader, rate)
+                 for message in messages if message.type == "note_on" and message.note == AUDIO_BEAT_NOTE]
+    assert len(beats) >= 3
+    assert all(abs(offset % 0.5) < 0.1 or abs(offset % 0.5 - 0.5) < 0.1 for offset in beats)
+
+def test_fft_without_out_matches(monkeypatch):
+    samples = kicks(0.2).astype(np.float32)
+    results = []
+    for out in (True, False):
+        monkeypatch.setattr(audioInput, "RFFT_OUT", out)
+        analyzer = AudioAnalyzer(RATE)
+        for start in range(0, len(samples) - analyzer.block + 1, analyzer.block):
+            analyzer.process(samples[start:start + analyzer.block])
+        results.append(analyzer.magnitude.copy())
+    assert np.allclose(results[0], results[1])
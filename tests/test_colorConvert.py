@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from colorConvert import GAMUTS, GAMUT_NAMES, brightness, clamp_to_gamut, rgb_frame, rgb_state, rgb_states, srgb_to_xy
+
+TABLE_ERROR = 0.005  # Largest xy error from rounding to the table's levels
+
+def outside_points(gamut):
+    """(point outside each edge, the edge's midpoint it should clamp to) for a gamut."""
+    corners = np.array(GAMUTS[gamut])
+    centre = corners.mean(axis=0)
+    for start, end in zip(corners, np.roll(corners, -1, axis=0)):
+        middle = (start + end) / 2
+        normal = np.array([end[1] - start[1], start[0] - end[0]])
+        normal /= np.linalg.norm(normal)
+        if normal @ (middle - centre) < 0:
+            normal = -normal
+        yield middle + 0.05 * normal, middle
+
+@pytest.mark.parametrize("gamut", GAMUT_NAMES)
+def test_points_outside_a_gamut_move_onto_its_edge(gamut):
+    points, edges = zip(*outside_points(gamut))
+    assert clamp_to_gamut(np.array(points), gamut) == pytest.approx(np.array(edges))
+    red, green, blue = GAMUTS[gamut]
+    assert clamp_to_gamut((red[0] + 0.1, red[1]), gamut) == pytest.approx(red, abs=0.05)
+    inside = np.mean(GAMUTS[gamut], axis=0)
+    assert clamp_to_gamut(inside, gamut) == pytest.approx(inside)
+
+@pytest.mark.parametrize("gamut", GAMUT_NAMES)
+def test_table_frames_match_the_exact_conversion(gamut):
+    colors = np.random.default_rng(0).integers(1, 256, (2000, 3))
+    xy, bri = rgb_frame(colors, [gamut] * len(colors))
+    exact = srgb_to_xy(colors / colors.max(axis=1, keepdims=True), gamut)
+    assert np.abs(xy - exact).max() < TABLE_ERROR
+    assert (bri == brightness(colors)).all()
+
+def test_frame_states_match_the_per_light_path():
+    colors = [(255, 0, 0), (0, 0, 0), (12, 200, 90), (255, 255, 255), (1, 1, 2)]
+    gamuts = ["A", "B", "C", None, "other"]
+    for frame_state, color, gamut in zip(rgb_states(colors, gamuts), colors, gamuts):
+        single = rgb_state(*color, gamut)
+        assert frame_state.keys() == single.keys()
+        assert frame_state["on"] == single["on"]
+        if single["on"]:
+            assert frame_state["bri"] == single["bri"]
+            assert frame_state["xy"] == pytest.approx(single["xy"], abs=TABLE_ERROR)
@@ -0,0 +1,103 @@
+import time
+import pytest
+from fakeBridge import FakeBridge
+from hueClient import HueClient
+from commandScheduler import CommandScheduler, get_scheduler
+from lightGroups import get_group_cache
+
+@pytest.fixture
+def bridge():
+    bridge = FakeBridge(latency=0.0).start()
+    yield bridge
+    bridge.stop()
+
+def wait_for(check, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not check() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return check()
+
+def test_get_scheduler_rejects_other_settings(bridge):
+    client = HueClient(bridge.address, "test")
+    acks = []
+    on_ack = lambda target, queued_at, ok: acks.append(target)
+    scheduler = get_scheduler(client, on_ack=on_ack)
+    try:
+        assert get_scheduler(client) is scheduler
+        assert get_scheduler(client, on_ack=on_ack) is scheduler
+        with pytest.raises(ValueError):
+            get_scheduler(client, on_ack=lambda *args: None)
+        scheduler.submit("1", {"on": True}, ack=True).result(timeout=2)
+        assert wait_for(lambda: acks == ["1"])
+    finally:
+        scheduler.stop()
+
+def test_updates_to_one_light_coalesce(bridge):
+    scheduler = CommandScheduler(HueClient(bridge.address, "test"), rate=20)
+    for level in range(1, 51):
+        scheduler.submit("1", {"bri": level})
+    scheduler.submit("1", {"on": True})
+    scheduler.submit("2", {"bri": 10})
+    scheduler.start()
+    try:
+        assert wait_for(lambda: scheduler.stats()["sent"] == 2)
+        assert bridge.stats["commands"] == 2
+        assert bridge.lights["1"]["state"]["bri"] == 50 and bridge.lights["1"]["state"]["on"] is True
+        assert bridge.lights["2"]["state"]["bri"] == 10
+        stats = scheduler.stats()
+        assert (stats["submitted"], stats["merged"], stats["dropped"]) == (52, 50, 49)
+    finally:
+        scheduler.stop()
+
+def test_sends_are_paced_to_the_rate(bridge):
+    rate = 20
+    client = HueClient(bridge.address, "test")
+    sent_at = []
+    put_light_state = client.put_light_state
+
+    def timed(light_id, state_data):
+        sent_at.append(time.monotonic())
+        return put_light_state(light_id, state_data)
+
+    client.put_light_state = timed
+    scheduler = CommandScheduler(client, rate=rate).start()
+    try:
+        for light_id in range(1, 6):
+            scheduler.submit(str(light_id), {"bri": 100})
+        assert wait_for(lambda: scheduler.stats()["sent"] == 5)
+    finally:
+        scheduler.stop()
+    gaps = [later - earlier for earlier, later in zip(sent_at, sent_at[1:])]
+    assert min(gaps) > 0.8 / rate  # Thread wake-up jitter only
+    assert sent_at[-1] - sent_at[0] >= 4 * 0.95 / rate
+
+def test_unchanged_commands_are_not_sent(bridge):
+    scheduler = CommandScheduler(HueClient(bridge.address, "test"), rate=50).start()
+    try:
+        assert scheduler.submit("1", {"on": True, "bri": 120}, ack=True).result(timeout=2)
+        assert scheduler.submit("1", {"on": True, "bri": 120}, ack=True).result(timeout=2) == []
+        assert scheduler.submit("1", {"on": True, "bri": 90}, ack=True).result(timeout=2) == [{"success": {"/lights/1/state/bri": 90}}]
+        assert bridge.stats["commands"] == 2
+    finally:
+        scheduler.stop()
+
+def test_changes_from_elsewhere_are_polled_into_the_shadow(bridge):
+    scheduler = CommandScheduler(HueClient(bridge.address, "test"), rate=50, poll=0.05).start()
+    try:
+        scheduler.submit("1", {"bri": 120}, ack=True).result(timeout=2)
+        bridge.lights["1"]["state"]["bri"] = 10  # Changed from the Hue app
+        assert wait_for(lambda: not scheduler.shadow.states)
+        assert scheduler.submit("1", {"bri": 120}, ack=True).result(timeout=2) == [{"success": {"/lights/1/state/bri": 120}}]
+    finally:
+        scheduler.stop()
+
+def test_direct_writes_bypass_the_shadow(bridge):
+    client = HueClient(bridge.address, "test")
+    scheduler = get_scheduler(client, rate=50, poll=0)
+    try:
+        scheduler.submit("1", {"bri": 120}, ack=True).result(timeout=2)
+        get_group_cache(client).apply({"1": {"bri": 10}})  # Straight to the bridge
+        assert bridge.lights["1"]["state"]["bri"] == 10
+        assert scheduler.submit("1", {"bri": 120}, ack=True).result(timeout=2) == [{"success": {"/lights/1/state/bri": 120}}]
+    finally:
+        scheduler.stop()
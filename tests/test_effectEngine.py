@@ -0,0 +1,59 @@
+import time
+import pytest
+from effectEngine import EffectEngine
+
+@pytest.fixture
+def engine():
+    engine = EffectEngine().start()
+    yield engine
+    engine.shutdown()
+
+def steps(log, name, count=1, every=0.02):
+    for step in range(count):
+        log.append((name, step))
+        yield every
+
+def test_effects_run_in_deadline_order(engine):
+    log = []
+    engine.trigger("a", steps(log, "a"), 0.06)
+    engine.trigger("b", steps(log, "b"), 0.02)
+    engine.trigger("c", steps(log, "c"), 0.04)
+    engine.wait()
+    assert log == [("b", 0), ("c", 0), ("a", 0)]
+
+def test_stopped_and_retriggered_effects_end(engine):
+    log = []
+    engine.trigger("strobe", steps(log, "first", count=1000, every=0.01))
+    time.sleep(0.05)
+    engine.trigger("strobe", steps(log, "second", count=2, every=0.01))  # Replaces the first
+    engine.wait()
+    assert log[-2:] == [("second", 0), ("second", 1)]
+    assert not any(name == "first" for name, _ in log[log.index(("second", 0)):])
+
+    engine.trigger("held", steps(log, "held", count=1000, every=0.01))
+    time.sleep(0.05)
+    engine.stop("held")
+    engine.wait()
+    count = len(log)
+    time.sleep(0.05)
+    assert len(log) == count and not engine.running("held")
+
+def test_late_steps_stay_on_the_grid(engine):
+    deadlines, ran_at = [], []
+
+    def effect():
+        ran_at.append(time.monotonic())
+        time.sleep(0.12)  # The first step overruns the next two deadlines
+        for _ in range(4):
+            deadlines.append((yield 0.05))
+            ran_at.append(time.monotonic())
+
+    start = time.monotonic()
+    engine.trigger("slow", effect())
+    engine.wait()
+    origin = ran_at[0]
+    assert origin - start < 0.05
+    # Every step is sent its grid deadline, not one shifted to when the late step ran
+    assert deadlines == pytest.approx([origin + 0.05 * step for step in range(1, 5)], abs=0.01)
+    assert ran_at[1] - origin == pytest.approx(0.12, abs=0.03)  # Overdue: runs at once
+    assert ran_at[3] - origin == pytest.approx(0.15, abs=0.03)  # Back on the grid
@@ -0,0 +1,40 @@
+import math
+import numpy as np
+from frameRenderer import CHANNELS, UNSET, frame_states, render
+
+EFFECT = {
+    "hue": {"wave": "saw", "low": 0, "high": 65535, "period": 4.0, "spread": 0.1},
+    "sat": 254,
+    "bri": {"wave": "sine", "low": 20, "high": 254, "period": 1.5, "spread": 0.25},
+    "ct": {"wave": "steps", "values": [153, 300, 500], "period": 2.0, "spread": 0.5},
+}
+SCALAR_WAVES = {
+    "saw": lambda x: x,
+    "sine": lambda x: 0.5 - 0.5 * math.cos(2 * math.pi * x),
+    "triangle": lambda x: 1 - abs(2 * x - 1),
+    "square": lambda x: float(x < 0.5),
+}
+
+def scalar_value(spec, light, frame, fps):
+    """The per-light, per-frame reference the renderer replaces."""
+    if not isinstance(spec, dict):
+        return spec
+    x = (frame / fps / spec["period"] + light * spec.get("spread", 0.0)) % 1.0
+    if spec["wave"] == "steps":
+        values = spec["values"]
+        return values[min(int(x * len(values)), len(values) - 1)]
+    low = spec.get("low", 0)
+    return int(low + SCALAR_WAVES[spec["wave"]](x) * (spec["high"] - low))
+
+def test_rendered_frames_match_the_scalar_reference():
+    rendered = render(EFFECT, 6, 100, fps=25)
+    expected = np.array([[[scalar_value(EFFECT[channel], light, frame, 25) for channel in CHANNELS]
+                          for frame in range(100)] for light in range(6)])
+    assert rendered.shape == (6, 100, len(CHANNELS))
+    assert np.abs(rendered - expected).max() <= 1  # Float rounding of the waves
+
+def test_unset_channels_are_left_out_of_states():
+    rendered = render({"bri": {"wave": "square", "high": 254, "period": 1.0}}, 2, 4, fps=4)
+    assert (rendered[..., CHANNELS.index("hue")] == UNSET).all()
+    assert frame_states(rendered, 0) == [{"bri": 254}, {"bri": 254}]
+    assert frame_states(rendered, 2) == [{"bri": 0}, {"bri": 0}]
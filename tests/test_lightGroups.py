@@ -0,0 +1,43 @@
+import pytest
+from fakeBridge import FakeBridge
+from hueClient import HueClient
+from lightGroups import GroupCache
+from lightInventory import get_inventory
+
+@pytest.fixture
+def bridge():
+    bridge = FakeBridge(latency=0.0).start()
+    yield bridge
+    bridge.stop()
+
+def test_matching_states_fan_out_in_one_group_action(bridge):
+    client = HueClient(bridge.address, "test")
+    get_inventory(client).refresh(client)  # Know which lamps are white before the first write
+    groups = GroupCache(client)
+    before = bridge.stats["commands"]
+    groups.apply({"1": {"bri": 40}, "2": {"bri": 40}, "5": {"bri": 40}})
+    assert bridge.stats["commands"] - before == 1
+    assert [bridge.lights[light_id]["state"]["bri"] for light_id in "125"] == [40, 40, 40]
+    created, = groups.created
+    assert bridge.groups[created]["lights"] == ["1", "2", "5"]
+
+    groups.apply({"5": {"bri": 60}, "1": {"bri": 60}, "2": {"bri": 60}})  # Same lights, any order
+    assert groups.created == [created] and bridge.stats["commands"] - before == 2
+
+    before = bridge.stats["commands"]
+    groups.apply({"1": {"xy": [0.3, 0.3]}, "3": {"xy": [0.3, 0.3], "bri": 10}, "4": {"xy": [0.3, 0.3]}})
+    assert groups.created == [created]  # Colour for white lamps can't go to a group of them
+    assert bridge.stats["commands"] - before == 2  # Light 4 had nothing left to send
+    assert bridge.lights["3"]["state"]["bri"] == 10
+
+def test_groups_are_loaded_from_the_bridge_and_cleaned_up(bridge):
+    bridge.groups["7"] = {"name": "Desk", "type": "Room", "lights": ["2", "1"]}
+    groups = GroupCache(HueClient(bridge.address, "test"))
+    assert groups.group_for([1, 2]) == "7"  # Reused, not created
+    created = groups.group_for([1, 2, 3])
+    assert groups.created == [created] and created in bridge.groups
+
+    groups.cleanup()
+    assert created not in bridge.groups and "7" in bridge.groups
+    assert groups.group_for([1, 2]) == "7"
+    assert groups.group_for([1, 2, 3]) in bridge.groups  # Created again on next use
@@ -0,0 +1,30 @@
+import json
+from fakeBridge import make_lights
+from lightInventory import LightInventory
+
+def inventory(tmp_path):
+    return LightInventory("10.0.0.2", path=str(tmp_path / "inventory.json"))
+
+def test_commands_are_trimmed_to_what_a_light_supports(tmp_path):
+    saved = inventory(tmp_path)
+    saved.update(make_lights(5), "bridge-a")
+    assert saved.filter(1, {"hue": 100, "bri": 10}) == {"hue": 100, "bri": 10}
+    assert saved.filter(3, {"hue": 100, "bri": 10, "transitiontime": 4}) == {"bri": 10, "transitiontime": 4}
+    assert saved.filter(3, {"xy": [0.3, 0.3], "transitiontime": 4}) is None  # Nothing left to send
+    assert saved.filter(99, {"hue": 100}) == {"hue": 100}  # Unknown lights pass through
+    assert saved.stats["filtered"] == 2
+    assert (saved.gamut(1), saved.gamut(3)) == ("C", None)
+
+def test_saved_inventory_reloads_per_bridge(tmp_path):
+    saved = inventory(tmp_path)
+    saved.update(make_lights(5), "bridge-a")
+    other = LightInventory("10.0.0.3", path=saved.path)
+    other.update(make_lights(2), "bridge-b")
+    assert set(json.load(open(saved.path))) == {"10.0.0.2", "10.0.0.3"}  # Saving one keeps the other
+
+    reloaded = inventory(tmp_path).load()
+    assert reloaded.lights == saved.lights and reloaded.bridge_id == "bridge-a"
+    assert not reloaded.supports(4, "ct") and reloaded.supports(5, "ct")
+    assert reloaded.check("bridge-a")
+    assert not reloaded.check("bridge-c")  # Taken from another bridge at this address
+    assert reloaded.lights == {} and reloaded.supports(4, "ct")
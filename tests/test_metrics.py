@@ -0,0 +1,52 @@
+import pytest
+import metrics
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Record metrics for one test, rendering only the ones it creates."""
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    return metrics.REGISTRY
+
+def test_histograms_count_cumulative_buckets(registry):
+    latency = metrics.Histogram("test_seconds", "Test latency", ("queue",))
+    for value in (0.003, 0.003, 0.2, 20.0):
+        latency.observe(value, "q")
+    counts = latency.values[("q",)]
+    assert dict(zip(metrics.BUCKETS, counts)) == {
+        0.001: 0, 0.0025: 0, 0.005: 2, 0.01: 2, 0.025: 2, 0.05: 2, 0.1: 2,
+        0.25: 3, 0.5: 3, 1.0: 3, 2.5: 3, 5.0: 3, 10.0: 3,
+    }
+    assert counts[-2:] == [4, pytest.approx(20.206)]
+
+def test_metrics_render_as_prometheus_text(registry):
+    errors = metrics.Counter("test_errors_total", "Test errors", ("light",))
+    clients = metrics.Gauge("test_clients", "Test clients")
+    latency = metrics.Histogram("test_seconds", "Test latency", ("queue",))
+    errors.inc("5")
+    errors.inc("5", amount=2)
+    clients.set(3)
+    latency.observe(0.5, "q")
+    lines = metrics.render().splitlines()
+    assert lines[:4] == ["# HELP test_errors_total Test errors", "# TYPE test_errors_total counter",
+                         'test_errors_total{light="5"} 3', "# HELP test_clients Test clients"]
+    assert "test_clients 3" in lines
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{queue="q",le="0.25"} 0' in lines
+    assert 'test_seconds_bucket{queue="q",le="0.5"} 1' in lines
+    assert 'test_seconds_bucket{queue="q",le="+Inf"} 1' in lines
+    assert lines[-2:] == ['test_seconds_count{queue="q"} 1', 'test_seconds_sum{queue="q"} 0.5']
+
+def test_disabled_metrics_record_nothing(registry, monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    errors = metrics.Counter("test_errors_total", "Test errors", ("light",))
+    errors.inc("5")
+    assert errors.values == {}
+
+def test_bridge_errors_are_kept_apart_per_bridge(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics.BRIDGE_ERRORS, "values", {})
+    error = [{"error": {"type": 201, "description": "parameter, bri, is not modifiable"}}]
+    metrics.count_errors(error, "10.0.0.2", 1)
+    metrics.count_errors(error + error, "10.0.0.3", 1)  # Light 1 on another bridge
+    assert metrics.BRIDGE_ERRORS.values == {("10.0.0.2", "1"): 1, ("10.0.0.3", "1"): 2}
@@ -0,0 +1,41 @@
+import pytest
+from midiMapping import compile_mapping
+
+CONFIG = {
+    "notes": [{"channel": 0, "note": 60, "light": 1, "attribute": "bri", "release": {"bri": 0}}],
+    "controls": [
+        {"channel": 0, "cc": 1, "light": 1, "attribute": "bri"},
+        {"channel": 1, "cc": 0, "light": 2, "attribute": "bri"},
+    ],
+}
+
+def test_lookup_finds_notes_and_controls():
+    mapping = compile_mapping(CONFIG)
+    entry = mapping.lookup(0xB0, 1, 127)
+    assert entry.light == 1
+    assert entry.states[127] == {"bri": 254}
+    assert mapping.lookup(0x90, 60, 100).light == 1
+    assert mapping.lookup(0xB1, 0, 0).light == 2
+    assert mapping.lookup(0xB0, 2, 64) is None
+
+def test_note_on_with_velocity_zero_is_a_release():
+    mapping = compile_mapping(CONFIG)
+    assert mapping.lookup(0x90, 60, 0).states[0] == {"bri": 0}
+    assert mapping.lookup(0x80, 60, 0) == mapping.lookup(0x90, 60, 0)
+
+def test_out_of_range_data_bytes_do_not_alias_other_channels():
+    mapping = compile_mapping(CONFIG)
+    assert mapping.lookup(0xB0, 128, 64) is None  # Would be channel 1, CC 0
+    assert mapping.lookup(0xB0, 1, 128) is None
+    assert mapping.lookup(0xB0, -1, 64) is None
+
+def test_non_status_bytes_are_rejected():
+    mapping = compile_mapping(CONFIG)
+    assert mapping.lookup(0x30, 1, 64) is None
+    assert mapping.lookup(0x1B0, 1, 64) is None
+
+def test_effects_need_a_light():
+    with pytest.raises(ValueError):
+        compile_mapping({"notes": [{"note": 60, "group": 1, "effect": "strobe"}]})
+    entry = compile_mapping({"notes": [{"note": 60, "light": 5, "effect": "strobe"}]}).lookup(0x90, 60, 100)
+    assert (entry.light, entry.effect) == (5, "strobe")
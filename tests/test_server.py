@@ -0,0 +1,93 @@
+import os
+import time
+import pytest
+from fakeBridge import FakeBridge
+from midiProtocol import encode_batch
+
+if os.getenv("CI"):
+    # CI installs the server's requirements, so a missing one is a failure there, not a skip
+    import fastapi
+    import httpx
+else:
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+
+@pytest.fixture(scope="module")
+def server():
+    """The DockerServer app on a fake bridge, started once for the module."""
+    bridge = FakeBridge(latency=0.0).start()
+    os.environ.update(BRIDGE_IP=bridge.address, USERNAME="test", BRIDGES="", LIGHT_POLL_INTERVAL="0.2")
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as client:
+        yield client, bridge
+    bridge.stop()
+
+def wait_for(check, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not check() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return check()
+
+def test_midi_websocket_skips_out_of_range_records(server):
+    client, bridge = server
+    import metrics
+    before = sum(metrics.MIDI_INVALID.values.values())
+    with client.websocket_connect("/api/v1/midi") as websocket:
+        # CC 1 on channel 1 drives light 5's brightness in midiMapping.json
+        websocket.send_bytes(encode_batch([(1, 0xB0, 1, 200), (2, 0xB0, 129, 10), (3, 0x30, 1, 10)]))
+        websocket.send_bytes(encode_batch([(4, 0xB0, 1, 64)]))
+        assert wait_for(lambda: bridge.lights["5"]["state"]["bri"] == 128)
+    assert sum(metrics.MIDI_INVALID.values.values()) - before == 3
+
+def test_batch_rejects_malformed_xy(server):
+    client, bridge = server
+    assert client.put("/api/v1/lights/batch", json={"1": {"xy": [0.3]}}).status_code == 400
+    assert client.put("/api/v1/lights/batch", json={"1": {"xy": [5, -1]}}).status_code == 422
+    assert client.put("/api/v1/lights/batch", json={"1": {"xy": [0.3, 0.3, 0.3]}}).status_code == 400
+
+def test_batch_fits_xy_to_the_light_gamut(server):
+    client, bridge = server
+    client.get("/api/v1/lights")  # Fill the inventory with the lights' gamuts
+    results = client.put("/api/v1/lights/batch", json={"1": {"xy": [0.9, 0.05]}}).json()
+    assert results["1"] == [{"success": {"/lights/1/state/xy": [0.6915, 0.3083]}}]
+    assert bridge.lights["1"]["state"]["xy"] == [0.6915, 0.3083]
+
+def test_light_ids_outside_the_bridges_are_not_found(server):
+    client, bridge = server
+    for light_id in (-1, 1001):
+        assert client.put(f"/api/v1/lights/{light_id}/toggle").status_code == 404
+
+def test_stale_midi_events_count_as_dropped(server):
+    client, bridge = server
+    dropped = lambda: sum(shard["commands"]["dropped"] for shard in client.get("/api/v1/bridges").json())
+    with client.websocket_connect("/api/v1/midi") as websocket:
+        websocket.send_bytes(encode_batch([(10000, 0xB0, 1, 10)]))
+        assert wait_for(lambda: bridge.lights["5"]["state"]["bri"] == 20)
+        before = dropped()  # Also counts updates superseded in the queue
+        websocket.send_bytes(encode_batch([(1000, 0xB0, 1, 20), (10001, 0xB0, 1, 30)]))
+        assert wait_for(lambda: bridge.lights["5"]["state"]["bri"] == 60)
+    assert dropped() - before == 1
+
+def test_midi_timestamps_wrap(server):
+    client, bridge = server
+    dropped = lambda: sum(shard["commands"]["dropped"] for shard in client.get("/api/v1/bridges").json())
+    with client.websocket_connect("/api/v1/midi") as websocket:
+        websocket.send_bytes(encode_batch([(0xFFFFFF00, 0xB0, 1, 10)]))
+        assert wait_for(lambda: bridge.lights["5"]["state"]["bri"] == 20)
+        websocket.send_bytes(encode_batch([(0x100, 0xB0, 1, 30)]))  # Just after the wrap: newer, not 49 days stale
+        assert wait_for(lambda: bridge.lights["5"]["state"]["bri"] == 60)
+        before = dropped()
+        websocket.send_bytes(encode_batch([(0xFFFF0000, 0xB0, 1, 40)]))  # Before the wrap: stale
+        assert wait_for(lambda: dropped() - before == 1)
+        assert bridge.lights["5"]["state"]["bri"] == 60
+
+def test_closed_state_streams_unsubscribe(server):
+    client, bridge = server
+    import main
+    stream = main.app.state.bridges.stream
+    before = len(stream.subscribers)
+    with client.websocket_connect("/api/v1/lights/stream") as websocket:
+        assert websocket.receive_json()["type"] == "snapshot"
+        assert len(stream.subscribers) == before + 1
+    assert wait_for(lambda: len(stream.subscribers) == before)
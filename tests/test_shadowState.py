@@ -0,0 +1,74 @@
+from shadowState import ShadowState
+
+def acked(shadow, target, state):
+    """Diff a command and acknowledge it the way the bridge would."""
+    changed = shadow.diff(target, state)
+    address = f"/groups/{target[1]}/action" if isinstance(target, tuple) else f"/lights/{target}/state"
+    shadow.ack(target, [{"success": {f"{address}/{key}": value}} for key, value in changed.items()])
+    return changed
+
+def test_acknowledged_attributes_are_stripped():
+    shadow = ShadowState(ttl=60)
+    acked(shadow, "1", {"on": True, "bri": 100})
+    assert shadow.diff(1, {"on": True, "bri": 100}) is None
+    assert shadow.diff("1", {"on": True, "bri": 120, "transitiontime": 0}) == {"bri": 120, "transitiontime": 0}
+    assert shadow.stats["unchanged"] == 1
+
+def test_actions_are_always_sent():
+    shadow = ShadowState(ttl=60)
+    acked(shadow, "1", {"alert": "select", "bri": 100})
+    assert shadow.diff("1", {"alert": "select", "bri": 100}) == {"alert": "select"}
+
+def test_setting_a_colour_model_forgets_the_others():
+    shadow = ShadowState(ttl=60)
+    acked(shadow, "1", {"hue": 1000, "sat": 254})
+    acked(shadow, "1", {"xy": [0.3, 0.3]})
+    assert shadow.diff("1", {"hue": 1000, "sat": 254}) == {"hue": 1000, "sat": 254}
+
+def test_group_writes_forget_light_shadows():
+    shadow = ShadowState(ttl=60)
+    acked(shadow, "1", {"bri": 100})
+    acked(shadow, ("group", 0), {"bri": 50})
+    assert shadow.diff("1", {"bri": 100}) == {"bri": 100}
+
+def test_errors_and_stale_polls_invalidate():
+    shadow = ShadowState(ttl=60)
+    shadow.diff("1", {"bri": 100})
+    shadow.ack("1", [{"error": {"type": 201, "description": "parameter, bri, is not modifiable"}}])
+    assert shadow.diff("1", {"bri": 100}) == {"bri": 100}
+
+    acked(shadow, "2", {"bri": 100})
+    shadow.sync({"2": {"bri": 101, "reachable": True}})  # Changed from elsewhere
+    assert shadow.diff("2", {"bri": 100}) == {"bri": 100}
+
+    acked(shadow, "3", {"hue": 1000})
+    shadow.sync({"3": {"hue": 1020, "reachable": True}})  # Read-back drift
+    assert shadow.diff("3", {"hue": 1000}) is None
+
+def test_expired_entries_are_not_trusted():
+    shadow = ShadowState(ttl=0)
+    acked(shadow, "1", {"bri": 100})
+    assert shadow.diff("1", {"bri": 100}) == {"bri": 100}
+
+def test_overlapping_group_writes_are_not_stripped():
+    shadow = ShadowState(ttl=60)
+    acked(shadow, ("group", 1), {"bri": 100})
+    acked(shadow, ("group", 2), {"bri": 50})
+    assert shadow.diff(("group", 1), {"bri": 100}) == {"bri": 100}
+
+    shadow = ShadowState(ttl=60)
+    acked(shadow, ("group", 0), {"bri": 100})
+    acked(shadow, ("group", 1), {"bri": 30})
+    assert shadow.diff(("group", 0), {"bri": 100}) == {"bri": 100}
+
+def test_repeated_group_writes_are_stripped():
+    shadow = ShadowState(ttl=60)
+    acked(shadow, ("group", 1), {"bri": 100})
+    assert shadow.diff(("group", 1), {"bri": 100}) is None
+
+def test_writes_in_flight_invalidate_overlapping_groups():
+    shadow = ShadowState(ttl=60)
+    shadow.diff(("group", 1), {"bri": 100})
+    acked(shadow, ("group", 2), {"bri": 50})  # Diffed and acked while group 1 was in flight
+    shadow.ack(("group", 1), [{"success": {"/groups/1/action/bri": 100}}])
+    assert shadow.diff(("group", 1), {"bri": 100}) == {"bri": 100}
@@ -0,0 +1,90 @@
+import itertools
+import time
+import mido
+from effectEngine import EffectEngine
+from keyframes import compile_keyframes
+from showClock import TempoClock, run_steps, step_effect
+
+class FakeClock:
+    """A clock that jumps to each deadline, plus `lag` per send to simulate a slow bridge."""
+
+    def __init__(self, lag=0.0):
+        self.now = 0.0
+        self.lag = lag
+
+    def position(self):
+        return self.now
+
+    def wait_until(self, position):
+        self.now = max(self.now, position)
+
+def drive(effect, clock):
+    """Step an effect generator the way EffectEngine does, sending each deadline back in."""
+    deadline = clock.now
+    delay = next(effect)
+    while True:
+        deadline += delay
+        clock.wait_until(deadline)
+        try:
+            delay = effect.send(deadline)
+        except StopIteration:
+            return
+
+def test_keyframed_fade_sends_every_command():
+    commands = compile_keyframes([(0, 0), (1.7, 254), (3.4, 0)], "bri")
+    assert commands[0][0] == commands[1][0]  # Start value and first fade share an offset
+    sent = []
+    assert run_steps(commands, sent.append, FakeClock(), 0.0) == (len(commands), 0)
+    assert sent == [state for _, state in commands]
+    assert sent[0] == {"bri": 0, "transitiontime": 0}
+
+def test_steps_at_the_same_offset_go_out_in_order():
+    sent = []
+    run_steps([(0, "a"), (0, "b"), (1, "c"), (1, "d")], sent.append, FakeClock(), 0.0)
+    assert sent == ["a", "b", "c", "d"]
+
+def test_late_steps_are_skipped_once_a_later_step_is_overdue():
+    clock = FakeClock()
+    sent = []
+
+    def slow_send(value):
+        sent.append(value)
+        clock.now += 2.5  # Each send overruns the next two steps
+
+    sent_count, skipped = run_steps([(0, "a"), (1, "b"), (2, "c"), (3, "d"), (4, "e")], slow_send, clock, 0.0)
+    assert sent == ["a", "c", "e"]
+    assert (sent_count, skipped) == (3, 2)
+
+def test_a_late_group_is_skipped_whole():
+    clock = FakeClock()
+    clock.now = 1.5  # Steps at 0 are overdue: the steps at 1 are already due
+    sent = []
+    run_steps([(0, "a"), (0, "b"), (1, "c"), (2, "d")], sent.append, clock, 0.0)
+    assert sent == ["c", "d"]
+
+def test_step_effects_skip_like_run_steps():
+    clock = FakeClock()
+    sent = []
+
+    def slow_send(value):
+        sent.append(value)
+        clock.now += 2.5
+
+    drive(step_effect([(0, "a"), (1, "b"), (2, "c"), (3, "d"), (4, "e")], slow_send, clock), clock)
+    assert sent == ["a", "c", "e"]
+
+def test_step_effects_pause_with_the_transport():
+    clock = TempoClock(bpm=600)  # 0.1 s per beat
+    engine = EffectEngine(clock).start()
+    sent = []
+    engine.trigger("held", step_effect(((beat, beat) for beat in itertools.count()), sent.append, clock))
+    time.sleep(0.25)
+    clock.handle(mido.Message("stop"))
+    stopped = len(sent)
+    time.sleep(0.25)
+    assert stopped >= 2 and len(sent) == stopped
+    clock.handle(mido.Message("continue"))
+    time.sleep(0.25)
+    engine.shutdown()
+    assert len(sent) > stopped
+    assert sent == list(range(len(sent)))  # Nothing skipped or repeated across the stop
@@ -0,0 +1,74 @@
+import json
+import types
+import mido
+import pytest
+from fakeBridge import FakeBridge
+from hueClient import HueClient
+from showCompiler import ShowFile, compile_show, play_show, schedule_lane
+
+MAPPING = {"controls": [{"channel": 0, "cc": 1, "light": 1, "attribute": "bri"}]}
+
+@pytest.fixture
+def show_path(tmp_path):
+    """A compiled one-lane show of five brightness changes, 100 ms apart."""
+    midi = mido.MidiFile()
+    track = mido.MidiTrack()
+    midi.tracks.append(track)
+    for value in (10, 30, 50, 70, 90):
+        track.append(mido.Message("control_change", control=1, value=value, time=96))  # 0.1 s at 120 bpm
+    midi.save(tmp_path / "show.mid")
+    (tmp_path / "mapping.json").write_text(json.dumps(MAPPING))
+    data, report = compile_show(str(tmp_path / "show.mid"), str(tmp_path / "mapping.json"), rate=10, lanes=1)
+    assert report["commands"] == [5]
+    (tmp_path / "show.show").write_bytes(data)
+    return str(tmp_path / "show.show")
+
+def router_for(*bridges):
+    return types.SimpleNamespace(clients=[HueClient(bridge.address, "test", timeout=0.5) for bridge in bridges])
+
+def test_play_show_sends_every_command(show_path):
+    bridge = FakeBridge().start()
+    show = ShowFile(show_path)
+    try:
+        assert play_show(show, router_for(bridge)) == [(5, 0, 0)]
+        assert bridge.lights["1"]["state"]["bri"] == 180
+    finally:
+        show.close()
+        bridge.stop()
+
+def test_play_show_keeps_playing_after_request_errors(show_path):
+    bridge = FakeBridge().start()
+    bridge.stop()  # Nothing listens on its port, so every request fails
+    show = ShowFile(show_path)
+    try:
+        assert play_show(show, router_for(bridge)) == [(0, 0, 5)]
+    finally:
+        show.close()
+
+def test_play_show_reports_lanes_without_a_bridge(show_path, tmp_path):
+    # Group 0 is every light, so both lanes get the commands
+    (tmp_path / "mapping.json").write_text(json.dumps({"controls": [{"channel": 0, "cc": 1, "group": 0, "attribute": "bri"}]}))
+    data, _ = compile_show(str(tmp_path / "show.mid"), str(tmp_path / "mapping.json"), rate=10, lanes=2)
+    (tmp_path / "two.show").write_bytes(data)
+    bridge = FakeBridge().start()
+    show = ShowFile(str(tmp_path / "two.show"))
+    try:
+        assert play_show(show, router_for(bridge)) == [(5, 0, 0), (0, 0, 5)]
+    finally:
+        show.close()
+        bridge.stop()
+
+def test_schedule_lane_spaces_sends_by_the_rate():
+    commands = [(0.0, light_id, {"bri": 100}) for light_id in range(1, 6)]
+    timeline = schedule_lane(commands, rate=10)
+    assert [at for at, _, _ in timeline] == [0, 100, 200, 300, 400]
+    assert [target for _, target, _ in timeline] == [1, 2, 3, 4, 5]
+
+def test_schedule_lane_coalesces_and_drops_unchanged():
+    commands = [(0.0, 1, {"bri": 10}), (0.01, 1, {"bri": 20}), (0.02, 1, {"bri": 30, "on": True}),
+                (0.5, 1, {"bri": 30, "on": True}), (0.6, 1, {"bri": 40, "on": True})]
+    assert schedule_lane(commands, rate=10) == [(0, 1, {"bri": 10}), (100, 1, {"bri": 30, "on": True}), (600, 1, {"bri": 40})]
+
+def test_schedule_lane_group_actions_reset_the_shadow():
+    commands = [(0.0, 1, {"bri": 10}), (0.2, ("group", 0), {"bri": 50}), (0.4, 1, {"bri": 10})]
+    assert [(at, target) for at, target, _ in schedule_lane(commands, rate=10)] == [(0, 1), (200, ("group", 0)), (400, 1)]
@@ -0,0 +1,61 @@
+import threading
+import time
+import pytest
+from showRunner import ShowRunner
+
+@pytest.fixture
+def runner():
+    runner = ShowRunner(max_in_flight=2, rate=0).start()
+    yield runner
+    runner.shutdown()
+
+def test_requests_in_flight_stay_within_the_pool(runner):
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def call():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    for light_id in range(20):
+        runner.send(light_id, call)
+    runner.wait()
+    assert peak[0] == 2
+    assert runner.stats["sent"] == 20 and runner.stats["superseded"] == 0
+
+def test_pending_calls_are_superseded_by_key(runner):
+    release = threading.Event()
+    sent = []
+    runner.send("a", release.wait)
+    runner.send("b", release.wait)  # The pool is now busy
+    for value in range(3):
+        runner.send(1, sent.append, value)
+    runner.send(2, sent.append, "other")
+    release.set()
+    runner.wait()
+    assert sorted(sent, key=str) == [2, "other"]  # Only the newest call for light 1 went out
+    assert runner.stats["superseded"] == 2
+
+def test_calls_from_one_step_are_all_kept(runner):
+    release = threading.Event()
+    sent = []
+    runner.send("a", release.wait)
+    runner.send("b", release.wait)
+
+    def fade():
+        sent.append("queued")
+        runner.send(1, sent.append, "old")
+        yield 0.01
+        runner.send(1, sent.append, "start")  # A fade's start value and the fade share a step
+        runner.send(1, sent.append, "fade")
+
+    runner.trigger("fade", fade())
+    runner.engine.wait()
+    release.set()
+    runner.wait()
+    assert sent == ["queued", "start", "fade"]
+    assert runner.stats["superseded"] == 1
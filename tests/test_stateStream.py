@@ -0,0 +1,41 @@
+from fakeBridge import make_lights
+from stateStream import StateBroadcaster
+
+def drain(queue):
+    messages = []
+    while not queue.empty():
+        messages.append(queue.get_nowait())
+    return messages
+
+def test_subscribers_get_a_snapshot_then_only_diffs():
+    stream = StateBroadcaster()
+    lights = make_lights(2)
+    stream.publish(lights)
+    queue = stream.subscribe()
+    snapshot, = drain(queue)
+    assert snapshot["type"] == "snapshot" and set(snapshot["lights"]) == {"1", "2"}
+
+    stream.publish(lights)  # Nothing changed: nothing sent
+    assert drain(queue) == []
+    lights["1"]["state"]["bri"] = 10
+    stream.publish(lights, removed=["2"])
+    diff, = drain(queue)
+    assert diff["type"] == "diff"
+    assert diff["lights"] == {"1": {"state": {"bri": 10}}, "2": None}
+
+def test_slow_subscribers_are_resynced_and_unsubscribed():
+    stream = StateBroadcaster(max_queue=2)
+    lights = make_lights(1)
+    queue = stream.subscribe()
+    for level in range(3):
+        lights["1"]["state"]["bri"] = level
+        stream.publish(lights)
+    snapshot, diff = drain(queue)  # The backlog was replaced by a snapshot at the overflow
+    assert snapshot["type"] == "snapshot" and snapshot["lights"]["1"]["state"]["bri"] == 1
+    assert diff["lights"] == {"1": {"state": {"bri": 2}}}
+    assert stream.stats["resyncs"] == 1
+
+    stream.unsubscribe(queue)
+    lights["1"]["state"]["bri"] = 3
+    stream.publish(lights)
+    assert not stream.subscribers and drain(queue) == []
@@ -0,0 +1,36 @@
+import socket
+import pytest
+from entertainmentStream import SEQUENCE_OFFSET, EntertainmentStream, build_frame
+from streamReceiver import StreamReceiver
+
+@pytest.fixture
+def receiver():
+    receiver = StreamReceiver(port=0, host="127.0.0.1")
+    yield receiver
+    receiver.close()
+
+def send_frames(receiver, sequences):
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    frame = build_frame([1, 2])
+    for sequence in sequences:
+        frame[SEQUENCE_OFFSET] = sequence
+        sender.sendto(frame, receiver.sock.getsockname())
+        assert receiver.receive(timeout=1.0)
+    sender.close()
+
+def test_idle_receive_times_out(receiver):
+    assert receiver.receive(timeout=0.0) is False
+
+def test_reordered_and_duplicate_frames_are_not_lost(receiver):
+    send_frames(receiver, [1, 2, 4, 3, 5, 5])
+    stats, = receiver.report().values()
+    assert (stats["frames"], stats["lost"], stats["reordered"]) == (5, 0, 2)
+
+def test_gaps_are_lost_across_the_wrap(receiver):
+    send_frames(receiver, [254, 255, 1, 2])
+    stats, = receiver.report().values()
+    assert (stats["frames"], stats["lost"], stats["reordered"]) == (4, 1, 0)
+
+def test_stream_needs_a_host():
+    with pytest.raises(ValueError):
+        EntertainmentStream([1], host=None)